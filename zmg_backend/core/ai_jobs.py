@@ -0,0 +1,120 @@
+"""
+AI 打标签后台队列：上传时只入队，由 run_ai_worker 批量调用模型并回写 ai_tags
+"""
+
+import hashlib
+import logging
+import uuid
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .ai_utils import analyze_texts_with_ai, save_ai_results
+from .models import AiTagJob, Resource
+
+logger = logging.getLogger(__name__)
+
+
+def resource_text(resource):
+    return f"{resource.title} {resource.description or ''}".strip()
+
+
+def _text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def enqueue_ai_tagging(resource):
+    """
+    入队（幂等）：同一资源只有一行任务；文本未变且已完成时不再重复处理；
+    正在处理中的任务不动，完成时 run_batch 发现文本已变会重新放回队列
+    """
+    job, created = AiTagJob.objects.get_or_create(resource=resource)
+    if created:
+        return job
+    if job.status == 'done' and job.text_hash == _text_hash(resource_text(resource)):
+        return job
+    if job.status != 'running':
+        AiTagJob.objects.filter(id=job.id).update(
+            status='pending', attempts=0, last_error='', run_after=timezone.now()
+        )
+    return job
+
+
+def claim_jobs(limit):
+    """
+    认领一批到期任务：条件更新保证同一任务只被一个 worker 拿到；
+    超时未完成的 running 任务视为 worker 已退出，重新放回队列
+    """
+    now = timezone.now()
+    stale_before = now - timezone.timedelta(seconds=settings.AI_JOB_LOCK_TIMEOUT)
+    AiTagJob.objects.filter(status='running', locked_at__lt=stale_before).update(status='pending')
+
+    worker = uuid.uuid4().hex
+    candidates = list(
+        AiTagJob.objects.filter(status='pending', run_after__lte=now)
+        .order_by('run_after', 'id').values_list('id', flat=True)[:limit]
+    )
+    if not candidates:
+        return []
+    AiTagJob.objects.filter(id__in=candidates, status='pending').update(
+        status='running', worker=worker, locked_at=now, attempts=F('attempts') + 1
+    )
+    return list(AiTagJob.objects.filter(worker=worker, status='running').select_related('resource'))
+
+
+def run_batch(batch_size=None):
+    """处理一批任务，返回 (成功数, 失败数)"""
+    jobs = claim_jobs(batch_size or settings.AI_JOB_BATCH_SIZE)
+    if not jobs:
+        return 0, 0
+
+    texts = [resource_text(job.resource) for job in jobs]
+    try:
+        results = analyze_texts_with_ai(texts)
+    except Exception as e:
+        logger.exception("AI batch failed")
+        for job in jobs:
+            _fail(job, e)
+        return 0, len(jobs)
+
+    # 模型调用期间被编辑过的资源：标签已过时，不写回，重新排队处理新文本
+    current = {
+        resource.id: resource_text(resource)
+        for resource in Resource.objects.filter(id__in=[job.resource_id for job in jobs]).only('title', 'description')
+    }
+
+    done = failed = 0
+    for job, text, tags in zip(jobs, texts, results):
+        if current.get(job.resource_id, text) != text:
+            AiTagJob.objects.filter(id=job.id, worker=job.worker).update(
+                status='pending', attempts=0, run_after=timezone.now(), locked_at=None
+            )
+            continue
+        try:
+            with transaction.atomic():
+                save_ai_results(job.resource, tags)
+                AiTagJob.objects.filter(id=job.id, worker=job.worker).update(
+                    status='done', text_hash=_text_hash(text), last_error='', locked_at=None
+                )
+            done += 1
+        except Exception as e:
+            logger.exception("saving AI result for resource %s failed", job.resource_id)
+            _fail(job, e)
+            failed += 1
+    # 返回的结果比输入少时，没有对应结果的任务按失败重试，不能一直停在 running
+    for job in jobs[len(results):]:
+        _fail(job, 'AI 返回结果数量不足')
+        failed += 1
+    return done, failed
+
+
+def _fail(job, error):
+    """失败重试：指数退避，超过最大次数标记为 failed"""
+    if job.attempts >= settings.AI_JOB_MAX_ATTEMPTS:
+        status, run_after = 'failed', timezone.now()
+    else:
+        delay = settings.AI_JOB_RETRY_DELAY * (2 ** (job.attempts - 1))
+        status, run_after = 'pending', timezone.now() + timezone.timedelta(seconds=delay)
+    AiTagJob.objects.filter(id=job.id, worker=job.worker).update(
+        status=status, run_after=run_after, last_error=str(error)[:1000], locked_at=None
+    )
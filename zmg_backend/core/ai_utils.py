@@ -1,15 +1,8 @@
 import time
+from django.conf import settings
+from .embeddings import encode_vector, get_embedder, resource_embedding_text
 
-def analyze_text_with_ai(text):
-    """
-    模拟 AI 分析：输入描述，返回标签
-    """
-    # 真实场景：这里调用 LangChain 或 OpenAI API
-    # response = openai.Completion.create(...)
-
-    # 模拟耗时
-    time.sleep(1) 
-
+def _tags_for(text):
     # 简单的关键词提取逻辑
     tags = []
     if "物理" in text or "力" in text:
@@ -24,9 +17,29 @@ def analyze_text_with_ai(text):
 
     return ",".join(tags)
 
+def analyze_texts_with_ai(texts):
+    """
+    模拟 AI 批量分析：一次模型调用处理多段文本，返回与输入等长的标签列表
+    """
+    # 真实场景：这里调用 LangChain 或 OpenAI API，一个请求携带多段文本
+    # response = openai.Completion.create(...)
+
+    # 模拟耗时（每次调用一次，与批大小无关）
+    time.sleep(getattr(settings, 'AI_SIMULATED_LATENCY', 1))
+
+    return [_tags_for(text or '') for text in texts]
+
+def analyze_text_with_ai(text):
+    """
+    模拟 AI 分析：输入描述，返回标签
+    """
+    return analyze_texts_with_ai([text])[0]
+
 # 保存结果到资源的函数（供视图调用）
 def save_ai_results(resource, tags):
     resource.ai_tags = tags
-    # 模拟向量数据（实际应该是数值数组的字符串表示）
-    resource.embedding_text = f"vector_for_{tags.replace(',', '_')}"
-    resource.save()
+    resource.embedding_text = resource_embedding_text(resource)
+    vector = get_embedder().embed([resource.embedding_text])[0]
+    resource.embedding = encode_vector(vector) if vector.any() else None
+    # 只写本次计算的字段，不覆盖期间由其他任务（如缩略图）写入的列
+    resource.save(update_fields=['ai_tags', 'embedding_text', 'embedding', 'updated_at'])
@@ -2,21 +2,61 @@
 API视图 - 支持前端通信
 """
 
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.settings import api_settings
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework import status
 from django.contrib.auth import authenticate
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
-from core.models import User, SyncPreference, DesktopIcon, Resource, Category, Membership
-from core.tenant_utils import get_current_tenant, parse_client_datetime
+from django.views.decorators.http import require_http_methods
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from django.core import signing
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from core.models import User, SyncPreference, SyncChange, DesktopIcon, Resource, Category, Membership, AppEntry
+from core.tenant_utils import get_current_tenant, get_current_membership, parse_client_datetime
+from core.search_utils import search as search_index
+from core.sync_utils import record_changes, settled_changes
+from core.renderers import NDJSONRenderer, ndjson_line
+from core.media_utils import serve_file
+from core.h5_utils import H5_DIR, app_dir, get_manifest
+from core.asgi_utils import stream_response
+from core.proxy_utils import UpstreamError, cached_fetch_json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q, Max
 from django.utils import timezone
-import json
 import os
 import urllib.parse
-import urllib.request
+
+# 同步推送允许修改的图标字段
+SYNC_ICON_FIELDS = ('x', 'y', 'parent_folder_id', 'title')
+
+# 同步拉取返回的字段
+SYNC_PULL_FIELDS = {
+    'icon': (
+        'id', 'title', 'x', 'y', 'parent_folder_id',
+        'content_type_id', 'object_id', 'updated_at'
+    ),
+    'resource': (
+        'id', 'title', 'description', 'kind', 'link', 'icon_class',
+        'category_id', 'updated_at'
+    ),
+    'category': (
+        'id', 'name', 'parent_id', 'icon', 'updated_at'
+    ),
+}
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -197,7 +237,7 @@ def api_files_list(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def api_search(request):
-    """搜索接口"""
+    """搜索接口：在当前租户内检索应用和资源，按 BM25 相关度排序"""
     try:
         query = request.GET.get('q', '')
         
@@ -206,20 +246,49 @@ def api_search(request):
                 'success': False,
                 'detail': '搜索关键词不能为空'
             }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # 模拟搜索结果
-        results = [
-            {
-                'id': 1,
-                'name': f'{query}_相关文档.docx',
-                'type': 'document',
-                'relevance': 0.95
-            }
-        ]
+
+        tenant = get_current_tenant(request)
+        membership = get_current_membership(request)
+        is_admin = bool(membership and membership.role in ['owner', 'admin'])
+        limit = settings.SEARCH_MAX_RESULTS
+
+        results = []
+        # 可见范围先传给检索，再截取前 limit 个
+        apps = AppEntry.objects.filter(tenant=tenant)
+        resources = Resource.objects.filter(tenant=tenant)
+        if not is_admin:
+            apps = apps.filter(Q(status='approved') | Q(author=request.user))
+            resources = resources.filter(author=request.user)
+
+        app_scores = dict(search_index(tenant, 'app', query, limit=limit, object_ids=apps.values('id')))
+        if app_scores:
+            for app in apps.filter(id__in=app_scores.keys()):
+                results.append({
+                    'id': app.id,
+                    'name': app.title,
+                    'type': 'app',
+                    'kind': app.link_type,
+                    'link': app.link,
+                    'relevance': round(app_scores[app.id], 4)
+                })
+
+        res_scores = dict(search_index(tenant, 'resource', query, limit=limit, object_ids=resources.values('id')))
+        if res_scores:
+            for res in resources.filter(id__in=res_scores.keys()):
+                results.append({
+                    'id': res.id,
+                    'name': res.title,
+                    'type': 'resource',
+                    'kind': res.kind,
+                    'link': res.file.url if res.file else res.link,
+                    'relevance': round(res_scores[res.id], 4)
+                })
+
+        results.sort(key=lambda item: -item['relevance'])
         
         return Response({
             'success': True,
-            'data': results,
+            'data': results[:limit],
             'query': query
         })
     except Exception as e:
@@ -258,6 +327,95 @@ def api_upload_file(request):
             'detail': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _jwt_user(request):
+    """非 DRF 视图的 JWT 认证（Authorization 头），认证失败返回 None"""
+    try:
+        result = JWTAuthentication().authenticate(request)
+        return result[0] if result else None
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+MEDIA_TOKEN_SALT = 'core.media_resource'
+
+def _media_token(user, res):
+    return signing.dumps([user.id, res.id], salt=MEDIA_TOKEN_SALT)
+
+def _media_user(request, pk):
+    """
+    Authorization 头，或 ?token= 里由 api_media_token 签发的令牌（<video>/<audio> 无法带请求头）：
+    令牌只对签发时的用户和这一个资源有效、MEDIA_TOKEN_MAX_AGE 秒后过期，出现在访问日志、历史记录、Referer 里也不会泄露登录凭证
+    """
+    user = _jwt_user(request)
+    raw_token = request.GET.get('token')
+    if user is not None or not raw_token:
+        return user
+    try:
+        user_id, resource_id = signing.loads(raw_token, salt=MEDIA_TOKEN_SALT, max_age=settings.MEDIA_TOKEN_MAX_AGE)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if resource_id != pk:
+        return None
+    return User.objects.filter(pk=user_id).first()
+
+def _can_access_resource(user, res):
+    """与 ResourceViewSet 一致：作者本人，或资源所属租户的 owner/admin"""
+    if res.author_id == user.id:
+        return True
+    return bool(res.tenant_id) and Membership.objects.filter(
+        user=user, tenant_id=res.tenant_id, role__in=['owner', 'admin']
+    ).exists()
+
+@csrf_exempt
+@require_http_methods(['GET', 'HEAD'])
+def media_resource(request, pk):
+    """资源文件下发（支持 Range 拖动、ETag 缓存），生产环境由前置代理实际发送文件"""
+    user = _media_user(request, pk)
+    if user is None or not user.is_active:
+        return JsonResponse({'detail': '未登录'}, status=401)
+    res = Resource.objects.select_related('blob').filter(pk=pk).first()
+    # 无权访问与不存在返回相同结果，不暴露资源是否存在
+    if not res or not res.file or not _can_access_resource(user, res):
+        return JsonResponse({'detail': '文件不存在'}, status=404)
+    try:
+        path = res.file.path
+        stat_result = os.stat(path)
+    except (OSError, NotImplementedError):
+        return JsonResponse({'detail': '文件不存在'}, status=404)
+    if res.blob_id:
+        etag = f'"{res.blob.sha256}"'
+    else:
+        etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+    ext = os.path.splitext(res.file.name)[1]
+    download_name = res.title if res.title.lower().endswith(ext.lower()) else f"{res.title}{ext}"
+    return serve_file(request, path, res.file.name, etag, download_name)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def api_media_token(request, pk):
+    """签发播放地址：带短期令牌的 media_resource 链接，供 <video>/<audio> 直接使用"""
+    res = Resource.objects.filter(pk=pk).first()
+    if not res or not res.file or not _can_access_resource(request.user, res):
+        return Response({'detail': '文件不存在'}, status=status.HTTP_404_NOT_FOUND)
+    query = urllib.parse.urlencode({'token': _media_token(request.user, res)})
+    return Response({
+        'url': f"{reverse('media_resource', args=[res.id])}?{query}",
+        'expires_in': settings.MEDIA_TOKEN_MAX_AGE,
+    })
+
+@csrf_exempt
+@require_http_methods(['GET', 'HEAD'])
+def h5_app_file(request, key, path):
+    """
+    H5 应用包内的文件（MEDIA_URL/h5apps/<sha256>/<路径>，与安装时生成的链接一致），DEBUG=False 时也能访问；
+    只下发清单中登记的文件，其余路径一律 404。配置了 MEDIA_ACCEL 时同样交给前置代理发送
+    """
+    manifest = get_manifest(key)
+    item = manifest['_paths'].get(path) if manifest else None
+    if item is None:
+        return JsonResponse({'detail': '文件不存在'}, status=404)
+    name = f"{H5_DIR}/{key}/{path}"
+    return serve_file(request, os.path.join(app_dir(key), *path.split('/')), name, f'"{item["sha256"]}"')
+
 @csrf_exempt
 def health_check(request):
     """健康检查接口"""
@@ -267,18 +425,44 @@ def health_check(request):
         'version': '1.0.0'
     })
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def api_github_repos(request):
+def _simplify_github_repos(data):
+    """只保留前端需要的字段（缓存的也是这份）"""
+    items = []
+    for repo in data.get("items", []):
+        items.append({
+            "id": repo.get("id"),
+            "name": repo.get("name"),
+            "full_name": repo.get("full_name"),
+            "description": repo.get("description"),
+            "stars": repo.get("stargazers_count"),
+            "html_url": repo.get("html_url"),
+            "homepage": repo.get("homepage"),
+            "owner": repo.get("owner", {}).get("login"),
+            "owner_avatar": repo.get("owner", {}).get("avatar_url"),
+            "topics": repo.get("topics", [])
+        })
+    return {"total": data.get("total_count", 0), "items": items}
+
+async def api_github_repos(request):
     """
     GitHub 仓库搜索代理（仅返回简化字段）
+    异步视图：等待上游期间不占用 worker（ASGI 模式下其他请求照常处理），见 proxy_utils.py
+    Django 4.2 的 csrf_exempt / require_http_methods 不支持包装协程，在函数内和函数后手动处理
+    结果按规范化后的查询参数缓存，X-Cache 响应头标明 HIT/REVALIDATED/MISS/STALE
     """
-    q = (request.GET.get('q') or '').strip()
-    sort = (request.GET.get('sort') or 'stars').strip()
-    order = (request.GET.get('order') or 'desc').strip()
-    language = (request.GET.get('language') or '').strip()
-    page = int(request.GET.get('page') or 1)
-    per_page = min(int(request.GET.get('per_page') or 20), 50)
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    user = await sync_to_async(_jwt_user)(request)
+    if user is None or not user.is_active:
+        return JsonResponse({'detail': '身份认证信息未提供。'}, status=401)
+
+    # 规范化参数：大小写、多余空白不同的同一查询共用一个缓存条目
+    q = " ".join((request.GET.get('q') or '').split())
+    sort = (request.GET.get('sort') or 'stars').strip().lower()
+    order = (request.GET.get('order') or 'desc').strip().lower()
+    language = (request.GET.get('language') or '').strip().lower()
+    page = max(int(request.GET.get('page') or 1), 1)
+    per_page = min(max(int(request.GET.get('per_page') or 20), 1), 50)
 
     query_parts = []
     if q:
@@ -296,7 +480,7 @@ def api_github_repos(request):
         "page": page,
         "per_page": per_page
     }
-    url = f"https://api.github.com/search/repositories?{urllib.parse.urlencode(params)}"
+    url = f"{settings.GITHUB_API_URL}/search/repositories?{urllib.parse.urlencode(params)}"
     headers = {
         "Accept": "application/vnd.github+json",
         "User-Agent": "zmg-webos",
@@ -306,33 +490,16 @@ def api_github_repos(request):
     if token:
         headers["Authorization"] = f"Bearer {token}"
 
-    req = urllib.request.Request(url, headers=headers)
     try:
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-    except Exception as e:
-        return Response({"success": False, "detail": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+        data, cache_status = await cached_fetch_json(url, headers, transform=_simplify_github_repos)
+    except UpstreamError as e:
+        return JsonResponse({"success": False, "detail": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
 
-    items = []
-    for repo in data.get("items", []):
-        items.append({
-            "id": repo.get("id"),
-            "name": repo.get("name"),
-            "full_name": repo.get("full_name"),
-            "description": repo.get("description"),
-            "stars": repo.get("stargazers_count"),
-            "html_url": repo.get("html_url"),
-            "homepage": repo.get("homepage"),
-            "owner": repo.get("owner", {}).get("login"),
-            "owner_avatar": repo.get("owner", {}).get("avatar_url"),
-            "topics": repo.get("topics", [])
-        })
+    response = JsonResponse({"success": True, **data})
+    response['X-Cache'] = cache_status
+    return response
 
-    return Response({
-        "success": True,
-        "total": data.get("total_count", 0),
-        "items": items
-    })
+api_github_repos.csrf_exempt = True
 
 @api_view(['GET', 'PATCH'])
 @permission_classes([IsAuthenticated])
@@ -363,35 +530,89 @@ def api_sync_settings(request):
         }
     })
 
+def _stream_sync_snapshot(user, tenant):
+    """
+    NDJSON 全量快照：服务端游标逐块读取，内存占用与数据量无关
+    游标和各表在同一个读事务中读取，是同一时刻的一致快照（PostgreSQL 设为 REPEATABLE READ，
+    SQLite 的读事务本身就是快照）；最后一行给出游标，之后用分页拉取增量
+    """
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost and connection.vendor == 'postgresql':
+            # 必须是事务中的第一条语句；已处于外层事务中（测试）时沿用外层的隔离级别
+            with connection.cursor() as db_cursor:
+                db_cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        # 快照之后的修改会在下次增量拉取中出现（幂等）
+        cursor = settled_changes(SyncChange.objects.filter(tenant_id=tenant.id)).aggregate(m=Max('id'))['m'] or 0
+        chunk_size = settings.SYNC_STREAM_CHUNK_SIZE
+        sources = (
+            ('category', Category.objects.filter(tenant=tenant)),
+            ('resource', Resource.objects.filter(author=user, tenant=tenant)),
+            ('icon', DesktopIcon.objects.filter(user=user, tenant=tenant)),
+        )
+        counts = {}
+        for kind, qs in sources:
+            counts[kind] = 0
+            rows = qs.order_by('id').values(*SYNC_PULL_FIELDS[kind])
+            for row in rows.iterator(chunk_size=chunk_size):
+                counts[kind] += 1
+                yield ndjson_line({'type': kind, 'data': row})
+    yield ndjson_line({
+        'type': 'end',
+        'cursor': cursor,
+        'counts': counts,
+        'server_time': timezone.now()
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer])
 def api_sync_pull(request):
-    """拉取云端变更"""
+    """按游标分页拉取云端变更（含删除墓碑）；Accept: application/x-ndjson 时流式返回全量快照"""
     tenant = get_current_tenant(request)
     if not tenant:
         return Response({'success': False, 'detail': '未绑定租户'}, status=status.HTTP_403_FORBIDDEN)
 
-    since = parse_client_datetime(request.data.get('since'))
-    icon_qs = DesktopIcon.objects.filter(user=request.user, tenant=tenant)
-    res_qs = Resource.objects.filter(author=request.user, tenant=tenant)
-    cat_qs = Category.objects.filter(tenant=tenant)
-
-    if since:
-        icon_qs = icon_qs.filter(updated_at__gt=since)
-        res_qs = res_qs.filter(updated_at__gt=since)
-        cat_qs = cat_qs.filter(updated_at__gt=since)
-
-    icons = list(icon_qs.values(
-        'id', 'title', 'x', 'y', 'parent_folder_id',
-        'content_type_id', 'object_id', 'updated_at'
-    ))
-    resources = list(res_qs.values(
-        'id', 'title', 'description', 'kind', 'link', 'icon_class',
-        'category_id', 'updated_at'
-    ))
-    categories = list(cat_qs.values(
-        'id', 'name', 'parent_id', 'icon', 'updated_at'
-    ))
+    if request.accepted_renderer.format == 'ndjson':
+        return stream_response(request, StreamingHttpResponse(
+            _stream_sync_snapshot(request.user, tenant),
+            content_type='application/x-ndjson; charset=utf-8'
+        ))
+
+    cursor = _to_int(request.data.get('cursor')) or 0
+    limit = _to_int(request.data.get('limit')) or settings.SYNC_PULL_PAGE_SIZE
+    limit = max(1, min(limit, settings.SYNC_PULL_MAX_PAGE_SIZE))
+
+    changes = list(
+        settled_changes(SyncChange.objects.filter(tenant_id=tenant.id, id__gt=cursor))
+        .filter(Q(kind='category') | Q(user_id=request.user.id))
+        .order_by('id')
+        .values_list('id', 'kind', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    upserts = {'icon': [], 'resource': [], 'category': []}
+    tombstones = []
+    for _, kind, object_id, action in changes:
+        if action == 'delete':
+            tombstones.append({'kind': kind, 'id': object_id})
+        else:
+            upserts[kind].append(object_id)
+
+    icons, resources, categories = [], [], []
+    if upserts['icon']:
+        icons = list(DesktopIcon.objects.filter(
+            id__in=upserts['icon'], user=request.user, tenant=tenant
+        ).values(*SYNC_PULL_FIELDS['icon']))
+    if upserts['resource']:
+        resources = list(Resource.objects.filter(
+            id__in=upserts['resource'], author=request.user, tenant=tenant
+        ).values(*SYNC_PULL_FIELDS['resource']))
+    if upserts['category']:
+        categories = list(Category.objects.filter(
+            id__in=upserts['category'], tenant=tenant
+        ).values(*SYNC_PULL_FIELDS['category']))
 
     return Response({
         'success': True,
@@ -399,6 +620,9 @@ def api_sync_pull(request):
             'icons': icons,
             'resources': resources,
             'categories': categories,
+            'tombstones': tombstones,
+            'cursor': changes[-1][0] if changes else cursor,
+            'has_more': has_more,
             'server_time': timezone.now()
         }
     })
@@ -412,44 +636,67 @@ def api_sync_push(request):
         return Response({'success': False, 'detail': '未绑定租户'}, status=status.HTTP_403_FORBIDDEN)
 
     conflict_strategy = request.data.get('conflict_strategy', 'server_wins')
-    icon_updates = request.data.get('icons', [])
-
-    updated = 0
-    skipped = 0
-
-    for payload in icon_updates:
-        icon_id = payload.get('id')
-        if not icon_id:
-            continue
-
-        icon = DesktopIcon.objects.filter(id=icon_id, user=request.user, tenant=tenant).first()
-        if not icon:
-            continue
-
-        client_updated_at = parse_client_datetime(payload.get('updated_at'))
-        if (icon.updated_at and client_updated_at and
-            icon.updated_at > client_updated_at and conflict_strategy == 'server_wins'):
-            skipped += 1
-            continue
-
-        if 'x' in payload: icon.x = payload.get('x')
-        if 'y' in payload: icon.y = payload.get('y')
-        if 'parent_folder_id' in payload:
-            icon.parent_folder_id = payload.get('parent_folder_id')
-        if 'title' in payload:
-            icon.title = payload.get('title')
-        icon.save()
-        updated += 1
-
-    pref, _ = SyncPreference.objects.get_or_create(user=request.user, tenant=tenant)
-    pref.last_sync_at = timezone.now()
-    pref.save()
+    icon_updates = [p for p in request.data.get('icons', []) if p.get('id')]
+
+    applied, conflicts, missing = [], [], []
+    changed_icons, changed_fields = {}, set()
+
+    # 读取、冲突判断和写回在同一事务里，涉及的图标行加锁：
+    # 期间网页端编辑或另一台设备的推送会等本次提交后再进行，server_wins 不会被 bulk_update 覆盖
+    with transaction.atomic():
+        # 一次查询取出所有涉及的图标，内存中完成冲突判断
+        icon_ids = {_to_int(p.get('id')) for p in icon_updates} - {None}
+        icons = DesktopIcon.objects.select_for_update().filter(
+            id__in=icon_ids, user=request.user, tenant=tenant
+        ).in_bulk() if icon_ids else {}
+        # 拿到行锁之后再取时间，晚于此前并发写入的 updated_at
+        now = timezone.now()
+
+        for payload in icon_updates:
+            icon_id = payload.get('id')
+            icon = icons.get(_to_int(icon_id))
+            if not icon:
+                missing.append(icon_id)
+                continue
+
+            client_updated_at = parse_client_datetime(payload.get('updated_at'))
+            if (icon.updated_at and client_updated_at and
+                icon.updated_at > client_updated_at and conflict_strategy == 'server_wins'):
+                conflicts.append({
+                    'id': icon.id, 'x': icon.x, 'y': icon.y, 'title': icon.title,
+                    'parent_folder_id': icon.parent_folder_id, 'updated_at': icon.updated_at
+                })
+                continue
+
+            for field in SYNC_ICON_FIELDS:
+                if field in payload and getattr(icon, field) != payload.get(field):
+                    setattr(icon, field, payload.get(field))
+                    changed_fields.add(field)
+                    changed_icons[icon.id] = icon
+            if icon.id in changed_icons:
+                # bulk_update 不会触发 auto_now，手动维护
+                icon.updated_at = now
+            applied.append([icon.id, icon.updated_at])
+
+        if changed_icons:
+            DesktopIcon.objects.bulk_update(
+                changed_icons.values(), sorted(changed_fields) + ['updated_at'], batch_size=500
+            )
+            # bulk_update 不发送 post_save，需手动写入变更日志
+            record_changes(DesktopIcon, changed_icons.values())
+
+        pref, _ = SyncPreference.objects.get_or_create(user=request.user, tenant=tenant)
+        pref.last_sync_at = now
+        pref.save()
 
     return Response({
         'success': True,
         'data': {
-            'updated': updated,
-            'skipped': skipped,
+            'updated': len(applied),
+            'skipped': len(conflicts),
+            'applied': applied,
+            'conflicts': conflicts,
+            'missing': missing,
             'server_time': pref.last_sync_at
         }
-    })
\ No newline at end of file
+    })
@@ -0,0 +1,33 @@
+"""
+ASGI 模式（GUNICORN_MODE=asgi）下的流式响应
+Django 4.2 的 ASGIHandler 遇到同步迭代器会先 sync_to_async(list) 整个读进内存再发送，
+文件下发（含 Range 拖动）和 NDJSON 快照就失去了流式效果、内存随数据量增长。
+这里把同步迭代器包成异步迭代器，每次只在请求线程中取一块；WSGI 下原样返回
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+_END = object()
+
+
+def is_asgi(request):
+    # DRF 的 Request 包着 Django 的 HttpRequest
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+async def _iterate_in_thread(iterator):
+    # thread_sensitive：与视图同一个线程，数据库游标和连接仍然可用
+    next_part = sync_to_async(next, thread_sensitive=True)
+    while True:
+        part = await next_part(iterator, _END)
+        if part is _END:
+            return
+        yield part
+
+
+def stream_response(request, response):
+    """ASGI 请求时把流式响应的内容换成逐块读取的异步迭代器"""
+    if is_asgi(request) and response.streaming and not response.is_async:
+        response.streaming_content = _iterate_in_thread(iter(response.streaming_content))
+    return response
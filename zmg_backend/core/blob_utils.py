@@ -0,0 +1,181 @@
+"""
+内容寻址存储：上传的文件边写边算 SHA-256，相同内容只保存一份（blobs/ab/<sha256>.<ext>），
+Resource.blob 引用它并维护 ref_count，最后一个引用释放时才删除文件
+"""
+
+import hashlib
+import logging
+import os
+import uuid
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from .h5_utils import remove_package
+from .models import Blob, Resource
+from .thumbnails import remove_thumbnails
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = 'blobs'
+READ_SIZE = 1024 * 1024
+
+
+def _storage():
+    return Resource._meta.get_field('file').storage
+
+
+def blob_name(digest, filename):
+    ext = os.path.splitext(filename or '')[1].lower()
+    if len(ext) > 16 or not ext[1:].isalnum():
+        ext = ''
+    return f"{BLOB_DIR}/{digest[:2]}/{digest}{ext}"
+
+
+def blob_path(blob):
+    return _storage().path(blob.name)
+
+
+def hash_path(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for piece in iter(lambda: fh.read(READ_SIZE), b''):
+            digest.update(piece)
+    return digest.hexdigest()
+
+
+def _acquire(digest):
+    """已有相同内容时引用数加一并返回，否则返回 None"""
+    if Blob.objects.filter(sha256=digest).update(ref_count=F('ref_count') + 1):
+        return Blob.objects.get(sha256=digest)
+    return None
+
+
+def store_path(path, filename, digest=None):
+    """
+    把已落盘的临时文件（须与 MEDIA_ROOT 在同一文件系统）纳入存储，返回已加一次引用的 Blob
+    内容已存在时删除临时文件；否则直接改名为 blob 文件，不复制数据
+    """
+    if digest is None:
+        digest = hash_path(path)
+    blob = _acquire(digest)
+    if blob is None:
+        name = blob_name(digest, filename)
+        dest = _storage().path(name)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(path, dest)
+        try:
+            with transaction.atomic():
+                return Blob.objects.create(sha256=digest, name=name, size=os.path.getsize(dest), ref_count=1)
+        except IntegrityError:
+            # 并发上传了相同内容且对方先建档：内容一致，改为引用对方的文件
+            blob = _acquire(digest)
+            if blob is None:
+                raise
+            if blob.name != name:
+                os.remove(dest)
+            return blob
+        except Exception:
+            # 建档失败：文件放回原处，调用方可以重试
+            os.replace(dest, path)
+            raise
+    os.remove(path)
+    return blob
+
+
+def _spool(fileobj):
+    """流式写入临时文件并同时计算摘要（上传文件只读一遍），返回 (临时文件路径, sha256)"""
+    os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+    tmp = os.path.join(settings.UPLOAD_TEMP_DIR, f"{uuid.uuid4().hex}.blob")
+    digest = hashlib.sha256()
+    pieces = fileobj.chunks() if hasattr(fileobj, 'chunks') else iter(lambda: fileobj.read(READ_SIZE), b'')
+    try:
+        with open(tmp, 'wb') as out:
+            for piece in pieces:
+                digest.update(piece)
+                out.write(piece)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return tmp, digest.hexdigest()
+
+
+def _store_spooled(tmp, filename, digest):
+    try:
+        return store_path(tmp, filename, digest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def store_file(fileobj, filename):
+    """上传文件直接入库，返回已加一次引用的 Blob"""
+    tmp, digest = _spool(fileobj)
+    return _store_spooled(tmp, filename, digest)
+
+
+def stage_uploaded_file(resource):
+    """
+    Resource 保存前调用：file 是尚未写入存储的新上传文件时先落到临时文件，字段直接记为 blob 存储名。
+    真正入库（移动文件、加引用）由 commit_staged_file 在事务提交后完成，保存回滚不会留下孤立文件和多出的引用数；
+    回滚后遗留的临时文件由 purge_stale_sessions 清理。返回暂存信息，无新文件返回 None
+    """
+    field_file = resource.file
+    if not field_file or field_file._committed:
+        return None
+    filename = field_file.name
+    tmp, digest = _spool(field_file.file)
+    field_file.name = blob_name(digest, filename)
+    field_file._committed = True
+    return tmp, filename, digest
+
+
+def commit_staged_file(resource, staged):
+    """事务提交后调用：暂存文件入库，资源改为引用该 blob，并释放被替换的旧 blob"""
+    previous = resource.blob_id
+    blob = _store_spooled(*staged)
+    if not Resource.objects.filter(pk=resource.pk).update(blob=blob, file=blob.name):
+        # 提交前资源已被删除
+        release(blob.id)
+        return
+    resource.blob = blob
+    resource.file.name = blob.name
+    if previous and previous != blob.id:
+        release(previous)
+
+
+def release(blob_id):
+    """
+    引用数减一；归零时删除记录和文件，返回是否删除了文件。
+    全程持有 Blob 行锁，文件在提交前删除：并发 store_path 对同一内容加引用（UPDATE）或重新建档（INSERT 同一摘要）
+    都要等这里结束，不会引用到即将被删的文件
+    """
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(pk=blob_id).first()
+        if blob is None:
+            return False
+        if blob.ref_count > 1:
+            Blob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') - 1)
+            return False
+        referenced = Resource.objects.filter(blob_id=blob_id).count()
+        if referenced:
+            # 计数与实际引用不一致，按实际引用修正
+            Blob.objects.filter(pk=blob_id).update(ref_count=referenced)
+            logger.warning("blob %s ref_count drifted, recounted", blob_id)
+            return False
+        blob.delete()
+        _storage().delete(blob.name)
+        remove_thumbnails(blob.name)
+        # H5 包的解压目录与包文件同生命周期
+        remove_package(blob.sha256)
+    return True
+
+
+def recount():
+    """按实际引用重算所有 ref_count，返回修正的条数"""
+    fixed = 0
+    actual = dict(Resource.objects.filter(blob__isnull=False).values('blob').annotate(n=Count('id')).values_list('blob', 'n'))
+    for blob_id, ref_count in Blob.objects.values_list('id', 'ref_count').iterator():
+        if ref_count != actual.get(blob_id, 0):
+            Blob.objects.filter(pk=blob_id).update(ref_count=actual.get(blob_id, 0))
+            fixed += 1
+    return fixed
@@ -0,0 +1,258 @@
+"""
+应用浏览/点赞计数缓冲：请求只在进程内累加增量，后台线程每 COUNTER_FLUSH_INTERVAL 秒
+用 F() 表达式批量写回 AppEntry。
+浏览按 (用户, 应用, APP_VIEW_DEDUP_WINDOW) 去重后记为事件，写回时累加到小时/天汇总表，
+明细（AppView）按 APP_VIEW_RAW_SAMPLE_RATE 抽样后 bulk_create 追加，超过保留期由 prune_app_views 删除。
+点赞行（AppLike）由请求同步写入，缓冲只记录哪些应用的点赞有变化，写回时按 AppLike 重算 like_count，
+因此与其他进程尚未写回的缓冲不会重复计数。
+计数最多滞后一个刷新周期；进程异常退出丢失的增量由 reconcile_app_counters 按汇总表修正
+"""
+
+import atexit
+import logging
+import os
+import random
+import threading
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from .models import AppComment, AppEntry, AppLike, AppView, AppViewDaily, AppViewHourly
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ('view_count', 'like_count')
+PRUNE_BATCH_SIZE = 5000
+
+_lock = threading.Lock()
+_deltas = defaultdict(lambda: defaultdict(int))   # app_id -> {字段: 增量}
+_views = []                                       # 待写回的浏览事件 (app_id, user_id, 时间)
+_owner_pid = None
+_flusher = None
+_wake = threading.Event()                         # 缓冲过大时提前唤醒刷新线程
+
+
+def _check_owner():
+    """fork 出的子进程不继承父进程的缓冲和刷新线程（调用方持有 _lock）"""
+    global _owner_pid, _flusher, _wake
+    if _owner_pid != os.getpid():
+        _deltas.clear()
+        _views.clear()
+        _flusher = None
+        _wake = threading.Event()
+        _owner_pid = os.getpid()
+
+
+def _flush_quietly():
+    """写回失败时增量已放回缓冲，下次重试；不把异常抛给浏览/点赞请求"""
+    try:
+        flush()
+    except Exception:
+        logger.exception("flushing app counters failed")
+
+
+def _flush_loop(interval):
+    while True:
+        _wake.wait(interval)
+        _wake.clear()
+        try:
+            _flush_quietly()
+        finally:
+            connection.close()
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is None or not _flusher.is_alive():
+        _flusher = threading.Thread(
+            target=_flush_loop, args=(settings.COUNTER_FLUSH_INTERVAL,),
+            name='app-counter-flush', daemon=True
+        )
+        _flusher.start()
+
+
+def _add(app_id, field, delta, view=None):
+    with _lock:
+        _check_owner()
+        _deltas[app_id][field] += delta
+        if view is not None:
+            _views.append(view)
+        full = len(_views) >= settings.COUNTER_FLUSH_MAX_PENDING or len(_deltas) >= settings.COUNTER_FLUSH_MAX_PENDING
+        pending = _deltas[app_id][field]
+        buffered = settings.COUNTER_FLUSH_INTERVAL > 0
+        if buffered:
+            _start_flusher()
+            if full:
+                # 缓冲过大：交给刷新线程立即写回，不占用当前请求
+                _wake.set()
+    if not buffered:
+        # 未开启缓冲：当前请求直接写回
+        _flush_quietly()
+    return pending
+
+
+def pending(app_id, field):
+    """本进程中尚未写回的增量"""
+    with _lock:
+        _check_owner()
+        counts = _deltas.get(app_id)
+        return counts.get(field, 0) if counts else 0
+
+
+def _is_duplicate_view(app_id, user_id):
+    """
+    同一用户在去重窗口内重复浏览同一应用只算一次（窗口内第一次 add 成功）
+    标记在 default 缓存中，只有共享后端（file/redis）才跨 worker 去重；locmem 下最多按 worker 数重复计数
+    """
+    window = settings.APP_VIEW_DEDUP_WINDOW
+    if not window or user_id is None:
+        return False
+    return not cache.add(f"app-view:{app_id}:{user_id}", 1, timeout=window)
+
+
+def record_view(app, user=None):
+    """记一次浏览，返回包含本进程未写回部分的估计浏览数"""
+    user_id = user.pk if user and user.is_authenticated else None
+    if _is_duplicate_view(app.pk, user_id):
+        return app.view_count + pending(app.pk, 'view_count')
+    return app.view_count + _add(app.pk, 'view_count', 1, (app.pk, user_id, timezone.now()))
+
+
+def record_like(app, delta):
+    """点赞数变化（AppLike 行由调用方同步写入以保证唯一性），返回估计点赞数"""
+    return max(app.like_count + _add(app.pk, 'like_count', delta), 0)
+
+
+def _bump(model, n, **lookup):
+    """汇总行 views += n，不存在时创建；并发创建冲突时改为累加"""
+    if model.objects.filter(**lookup).update(views=F('views') + n):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(views=n, **lookup)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(views=F('views') + n)
+
+
+def _write_views(views, existing):
+    hourly = Counter()
+    daily = Counter()
+    raw = []
+    rate = settings.APP_VIEW_RAW_SAMPLE_RATE
+    for app_id, user_id, at in views:
+        if app_id not in existing:
+            continue
+        hourly[app_id, at.replace(minute=0, second=0, microsecond=0)] += 1
+        daily[app_id, timezone.localdate(at)] += 1
+        if rate >= 1 or random.random() < rate:
+            raw.append(AppView(app_id=app_id, user_id=user_id, created_at=at))
+    AppView.objects.bulk_create(raw, batch_size=500)
+    for (app_id, hour), n in hourly.items():
+        _bump(AppViewHourly, n, app_id=app_id, hour=hour)
+    for (app_id, day), n in daily.items():
+        _bump(AppViewDaily, n, app_id=app_id, day=day)
+
+
+def flush():
+    """把缓冲写回数据库，返回写回的应用数；失败时增量放回缓冲，下次重试"""
+    with _lock:
+        _check_owner()
+        deltas = {app_id: dict(counts) for app_id, counts in _deltas.items()}
+        views = list(_views)
+        _deltas.clear()
+        _views.clear()
+    if not deltas and not views:
+        return 0
+    try:
+        with transaction.atomic():
+            existing = set(AppEntry.objects.filter(id__in=deltas.keys()).values_list('id', flat=True))
+            # 期间被删除的应用直接丢弃其计数
+            _write_views(views, existing)
+            # 点赞数按 AppLike 重算而不是累加增量：reconcile 已按 AppLike 修正过的应用不会被再加一次
+            liked = {app_id for app_id, counts in deltas.items() if counts.get('like_count') and app_id in existing}
+            likes = dict(
+                AppLike.objects.filter(app_id__in=liked).values('app').annotate(n=Count('id')).values_list('app', 'n')
+            )
+            for app_id, counts in deltas.items():
+                if app_id not in existing:
+                    continue
+                changes = {field: F(field) + delta for field, delta in counts.items() if delta and field != 'like_count'}
+                if app_id in liked:
+                    changes['like_count'] = likes.get(app_id, 0)
+                if changes:
+                    AppEntry.objects.filter(pk=app_id).update(**changes)
+    except Exception:
+        with _lock:
+            _check_owner()
+            for app_id, counts in deltas.items():
+                for field, delta in counts.items():
+                    _deltas[app_id][field] += delta
+            _views[:0] = views
+        raise
+    return len(deltas)
+
+
+def reconcile(app_ids=None):
+    """
+    按天汇总表（浏览）、AppLike（点赞）、AppComment（评论）重算计数，返回修正的应用数
+    浏览汇总与 view_count 在同一次写回中更新，其他进程尚未写回的浏览两边都没有计入；点赞写回时按 AppLike 重算。
+    因此无需等待其他进程写回，重算后也不会重复计数
+    """
+    flush()
+    qs = AppEntry.objects.all()
+    if app_ids is not None:
+        qs = qs.filter(id__in=app_ids)
+    views = dict(AppViewDaily.objects.filter(app__in=qs).values('app').annotate(n=Sum('views')).values_list('app', 'n'))
+    likes = dict(AppLike.objects.filter(app__in=qs).values('app').annotate(n=Count('id')).values_list('app', 'n'))
+    comments = dict(AppComment.objects.filter(app__in=qs).values('app').annotate(n=Count('id')).values_list('app', 'n'))
+    fixed = 0
+    rows = qs.values_list('id', 'view_count', 'like_count', 'comment_count').iterator()
+    for app_id, view_count, like_count, comment_count in rows:
+        actual = {
+            'view_count': views.get(app_id, 0),
+            'like_count': likes.get(app_id, 0),
+            'comment_count': comments.get(app_id, 0),
+        }
+        if (view_count, like_count, comment_count) != tuple(actual.values()):
+            AppEntry.objects.filter(pk=app_id).update(**actual)
+            fixed += 1
+    return fixed
+
+
+def _delete_before(model, field, cutoff):
+    """按主键分批删除，避免一次删除大量行长时间锁表"""
+    deleted = 0
+    while True:
+        ids = list(model.objects.filter(**{f"{field}__lt": cutoff}).values_list('id', flat=True)[:PRUNE_BATCH_SIZE])
+        if not ids:
+            return deleted
+        deleted += model.objects.filter(id__in=ids).delete()[0]
+
+
+def prune_views(now=None):
+    """删除超过保留期的浏览明细和小时汇总（天汇总永久保留），返回 (明细数, 小时汇总数)"""
+    now = now or timezone.now()
+    raw = _delete_before(AppView, 'created_at', now - timezone.timedelta(days=settings.APP_VIEW_RAW_RETENTION_DAYS))
+    hourly = _delete_before(AppViewHourly, 'hour', now - timezone.timedelta(days=settings.APP_VIEW_HOURLY_RETENTION_DAYS))
+    return raw, hourly
+
+
+def daily_views(app, days):
+    """最近 days 天（含今天）每天的浏览数，没有浏览的日期补 0"""
+    today = timezone.localdate()
+    start = today - timezone.timedelta(days=days - 1)
+    rows = dict(AppViewDaily.objects.filter(app=app, day__gte=start).values_list('day', 'views'))
+    return [
+        {'date': (start + timezone.timedelta(days=i)).isoformat(), 'views': rows.get(start + timezone.timedelta(days=i), 0)}
+        for i in range(days)
+    ]
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception("flushing app counters at exit failed")
@@ -0,0 +1,63 @@
+"""
+数据库路由：写入和大部分读取走主库，应用/分类/资源在 list、retrieve 请求中读只读副本（settings.DATABASE_REPLICAS）
+是否读副本由 ReplicaRoutingMiddleware 按请求决定，记在 contextvar 里；请求之外（管理命令、后台线程）一律走主库。
+写请求（POST/PUT/PATCH/DELETE）的响应带一个短期 cookie，有效期内同一客户端只读主库，
+刚写入的数据不会因为复制延迟在副本上读不到（前端默认与后端同源，cookie 会自动带上）
+"""
+
+import random
+from contextvars import ContextVar
+from django.conf import settings
+
+REPLICA_MODELS = {'core.appentry', 'core.category', 'core.resource'}
+REPLICA_ACTIONS = {'list', 'retrieve'}
+PIN_COOKIE = 'zmg_db_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# 当前请求读副本时为副本别名；同一请求内固定一个副本，避免各副本延迟不同读到前后不一致的数据
+_read_alias = ContextVar('replica_read_alias', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias and model._meta.label_lower in REPLICA_MODELS:
+            return alias
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 副本是主库的完整拷贝
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 副本的表结构随复制同步，不单独迁移
+        return db == 'default'
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.set(None)
+        if request.method not in SAFE_METHODS and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.DATABASE_REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.DATABASE_REPLICAS or request.COOKIES.get(PIN_COOKIE):
+            return None
+        # DRF ViewSet.as_view() 在视图函数上记录了 HTTP 方法 -> action 的映射
+        actions = getattr(view_func, 'actions', None) or {}
+        if actions.get(request.method.lower()) in REPLICA_ACTIONS:
+            _read_alias.set(random.choice(settings.DATABASE_REPLICAS))
+        return None
@@ -0,0 +1,135 @@
+"""
+桌面图标批量加载工具：避免序列化列表时逐个图标查询
+"""
+
+import hashlib
+from collections import defaultdict
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, F, Max, Q, Window
+from django.db.models.functions import RowNumber
+from .models import DesktopIcon, Resource, Category
+
+PREVIEW_SIZE = 4
+
+
+def load_content_objects(icons):
+    """
+    按 content_type_id 分组，一次性取回所有图标指向的 Resource / Category，
+    并写入 GenericForeignKey 缓存，序列化时访问 content_object 不再发查询
+    """
+    ct_field = DesktopIcon._meta.get_field('content_type')
+    gfk = DesktopIcon._meta.get_field('content_object')
+
+    ids_by_ct = defaultdict(set)
+    for icon in icons:
+        if icon.content_type_id is None:
+            continue
+        # ContentType 走进程内缓存，不会查库
+        ct_field.set_cached_value(icon, ContentType.objects.get_for_id(icon.content_type_id))
+        if gfk.is_cached(icon) or icon.object_id is None:
+            continue
+        ids_by_ct[icon.content_type_id].add(icon.object_id)
+
+    targets = {}
+    for ct_id, ids in ids_by_ct.items():
+        model = ContentType.objects.get_for_id(ct_id).model_class()
+        if model is None:
+            continue
+        targets[ct_id] = model._default_manager.in_bulk(ids)
+
+    for icon in icons:
+        if icon.content_type_id not in targets or gfk.is_cached(icon):
+            continue
+        gfk.set_cached_value(icon, targets[icon.content_type_id].get(icon.object_id))
+    return icons
+
+
+def load_folder_previews(icons):
+    """
+    一次窗口查询取出每个文件夹的前 4 个子图标，再一次查询取封面（优先小缩略图），
+    结果挂在 icon._folder_preview 上供序列化器使用
+    """
+    category_ct = ContentType.objects.get_for_model(Category)
+    resource_ct = ContentType.objects.get_for_model(Resource)
+
+    folders = {}
+    for icon in icons:
+        if icon.content_type_id != category_ct.id:
+            continue
+        cat = icon.content_object
+        if cat:
+            folders.setdefault(cat.id, []).append(icon)
+        else:
+            icon._folder_preview = []
+    if not folders:
+        return icons
+
+    children = (
+        DesktopIcon.objects
+        .filter(parent_folder_id__in=folders.keys())
+        .annotate(preview_rank=Window(
+            RowNumber(),
+            partition_by=[F('parent_folder_id')],
+            order_by=[F('created_at').asc(), F('id').asc()],
+        ))
+        .filter(preview_rank__lte=PREVIEW_SIZE)
+        .order_by('parent_folder_id', 'preview_rank')
+        .values_list('parent_folder_id', 'content_type_id', 'object_id')
+    )
+    children = list(children)
+
+    resource_ids = {oid for _, ct_id, oid in children if ct_id == resource_ct.id and oid is not None}
+    covers = {}
+    if resource_ids:
+        # 预览图优先用小缩略图（几 KB），没有时才退回原封面
+        cover_field = Resource._meta.get_field('cover')
+        rows = Resource.objects.filter(id__in=resource_ids).values_list('id', 'cover', 'thumbnails')
+        for res_id, cover, thumbs in rows:
+            if thumbs and thumbs.get('small'):
+                covers[res_id] = cover_field.storage.url(thumbs['small'])
+            elif cover:
+                covers[res_id] = cover_field.storage.url(cover)
+
+    previews = defaultdict(list)
+    for folder_id, ct_id, object_id in children:
+        item = {'type': 'unknown', 'cover': None}
+        if ct_id:
+            item['type'] = ContentType.objects.get_for_id(ct_id).model
+            if ct_id == resource_ct.id:
+                item['cover'] = covers.get(object_id)
+        previews[folder_id].append(item)
+
+    for folder_id, folder_icons in folders.items():
+        for icon in folder_icons:
+            icon._folder_preview = previews.get(folder_id, [])
+    return icons
+
+
+def desktop_version(icons):
+    """
+    列表内容的版本戳（用作 ETag），三次聚合查询，不取出图标本身：
+    图标的数量和最新修改时间；文件夹及其子图标（预览）的修改时间和数量；
+    图标和预览引用的资源的最新修改时间（缩略图生成、改名等都会更新 updated_at）；
+    资源和分类被删除时图标仍然留着（没有反向级联），所以还要计入仍然存在的目标数
+    """
+    category_ct = ContentType.objects.get_for_model(Category)
+    resource_ct = ContentType.objects.get_for_model(Resource)
+    own = icons.aggregate(n=Count('id'), latest=Max('updated_at'))
+
+    listed = DesktopIcon.objects.filter(pk__in=icons.values('pk'))
+    folder_ids = listed.filter(content_type=category_ct).values('object_id')
+    folders = Category.objects.filter(id__in=folder_ids).aggregate(
+        n=Count('id', distinct=True), latest=Max('updated_at'),
+        children=Count('icons_inside'), children_latest=Max('icons_inside__updated_at')
+    )
+    child_resources = DesktopIcon.objects.filter(parent_folder_id__in=folder_ids, content_type=resource_ct)
+    resources = Resource.objects.filter(
+        Q(id__in=listed.filter(content_type=resource_ct).values('object_id'))
+        | Q(id__in=child_resources.values('object_id'))
+    ).aggregate(n=Count('id'), latest=Max('updated_at'))
+
+    parts = [
+        own['n'], own['latest'], folders['n'], folders['latest'], folders['children'], folders['children_latest'],
+        resources['n'], resources['latest'],
+    ]
+    return hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()
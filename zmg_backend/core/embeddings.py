@@ -0,0 +1,280 @@
+"""
+资源向量：嵌入模型 + 近邻索引（相关资源推荐）
+向量统一为 float32、L2 归一化，内积即余弦相似度；以定长字节存入 Resource.embedding
+嵌入模型可通过 settings.EMBEDDING_BACKEND（点分路径）替换
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .cache_utils import TTLCache
+from .models import Resource
+from .tokenizer import tokenize
+
+logger = logging.getLogger(__name__)
+
+# --- 嵌入模型 ---
+
+class HashingEmbedder:
+    """
+    特征哈希嵌入：分词后把每个词哈希到固定维度（带符号，减少冲突偏差），词频取 1+log(tf)
+    无需训练，相同词汇的文本向量相近；换成真实模型时保持 dim / embed 接口即可
+    """
+    def __init__(self, dim=None):
+        self.dim = dim or settings.EMBEDDING_DIM
+
+    def _bucket(self, term):
+        h = int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+        return h % self.dim, (1.0 if h >> 63 else -1.0)
+
+    def embed(self, texts):
+        """texts -> (n, dim) float32 矩阵，空文本得到全零行"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term, tf in Counter(tokenize(text or '')).items():
+                index, sign = self._bucket(term)
+                matrix[row, index] += sign * (1.0 + math.log(tf))
+        return normalize_rows(matrix)
+
+
+@lru_cache(maxsize=None)
+def get_embedder():
+    return import_string(settings.EMBEDDING_BACKEND)()
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def resource_embedding_text(resource):
+    return ' '.join([resource.title, resource.description or '', (resource.ai_tags or '').replace(',', ' ')])
+
+
+def encode_vector(vector):
+    return np.asarray(vector, dtype='<f4').tobytes()
+
+
+def decode_vector(data):
+    return np.frombuffer(bytes(data), dtype='<f4')
+
+
+def embed_resources(resources):
+    """批量计算并写回 embedding（不触发 save 信号），返回处理数"""
+    resources = list(resources)
+    if not resources:
+        return 0
+    texts = [resource_embedding_text(res) for res in resources]
+    vectors = get_embedder().embed(texts)
+    now = timezone.now()
+    for res, text, vector in zip(resources, texts, vectors):
+        res.embedding = encode_vector(vector) if vector.any() else None
+        res.embedding_text = text
+        # 租户索引的版本戳取 MAX(updated_at)，不更新的话重算的向量不会进入索引
+        res.updated_at = now
+    Resource.objects.bulk_update(resources, ['embedding', 'embedding_text', 'updated_at'], batch_size=500)
+    return len(resources)
+
+
+# --- 近邻索引 ---
+
+class BruteForceIndex:
+    """精确检索：一次矩阵-向量乘法 + argpartition 取 top-k；ids 升序存放"""
+    def __init__(self, ids, matrix):
+        order = np.argsort(ids)
+        self.ids = np.asarray(ids, dtype=np.int64)[order]
+        self.matrix = np.ascontiguousarray(matrix[order], dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _rows_for(self, object_ids):
+        object_ids = np.unique(np.fromiter(object_ids, dtype=np.int64))
+        return np.intersect1d(self.ids, object_ids, assume_unique=True, return_indices=True)[1]
+
+    def _top_k(self, rows, scores, k, exclude):
+        if exclude:
+            keep = ~np.isin(self.ids[rows], list(exclude))
+            rows, scores = rows[keep], scores[keep]
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.lexsort((self.ids[rows], -scores))
+        return [(int(self.ids[r]), float(s)) for r, s in zip(rows[order], scores[order])]
+
+    def _candidate_rows(self, vector):
+        """待精确打分的行号；None 表示全部"""
+        return None
+
+    def search(self, vector, k=10, exclude=None, candidates=None):
+        """
+        返回 [(object_id, 相似度), ...]，按相似度降序
+        candidates 给定时只在这些 id 中精确检索（用于按可见性过滤）
+        """
+        if not len(self.ids) or k <= 0:
+            return []
+        rows = self._rows_for(candidates) if candidates is not None else self._candidate_rows(vector)
+        if rows is None:
+            return self._top_k(np.arange(len(self.ids)), self.matrix @ vector, k, exclude)
+        return self._top_k(rows, self.matrix[rows] @ vector, k, exclude)
+
+
+class IVFIndex(BruteForceIndex):
+    """
+    倒排文件（IVF）近似索引：k-means 把向量分到 nlist 个簇，查询只扫描最近的 nprobe 个簇
+    簇内行号按簇连续存放（order + offsets），不复制向量矩阵
+    """
+    def __init__(self, ids, matrix, nlist=None, nprobe=None, iterations=10, seed=0):
+        super().__init__(ids, matrix)
+        n = len(self.ids)
+        self.nlist = max(1, min(nlist or int(math.sqrt(n)), n))
+        self.nprobe = min(nprobe or settings.EMBEDDING_IVF_NPROBE, self.nlist)
+        rng = np.random.default_rng(seed)
+        self.centroids = self._train(rng, iterations)
+        assign = self._assign(self.matrix)
+        self.order = np.argsort(assign, kind='stable')
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=self.nlist))])
+
+    def _assign(self, matrix, chunk=8192):
+        return np.concatenate([
+            np.argmax(matrix[start:start + chunk] @ self.centroids.T, axis=1)
+            for start in range(0, len(matrix), chunk)
+        ]) if len(matrix) else np.zeros(0, dtype=np.int64)
+
+    def _train(self, rng, iterations):
+        # 在采样上训练球面 k-means（质心归一化），每簇约 64 个样本足够
+        sample_size = min(len(self.ids), self.nlist * 64)
+        sample = self.matrix[rng.choice(len(self.ids), sample_size, replace=False)]
+        self.centroids = sample[rng.choice(sample_size, self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = self._assign(sample)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assign, sample)
+            empty = ~sums.any(axis=1)
+            # 空簇重新随机取样，避免质心退化
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            self.centroids = normalize_rows(sums)
+        return self.centroids
+
+    def _candidate_rows(self, vector):
+        centroid_scores = self.centroids @ vector
+        if self.nprobe < self.nlist:
+            probe = np.argpartition(-centroid_scores, self.nprobe - 1)[:self.nprobe]
+        else:
+            probe = np.arange(self.nlist)
+        return np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+
+
+def build_index(ids, matrix):
+    """数量超过阈值时用 IVF，否则精确检索（小租户精确检索已足够快）"""
+    if len(ids) and len(ids) >= settings.EMBEDDING_IVF_THRESHOLD:
+        return IVFIndex(ids, matrix)
+    return BruteForceIndex(ids, matrix)
+
+
+# 租户索引缓存：(版本戳, 上次检查时间, 索引)
+_index_cache = TTLCache(maxsize=64, ttl=settings.EMBEDDING_INDEX_TTL)
+# 每个租户一把构建锁，不同租户的构建互不阻塞；_rebuilding 记录正在后台重建的租户
+_locks_guard = threading.Lock()
+_build_locks = {}
+_rebuilding = set()
+
+
+def _load_tenant_vectors(tenant_id, dim):
+    rows = Resource.objects.filter(tenant_id=tenant_id, embedding__isnull=False).values_list('id', 'embedding')
+    ids, vectors = [], []
+    for object_id, data in rows.iterator(chunk_size=2000):
+        vector = decode_vector(data)
+        # 更换嵌入模型后，旧维度的向量在重新计算前跳过
+        if len(vector) == dim:
+            ids.append(object_id)
+            vectors.append(vector)
+    matrix = np.vstack(vectors) if vectors else np.zeros((0, dim), dtype=np.float32)
+    return np.asarray(ids, dtype=np.int64), matrix
+
+
+def _tenant_stamp(tenant_id):
+    return tuple(
+        Resource.objects.filter(tenant_id=tenant_id, embedding__isnull=False)
+        .aggregate(n=Count('id'), last=Max('updated_at')).values()
+    )
+
+
+def _build_lock(tenant_id):
+    with _locks_guard:
+        return _build_locks.setdefault(tenant_id, threading.Lock())
+
+
+def _build(tenant_id, stamp):
+    index = build_index(*_load_tenant_vectors(tenant_id, get_embedder().dim))
+    _index_cache.set(tenant_id, (stamp, time.monotonic(), index))
+    return index
+
+
+def _rebuild_in_background(tenant_id, stamp):
+    with _locks_guard:
+        if tenant_id in _rebuilding:
+            return
+        _rebuilding.add(tenant_id)
+
+    def run():
+        try:
+            with _build_lock(tenant_id):
+                _build(tenant_id, stamp)
+        except Exception:
+            logger.exception("rebuilding vector index for tenant %s failed", tenant_id)
+        finally:
+            with _locks_guard:
+                _rebuilding.discard(tenant_id)
+            connection.close()
+
+    threading.Thread(target=run, name=f'vector-index-{tenant_id}', daemon=True).start()
+
+
+def get_tenant_index(tenant_id):
+    """
+    租户近邻索引（进程内缓存）。版本戳（向量数 + 最后修改时间）每 EMBEDDING_INDEX_CHECK_INTERVAL 秒才查一次；
+    变化时继续用旧索引，由后台线程重建（IVF 训练较慢，不放在请求里）。只有进程内还没有索引时才在请求中构建
+    """
+    cached = _index_cache.get(tenant_id)
+    now = time.monotonic()
+    if cached and now - cached[1] < settings.EMBEDDING_INDEX_CHECK_INTERVAL:
+        return cached[2]
+    stamp = _tenant_stamp(tenant_id)
+    if cached:
+        # 保留旧版本戳：后台重建失败时，下次检查会再次发现变化
+        _index_cache.set(tenant_id, (cached[0], now, cached[2]))
+        if cached[0] != stamp:
+            _rebuild_in_background(tenant_id, stamp)
+        return cached[2]
+    with _build_lock(tenant_id):
+        cached = _index_cache.get(tenant_id)
+        if cached and cached[0] == stamp:
+            return cached[2]
+        return _build(tenant_id, stamp)
+
+
+def related_resources(resource, k=10, candidates=None):
+    """与 resource 最相似的同租户资源 [(id, 相似度), ...]；资源尚无向量时返回空"""
+    if not resource.tenant_id or resource.embedding is None:
+        return []
+    vector = decode_vector(resource.embedding)
+    index = get_tenant_index(resource.tenant_id)
+    if len(vector) != index.matrix.shape[1]:
+        return []
+    return index.search(vector, k=k, exclude={resource.id}, candidates=candidates)
+
+
+def clear_index_cache():
+    _index_cache.clear()
@@ -0,0 +1,194 @@
+"""
+H5 应用安装：ZIP 包逐个成员流式解压到 MEDIA_ROOT/h5apps/<sha256>/，并写出清单（文件列表、大小、哈希、入口）
+目录按包内容的 SHA-256 命名，同一个包只解压一次；清单与目录同级（h5apps/<sha256>.manifest.json），
+清单存在即表示解压完整，服务与卸载都只读清单，不再遍历目录
+"""
+
+import hashlib
+import json
+import os
+import posixpath
+import shutil
+import stat
+import uuid
+import zipfile
+from django.conf import settings
+from .cache_utils import TTLCache
+
+H5_DIR = 'h5apps'
+READ_SIZE = 64 * 1024
+
+_manifest_cache = TTLCache(maxsize=512, ttl=3600)
+
+
+class H5PackageError(Exception):
+    pass
+
+
+def _root():
+    return os.path.join(settings.MEDIA_ROOT, H5_DIR)
+
+
+def app_dir(key):
+    return os.path.join(_root(), key)
+
+
+def _manifest_path(key):
+    return os.path.join(_root(), f"{key}.manifest.json")
+
+
+def app_url(manifest):
+    return f"{settings.MEDIA_URL}{H5_DIR}/{manifest['key']}/{manifest['entry']}"
+
+
+def get_manifest(key):
+    """读取（并缓存）清单；包未安装时返回 None"""
+    manifest = _manifest_cache.get(key)
+    if manifest is None:
+        try:
+            with open(_manifest_path(key), encoding='utf-8') as fh:
+                manifest = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+        manifest['_paths'] = {item['path']: item for item in manifest['files']}
+        _manifest_cache.set(key, manifest)
+    return manifest
+
+
+def _safe_member_path(info):
+    """规范化成员路径；拒绝绝对路径、.. 跳出、符号链接（zip-slip）"""
+    name = info.filename.replace('\\', '/')
+    if stat.S_ISLNK(info.external_attr >> 16):
+        raise H5PackageError(f"不支持符号链接: {info.filename}")
+    normalized = posixpath.normpath(name)
+    if name.startswith('/') or normalized.startswith('../') or normalized == '..' or ':' in normalized.split('/')[0]:
+        raise H5PackageError(f"非法路径: {info.filename}")
+    return normalized
+
+
+def _find_entry(paths):
+    if 'index.html' in paths:
+        return 'index.html'
+    # 常见打包方式：整个文件夹压缩，入口在唯一的顶层目录下
+    tops = {path.split('/', 1)[0] for path in paths}
+    if len(tops) == 1 and f"{next(iter(tops))}/index.html" in paths:
+        return f"{next(iter(tops))}/index.html"
+    pages = sorted((p for p in paths if p.lower().endswith(('.html', '.htm'))), key=lambda p: (p.count('/'), p))
+    if not pages:
+        raise H5PackageError('压缩包中没有 index.html')
+    return pages[0]
+
+
+def _extract(archive_path, target):
+    """逐个成员流式解压到 target，边写边统计大小、计算哈希；实际解出的字节数受限，不信任 ZIP 头里的声明"""
+    files = []
+    seen = set()
+    total = 0
+    try:
+        zf = zipfile.ZipFile(archive_path)
+    except (zipfile.BadZipFile, OSError):
+        raise H5PackageError('不是有效的 ZIP 文件')
+    with zf:
+        members = [info for info in zf.infolist() if not info.is_dir()]
+        if len(members) > settings.H5_MAX_FILES:
+            raise H5PackageError(f"文件数超过 {settings.H5_MAX_FILES}")
+        for info in members:
+            path = _safe_member_path(info)
+            if info.file_size > settings.H5_MAX_FILE_SIZE:
+                raise H5PackageError(f"单个文件过大: {path}")
+            if info.compress_size and info.file_size > 1024 * 1024 \
+                    and info.file_size / info.compress_size > settings.H5_MAX_RATIO:
+                raise H5PackageError(f"压缩比异常: {path}")
+
+            if path in seen:
+                raise H5PackageError(f"重复路径: {path}")
+            seen.add(path)
+
+            dest = os.path.join(target, *path.split('/'))
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                with zf.open(info) as src, open(dest, 'wb') as out:
+                    for piece in iter(lambda: src.read(READ_SIZE), b''):
+                        size += len(piece)
+                        total += len(piece)
+                        if size > info.file_size or total > settings.H5_MAX_TOTAL_SIZE:
+                            raise H5PackageError('解压后体积超出限制')
+                        digest.update(piece)
+                        out.write(piece)
+            except (OSError, zipfile.BadZipFile, NotImplementedError) as e:
+                raise H5PackageError(f"无法解压 {path}: {e}")
+            files.append({'path': path, 'size': size, 'sha256': digest.hexdigest()})
+    if not files:
+        raise H5PackageError('压缩包为空')
+    return files, total
+
+
+def install_package(archive_path, key):
+    """
+    解压 H5 包并返回清单；同一 key（包内容的 SHA-256）已安装时直接返回已有清单
+    先解压到临时目录，完成后改名发布，最后写清单，半途失败不会留下可用的残缺目录
+    """
+    manifest = get_manifest(key)
+    if manifest and manifest.get('sha256') == key:
+        return manifest
+
+    os.makedirs(_root(), exist_ok=True)
+    tmp = os.path.join(_root(), f".tmp-{uuid.uuid4().hex}")
+    try:
+        files, total = _extract(archive_path, tmp)
+        entry = _find_entry({item['path'] for item in files})
+        target = app_dir(key)
+        if os.path.exists(target):
+            # 上次安装中断留下的目录（没有清单），或并发安装已发布
+            if get_manifest(key):
+                return get_manifest(key)
+            shutil.rmtree(target)
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    manifest = {'key': key, 'sha256': key, 'entry': entry, 'file_count': len(files), 'total_size': total, 'files': files}
+    manifest_tmp = f"{_manifest_path(key)}.{uuid.uuid4().hex}"
+    with open(manifest_tmp, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, ensure_ascii=False)
+    os.replace(manifest_tmp, _manifest_path(key))
+    _manifest_cache.pop(key)
+    return get_manifest(key)
+
+
+def remove_package(key):
+    """按清单删除已解压的文件和目录；没有清单时（异常残留）整体删除目录"""
+    manifest = get_manifest(key)
+    _manifest_cache.pop(key)
+    target = app_dir(key)
+    if manifest is None:
+        if os.path.isdir(target):
+            shutil.rmtree(target, ignore_errors=True)
+        return
+    # 先删清单：之后即视为未安装，删除过程中断不会被当作完整包复用
+    try:
+        os.remove(_manifest_path(key))
+    except FileNotFoundError:
+        pass
+    dirs = set()
+    for item in manifest['files']:
+        try:
+            os.remove(os.path.join(target, *item['path'].split('/')))
+        except FileNotFoundError:
+            pass
+        parent = posixpath.dirname(item['path'])
+        while parent:
+            dirs.add(parent)
+            parent = posixpath.dirname(parent)
+    for directory in sorted(dirs, key=lambda d: -d.count('/')):
+        try:
+            os.rmdir(os.path.join(target, *directory.split('/')))
+        except OSError:
+            pass
+    try:
+        os.rmdir(target)
+    except OSError:
+        shutil.rmtree(target, ignore_errors=True)
@@ -0,0 +1,81 @@
+"""
+缩略图渲染（在进程池中执行）：只依赖 Pillow / ffmpeg，不导入 Django，子进程无需初始化项目
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+from PIL import Image, ImageOps
+
+WEBP_QUALITY = 80
+FFMPEG_TIMEOUT = 60
+
+
+def _save_webp(image, dest):
+    """先写临时文件再改名，读到的缩略图总是完整的"""
+    tmp = f"{dest}.{os.getpid()}.tmp"
+    image.save(tmp, 'WEBP', quality=WEBP_QUALITY, method=4)
+    os.replace(tmp, dest)
+
+
+def render_image(src, targets):
+    """
+    targets: {尺寸名: (边长, 输出路径)}，按长边等比缩放输出 WebP；已存在的输出直接跳过
+    返回成功生成（或已存在）的 {尺寸名: 输出路径}
+    """
+    pending = {key: spec for key, spec in targets.items() if not os.path.exists(spec[1])}
+    done = {key: spec[1] for key, spec in targets.items() if key not in pending}
+    if not pending:
+        return done
+
+    with Image.open(src) as image:
+        largest = max(edge for edge, _ in pending.values())
+        # JPEG 可以直接按缩小比例解码，大图省掉绝大部分解码开销
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+        # 从大到小逐级缩放，每级在上一级结果上进行
+        for key, (edge, dest) in sorted(pending.items(), key=lambda item: -item[1][0]):
+            image.thumbnail((edge, edge), Image.LANCZOS)
+            _save_webp(image, dest)
+            done[key] = dest
+    return done
+
+
+def ffmpeg_available():
+    return shutil.which('ffmpeg') is not None
+
+
+def render_video(src, targets):
+    """用 ffmpeg 截取首帧（1 秒处，太短则取第 0 帧）作为海报，再按图片生成各尺寸；没有 ffmpeg 时返回空"""
+    if not ffmpeg_available():
+        return {}
+    pending = {key: spec for key, spec in targets.items() if not os.path.exists(spec[1])}
+    if not pending:
+        return {key: spec[1] for key, spec in targets.items()}
+
+    fd, poster = tempfile.mkstemp(suffix='.png')
+    os.close(fd)
+    try:
+        for offset in ('1', '0'):
+            result = subprocess.run(
+                ['ffmpeg', '-y', '-loglevel', 'error', '-ss', offset, '-i', src, '-frames:v', '1', poster],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=FFMPEG_TIMEOUT
+            )
+            if result.returncode == 0 and os.path.getsize(poster) > 0:
+                return render_image(poster, targets)
+        return {}
+    finally:
+        os.remove(poster)
+
+
+RENDERERS = {
+    'image': render_image,
+    'video': render_video,
+}
+
+
+def render(kind, src, targets):
+    return RENDERERS[kind](src, targets)
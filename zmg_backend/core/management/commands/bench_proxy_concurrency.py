@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+from core.models import User
+
+
+def _slow_upstream(delay):
+    """模拟慢速 GitHub：每个请求等待 delay 秒后返回一个空结果"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            body = json.dumps({'total_count': 0, 'items': []}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+class Command(BaseCommand):
+    help = (
+        "压测：慢速上游下并发调用 GitHub 代理时，桌面列表的延迟是否受影响。"
+        "先用 --stub-port 启动慢速上游，后端以 GITHUB_API_URL=http://127.0.0.1:<stub-port> 启动，"
+        "再分别在 GUNICORN_MODE=sync / asgi 下运行本命令对比"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--username', required=True, help='用于签发访问令牌的已有用户')
+        parser.add_argument('--stub-port', type=int, default=0, help='在该端口启动慢速上游（0 表示不启动）')
+        parser.add_argument('--stub-delay', type=float, default=3.0, help='慢速上游每个请求的耗时（秒）')
+        parser.add_argument('--proxy-calls', type=int, default=16, help='同时发起的代理请求数')
+        parser.add_argument('--listing-calls', type=int, default=20, help='代理请求进行期间依次发起的桌面列表请求数')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if not user:
+            raise CommandError(f"用户不存在: {options['username']}")
+        self.token = str(RefreshToken.for_user(user).access_token)
+        self.base = options['base_url'].rstrip('/')
+
+        if options['stub_port']:
+            server = ThreadingHTTPServer(('127.0.0.1', options['stub_port']), _slow_upstream(options['stub_delay']))
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.stdout.write(f"慢速上游: http://127.0.0.1:{options['stub_port']} (每次 {options['stub_delay']}s)")
+
+        baseline = self._listing(options['listing_calls'])
+
+        with ThreadPoolExecutor(max_workers=options['proxy_calls']) as pool:
+            started = time.perf_counter()
+            # 每个请求查询不同，避免被代理缓存合并
+            proxies = [pool.submit(self._timed, f'/api/github/repos/?q=bench{i}') for i in range(options['proxy_calls'])]
+            time.sleep(0.2)  # 让代理请求先占住 worker
+            under_load = self._listing(options['listing_calls'])
+            proxy_results = [f.result() for f in proxies]
+            total = time.perf_counter() - started
+
+        failed = sum(1 for _, status in proxy_results if status != 200)
+        self.stdout.write(
+            f"desktop listing (idle):      p50 {_percentile(baseline, 0.5) * 1000:.1f} ms, "
+            f"p95 {_percentile(baseline, 0.95) * 1000:.1f} ms"
+        )
+        self.stdout.write(
+            f"desktop listing (proxy load): p50 {_percentile(under_load, 0.5) * 1000:.1f} ms, "
+            f"p95 {_percentile(under_load, 0.95) * 1000:.1f} ms"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['proxy_calls']} proxy calls finished in {total:.2f}s "
+            f"(p95 {_percentile([t for t, _ in proxy_results], 0.95):.2f}s, failed {failed})"
+        ))
+
+    def _listing(self, count):
+        results = [self._timed('/api/desktop/?parent_id=root') for _ in range(count)]
+        if any(status != 200 for _, status in results):
+            raise CommandError(f"桌面列表请求失败: {sorted({status for _, status in results})}")
+        return [elapsed for elapsed, _ in results]
+
+    def _timed(self, path):
+        req = urllib.request.Request(self.base + path, headers={'Authorization': f'Bearer {self.token}'})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=120) as resp:
+                resp.read()
+                status = resp.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        return time.perf_counter() - started, status
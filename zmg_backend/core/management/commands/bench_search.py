@@ -0,0 +1,92 @@
+import random
+import statistics
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import User, Tenant, SearchDocument, SearchPosting
+from core.search_utils import search, suggest
+from core.tokenizer import tokenize
+
+# 常用字表，按出现频率递减，用 Zipf 分布抽样模拟真实标题
+CHARS = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所"
+    "民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日"
+    "那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想"
+    "已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指"
+)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "检索延迟基准：按给定规模生成模拟索引（事务回滚，不留数据），测量查询与自动补全耗时"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000', help='文档数量，逗号分隔，逐级追加')
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        sizes = sorted(int(x) for x in options['sizes'].split(',') if x.strip())
+        weights = [1 / (rank + 1) for rank in range(len(CHARS))]
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(username=f"bench-{time.time_ns()}")
+                tenant = Tenant.objects.create(name='bench', slug=f"bench-{time.time_ns()}", owner=user)
+                samples = []
+                created = 0
+                for size in sizes:
+                    started = time.perf_counter()
+                    samples.extend(self._seed(tenant, created, size, rng, weights))
+                    created = size
+                    self.stdout.write(f"[{size}] 生成索引 {time.perf_counter() - started:.1f}s")
+                    self._measure(tenant, size, samples, rng, options['queries'])
+                raise _Rollback()
+        except _Rollback:
+            self.stdout.write("临时数据已回滚")
+
+    def _seed(self, tenant, start, end, rng, weights, batch=5000):
+        samples = []
+        for offset in range(start, end, batch):
+            count = min(batch, end - offset)
+            texts = [''.join(rng.choices(CHARS, weights, k=rng.randint(6, 16))) for _ in range(count)]
+            docs = [
+                SearchDocument(kind='app', object_id=offset + i + 1, tenant=tenant, length=len(tokenize(text)))
+                for i, text in enumerate(texts)
+            ]
+            SearchDocument.objects.bulk_create(docs)
+            docs = SearchDocument.objects.filter(tenant=tenant, object_id__gt=offset, object_id__lte=offset + count).order_by('object_id')
+            postings = [
+                SearchPosting(document=doc, term=term, tf=tf)
+                for doc, text in zip(docs, texts)
+                for term, tf in Counter(tokenize(text)).items()
+            ]
+            SearchPosting.objects.bulk_create(postings, batch_size=batch)
+            samples.extend(rng.sample(texts, min(5, len(texts))))
+        return samples
+
+    def _measure(self, tenant, size, samples, rng, queries):
+        search_times, suggest_times = [], []
+        for _ in range(queries):
+            text = rng.choice(samples)
+            start = rng.randint(0, max(len(text) - 4, 0))
+            query = text[start:start + rng.randint(2, 4)]
+
+            started = time.perf_counter()
+            search(tenant, 'app', query, limit=20)
+            search_times.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            suggest(tenant, 'app', query[:-1] if len(query) > 1 else query)
+            suggest_times.append((time.perf_counter() - started) * 1000)
+
+        for label, times in (('search', search_times), ('suggest', suggest_times)):
+            times.sort()
+            p95 = times[int(len(times) * 0.95) - 1] if len(times) > 1 else times[0]
+            self.stdout.write(
+                f"[{size}] {label:<8} avg {statistics.mean(times):8.2f} ms  p95 {p95:8.2f} ms"
+            )
@@ -0,0 +1,76 @@
+import json
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from core.api_views import SYNC_PULL_FIELDS, _stream_sync_snapshot
+from core.models import User, Tenant, Membership, DesktopIcon, Resource, Category
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "对比同步拉取两种方式的内存占用：list(qs.values()) 与 NDJSON 流式快照"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='使用已有用户 id')
+        parser.add_argument('--tenant', type=int, help='使用已有租户 id')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='临时生成 N 个桌面图标（事务结束后回滚）')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                user, tenant = self._prepare(options)
+                self._run(user, tenant)
+                if options['seed']:
+                    raise _Rollback()
+        except _Rollback:
+            self.stdout.write("临时数据已回滚")
+
+    def _prepare(self, options):
+        if options['seed']:
+            user = User.objects.create_user(username=f"bench-{time.time_ns()}")
+            tenant = Tenant.objects.create(name='bench', slug=f"bench-{time.time_ns()}", owner=user)
+            Membership.objects.create(user=user, tenant=tenant, role='owner', is_default=True)
+            batch = [
+                DesktopIcon(user=user, tenant=tenant, title=f"icon-{i}", x=i % 800, y=i % 600)
+                for i in range(options['seed'])
+            ]
+            DesktopIcon.objects.bulk_create(batch, batch_size=5000)
+            return user, tenant
+
+        if not options['user'] or not options['tenant']:
+            raise CommandError("请指定 --user 和 --tenant，或使用 --seed 生成临时数据")
+        return User.objects.get(id=options['user']), Tenant.objects.get(id=options['tenant'])
+
+    def _buffered(self, user, tenant):
+        data = {
+            'icons': list(DesktopIcon.objects.filter(user=user, tenant=tenant).values(*SYNC_PULL_FIELDS['icon'])),
+            'resources': list(Resource.objects.filter(author=user, tenant=tenant).values(*SYNC_PULL_FIELDS['resource'])),
+            'categories': list(Category.objects.filter(tenant=tenant).values(*SYNC_PULL_FIELDS['category'])),
+        }
+        return len(json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False))
+
+    def _streamed(self, user, tenant):
+        return sum(len(line) for line in _stream_sync_snapshot(user, tenant))
+
+    def _measure(self, label, func, *args):
+        tracemalloc.start()
+        started = time.perf_counter()
+        size = func(*args)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f"{label:<10} 输出 {size / 1024:>10.1f} KB  峰值内存 {peak / 1024 / 1024:>8.2f} MB  耗时 {elapsed:>6.2f}s"
+        )
+
+    def _run(self, user, tenant):
+        rows = DesktopIcon.objects.filter(user=user, tenant=tenant).count()
+        self.stdout.write(f"用户 {user.id} / 租户 {tenant.id}，图标 {rows} 个")
+        self._measure('buffered', self._buffered, user, tenant)
+        self._measure('ndjson', self._streamed, user, tenant)
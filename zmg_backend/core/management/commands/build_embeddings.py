@@ -0,0 +1,38 @@
+import time
+from django.core.management.base import BaseCommand
+from core.embeddings import embed_resources, clear_index_cache
+from core.models import Resource
+
+class Command(BaseCommand):
+    help = "计算资源向量（默认只补齐缺失的；更换嵌入模型后用 --all 全量重算）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='重算全部资源的向量')
+        parser.add_argument('--tenant', type=int, help='只处理该租户')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        qs = Resource.objects.all()
+        if not options['all']:
+            qs = qs.filter(embedding__isnull=True)
+        if options['tenant']:
+            qs = qs.filter(tenant_id=options['tenant'])
+
+        total = 0
+        last_id = 0
+        while True:
+            # 按主键分块，--all 时已处理的行不会因为写回而被重复取到
+            chunk = list(qs.filter(pk__gt=last_id).order_by('pk')[:options['chunk_size']])
+            if not chunk:
+                break
+            total += embed_resources(chunk)
+            last_id = chunk[-1].pk
+            self.stdout.write(f"  {total} ...", ending='\r')
+
+        # 本进程的索引缓存立即失效，其他进程在 EMBEDDING_INDEX_TTL 内自动重建
+        clear_index_cache()
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f"Embeddings built. Rows: {total}, {elapsed:.2f}s, {total / elapsed:.0f} rows/s"
+        ))
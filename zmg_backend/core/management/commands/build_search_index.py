@@ -1,16 +1,78 @@
-from django.core.management.base import BaseCommand
-from core.models import AppEntry
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils.dateparse import parse_datetime, parse_date
+from django.utils import timezone
+from core.search_utils import SEARCH_LOADERS, SEARCH_SOURCES, process_dirty, reindex
 
 class Command(BaseCommand):
-    help = "Build lightweight search index for AppEntry"
+    help = "Build search index for AppEntry / Resource (full rebuild, --since or --pending queue)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=['app', 'resource', 'all'], default='all')
+        parser.add_argument('--since', help='只重建该时间之后修改过的对象，如 2026-01-01 或 2026-01-01T08:00:00')
+        parser.add_argument('--pending', action='store_true', help='只处理增量队列中的脏对象')
+        parser.add_argument('--watch', action='store_true', help='与 --pending 一起使用：常驻，持续处理新入队的对象')
+        parser.add_argument('--interval', type=float, default=2.0, help='--watch 时队列为空的轮询间隔（秒）')
+        parser.add_argument('--chunk-size', type=int, default=1000)
 
     def handle(self, *args, **options):
-        updated = 0
-        for app in AppEntry.objects.all().prefetch_related('tags'):
-            tags_text = " ".join(app.tags.values_list('name', flat=True))
-            base = f"{app.title} {app.summary or ''} {tags_text}".strip()
-            if app.search_text != base:
-                app.search_text = base
-                app.save(update_fields=['search_text'])
-                updated += 1
-        self.stdout.write(self.style.SUCCESS(f"Search index built. Updated: {updated}"))
+        started = time.perf_counter()
+
+        if options['pending']:
+            while True:
+                processed = process_dirty(batch_size=options['chunk_size'])
+                if processed or not options['watch']:
+                    self._report("pending", processed, 0, started)
+                if not options['watch']:
+                    return
+                time.sleep(options['interval'])
+                close_old_connections()
+                started = time.perf_counter()
+
+        since = self._parse_since(options['since'])
+        kinds = ['app', 'resource'] if options['kind'] == 'all' else [options['kind']]
+        for kind in kinds:
+            kind_started = time.perf_counter()
+            total, changed = self._rebuild(kind, since, options['chunk_size'])
+            self._report(kind, total, changed, kind_started)
+
+    def _parse_since(self, value):
+        if not value:
+            return None
+        since = parse_datetime(value)
+        if since is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f"无法解析时间: {value}")
+            since = timezone.datetime.combine(day, timezone.datetime.min.time())
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    def _rebuild(self, kind, since, chunk_size):
+        """按主键分块处理，内存占用只与 chunk_size 有关"""
+        model, _ = SEARCH_SOURCES[kind]
+        qs = model.objects.all()
+        if since:
+            qs = qs.filter(updated_at__gte=since)
+
+        total = changed = 0
+        last_id = 0
+        while True:
+            ids = list(qs.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+            count, count_changed = reindex(kind, SEARCH_LOADERS[kind](ids))
+            total += count
+            changed += count_changed
+            last_id = ids[-1]
+            self.stdout.write(f"  {kind}: {total} ...", ending='\r')
+        return total, changed
+
+    def _report(self, label, total, changed, started):
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f"Search index built [{label}]. Rows: {total}, search_text updated: {changed}, "
+            f"{elapsed:.2f}s, {total / elapsed:.0f} rows/s"
+        ))
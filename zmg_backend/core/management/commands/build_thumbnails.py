@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from core.models import Resource
+from core.thumbnails import THUMBNAIL_KINDS, generate
+
+class Command(BaseCommand):
+    help = "生成图片/视频缩略图（默认只补齐缺失的；调整 THUMBNAIL_SIZES 或装上 ffmpeg 后用 --force 全量重建）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='删除已有缩略图并重新生成')
+        parser.add_argument('--tenant', type=int, help='只处理该租户')
+        parser.add_argument('--chunk-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        qs = Resource.objects.filter(kind__in=THUMBNAIL_KINDS).exclude(file='').exclude(file__isnull=True)
+        if options['tenant']:
+            qs = qs.filter(tenant_id=options['tenant'])
+        qs = qs.only('id', 'kind', 'file', 'thumbnails')
+
+        total = 0
+        last_id = 0
+        while True:
+            chunk = list(qs.filter(pk__gt=last_id).order_by('pk')[:options['chunk_size']])
+            if not chunk:
+                break
+            total += generate(chunk, force=options['force'])
+            last_id = chunk[-1].pk
+            self.stdout.write(f"  {total} ...", ending='\r')
+
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f"Thumbnails built. Resources: {total}, {elapsed:.2f}s, {total / elapsed:.1f} resources/s"
+        ))
@@ -2,7 +2,10 @@ import os
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
+from django.conf import settings
 from core.models import Resource, DesktopIcon
+from core.upload_utils import purge_stale_sessions
+from core.counters import prune_views
 
 class Command(BaseCommand):
     help = '每周清理规则：删除7天前的资源文件及其图标'
@@ -17,6 +20,17 @@ class Command(BaseCommand):
         
         self.stdout.write(f"正在扫描 {cutoff_date.strftime('%Y-%m-%d %H:%M:%S')} 之前的文件...")
 
+        # 0. 清理中断的分片上传
+        stale_before = timezone.now() - timezone.timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+        purged = purge_stale_sessions(stale_before)
+        if purged:
+            self.stdout.write(f"已清理 {purged} 个过期的分片上传会话")
+
+        # 0.1 清理超过保留期的浏览明细和小时汇总
+        raw, hourly = prune_views()
+        if raw or hourly:
+            self.stdout.write(f"已清理 {raw} 条浏览明细、{hourly} 条小时汇总")
+
         # 1. 查找过期的资源
         # 注意：这里我们排除了 'link' 类型的资源，只清理上传的物理文件
         # 如果你想连纯链接也清理，可以去掉 exclude
@@ -37,8 +51,8 @@ class Command(BaseCommand):
             try:
                 title = res.title
                 
-                # 2. 删除物理文件
-                if res.file and os.path.isfile(res.file.path):
+                # 2. 删除物理文件：blob 文件在删除记录后释放引用，引用归零才删除；旧的独立文件直接删除
+                if res.file and not res.blob_id and os.path.isfile(res.file.path):
                     os.remove(res.file.path)
                     # 同时尝试清理空文件夹（可选）
                     try:
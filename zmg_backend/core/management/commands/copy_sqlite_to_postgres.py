@@ -0,0 +1,94 @@
+import os
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+
+SOURCE_ALIAS = 'sqlite_source'
+# PostgreSQL 单条语句最多 65535 个参数
+MAX_PARAMS = 60000
+
+
+def _pending_migrations(alias):
+    executor = MigrationExecutor(connections[alias])
+    return executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+
+class Command(BaseCommand):
+    help = (
+        "把 SQLite 库中的全部数据原样复制到 default 数据库（PostgreSQL），主键、时间戳保持不变。"
+        "步骤：DB_ENGINE=postgres python manage.py migrate，"
+        "再 DB_ENGINE=postgres python manage.py copy_sqlite_to_postgres"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=str(settings.BASE_DIR / 'db.sqlite3'), help='SQLite 数据库文件')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        target = connections[DEFAULT_DB_ALIAS]
+        if target.vendor != 'postgresql':
+            raise CommandError("default 数据库不是 PostgreSQL，请以 DB_ENGINE=postgres 运行")
+        if not os.path.exists(options['source']):
+            raise CommandError(f"SQLite 文件不存在: {options['source']}")
+        connections.settings[SOURCE_ALIAS] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': options['source']}
+        })[DEFAULT_DB_ALIAS]
+
+        if _pending_migrations(SOURCE_ALIAS):
+            raise CommandError("SQLite 库还有未执行的迁移，请先在 SQLite 下运行 python manage.py migrate")
+        if _pending_migrations(DEFAULT_DB_ALIAS):
+            raise CommandError("PostgreSQL 库还有未执行的迁移，请先运行 DB_ENGINE=postgres python manage.py migrate")
+
+        models = [
+            model for model in apps.get_models(include_auto_created=True)
+            if model._meta.managed and not model._meta.proxy
+        ]
+        # migrate 时自动生成的内容类型和权限由 SQLite 中的原始行替换（DesktopIcon 等按 id 引用内容类型）
+        generated = (Permission, ContentType)
+        for model in models:
+            if model not in generated and model._base_manager.using(DEFAULT_DB_ALIAS).exists():
+                raise CommandError(f"目标库的 {model._meta.db_table} 已有数据，请先清空（python manage.py flush）")
+
+        # PostgreSQL 的外键约束是 DEFERRABLE INITIALLY DEFERRED，整个复制放在一个事务里，表的顺序无关
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            for model in generated:
+                model._base_manager.using(DEFAULT_DB_ALIAS).all().delete()
+            for model in models:
+                copied = self.copy_model(model, options['batch_size'])
+                expected = model._base_manager.using(SOURCE_ALIAS).count()
+                if copied != expected:
+                    raise CommandError(f"{model._meta.label}: 复制了 {copied} 行，源库有 {expected} 行")
+                if copied:
+                    self.stdout.write(f"{model._meta.label}: {copied}")
+            # 显式写入了主键，序列要推进到最大值之后
+            with target.cursor() as cursor:
+                for sql in target.ops.sequence_reset_sql(no_style(), models):
+                    cursor.execute(sql)
+        connections[SOURCE_ALIAS].close()
+        self.stdout.write(self.style.SUCCESS(f"Copied {len(models)} tables from {options['source']}"))
+
+    def copy_model(self, model, batch_size):
+        fields = model._meta.local_concrete_fields
+        batch_size = max(1, min(batch_size, MAX_PARAMS // len(fields)))
+        rows = model._base_manager.using(SOURCE_ALIAS).order_by('pk').iterator(chunk_size=batch_size)
+        manager = model._base_manager.using(DEFAULT_DB_ALIAS)
+        copied = 0
+        batch = []
+        for obj in rows:
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                copied += self.insert(manager, batch, fields)
+                batch = []
+        if batch:
+            copied += self.insert(manager, batch, fields)
+        return copied
+
+    def insert(self, manager, batch, fields):
+        # raw=True：与 loaddata 一样原样写入，auto_now / auto_now_add 不会覆盖原时间，也不触发 save() 和信号
+        manager._insert(batch, fields=fields, using=DEFAULT_DB_ALIAS, raw=True)
+        return len(batch)
@@ -0,0 +1,32 @@
+import os
+from django.core.management.base import BaseCommand
+from core.blob_utils import store_path, release, recount
+from core.models import Blob, Resource
+
+class Command(BaseCommand):
+    help = "把旧的独立资源文件迁入内容寻址存储（相同内容只保留一份），并按实际引用修正 ref_count"
+
+    def handle(self, *args, **options):
+        migrated = missing = failed = 0
+        legacy = Resource.objects.filter(blob__isnull=True).exclude(file='').exclude(file__isnull=True)
+        for res in legacy.iterator():
+            path = res.file.path
+            if not os.path.isfile(path):
+                missing += 1
+                continue
+            # 文件与 blob 目录在同一文件系统，改名即可；内容已存在时删除这份副本
+            blob = store_path(path, res.file.name)
+            try:
+                Resource.objects.filter(pk=res.pk).update(file=blob.name, blob=blob)
+            except Exception as e:
+                release(blob.id)
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"迁移失败 {res.id}: {e}"))
+                continue
+            migrated += 1
+
+        fixed = recount()
+        purged = sum(release(blob_id) for blob_id in Blob.objects.filter(ref_count=0).values_list('id', flat=True))
+        self.stdout.write(self.style.SUCCESS(
+            f"迁移 {migrated} 个文件，缺失 {missing}，失败 {failed}；修正计数 {fixed}，删除无引用文件 {purged}"
+        ))
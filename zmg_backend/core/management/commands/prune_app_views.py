@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from core.counters import flush, prune_views
+
+class Command(BaseCommand):
+    help = "删除超过保留期的应用浏览明细（APP_VIEW_RAW_RETENTION_DAYS）和小时汇总（APP_VIEW_HOURLY_RETENTION_DAYS）"
+
+    def handle(self, *args, **options):
+        flush()
+        raw, hourly = prune_views()
+        self.stdout.write(self.style.SUCCESS(f"App views pruned. Raw: {raw}, hourly rollups: {hourly}"))
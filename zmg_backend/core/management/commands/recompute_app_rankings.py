@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand
+from core.ranking import recompute
+
+class Command(BaseCommand):
+    help = "增量更新应用商店 hot / trending 排行分数（建议每几分钟运行一次；--full 全量重算）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='忽略检查点，全量重算')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = recompute(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"App rankings updated ({result['mode']}). Apps: {result['apps']}, events: {result['events']}, "
+            f"{time.perf_counter() - started:.2f}s"
+        ))
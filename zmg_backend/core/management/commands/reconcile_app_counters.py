@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from core.counters import flush, reconcile
+
+class Command(BaseCommand):
+    help = "重算应用的 view_count / like_count / comment_count，修正缓冲写回丢失或重复造成的偏差（也用于回填）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--app', type=int, action='append', dest='apps', help='只对账指定应用（可重复）')
+
+    def handle(self, *args, **options):
+        flush()
+        fixed = reconcile(options['apps'])
+        self.stdout.write(self.style.SUCCESS(f"App counters reconciled. Fixed: {fixed}"))
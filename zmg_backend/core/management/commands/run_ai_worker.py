@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from core.ai_jobs import run_batch
+
+
+class Command(BaseCommand):
+    help = 'AI 打标签后台任务：批量处理 AiTagJob 队列'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='处理完当前队列后退出（适合 cron）')
+        parser.add_argument('--batch-size', type=int, default=None, help='每次模型调用处理的文本数')
+        parser.add_argument('--interval', type=float, default=2.0, help='队列为空时的轮询间隔（秒）')
+
+    def handle(self, *args, **options):
+        total_done = total_failed = 0
+        while True:
+            close_old_connections()
+            done, failed = run_batch(options['batch_size'])
+            total_done += done
+            total_failed += failed
+            if done or failed:
+                self.stdout.write(f"已处理 {done} 个，失败 {failed} 个")
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"完成：成功 {total_done} 个，失败 {total_failed} 个"))
@@ -0,0 +1,144 @@
+"""
+媒体文件下发：支持 Range / If-None-Match
+配置了前置代理（settings.MEDIA_ACCEL）时只返回 X-Accel-Redirect / X-Sendfile，由代理发送文件和处理 Range；
+否则返回 FileResponse，gunicorn 的 wsgi.file_wrapper 会用 os.sendfile 从当前文件位置零拷贝发送 Content-Length 字节，
+因此任意偏移的拖动只是一次 seek，耗时与偏移无关；ASGI 模式下没有 sendfile，按块异步发送（asgi_utils）
+"""
+
+import mimetypes
+import os
+import urllib.parse
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from .asgi_utils import stream_response
+
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class RangeFile:
+    """
+    只暴露文件的 [start, start + length) 区间：read() 有界（无 sendfile 时逐块读取不会越界），
+    fileno() 交给 sendfile 使用，起点就是底层文件的当前位置
+    """
+    def __init__(self, fh, start, length):
+        fh.seek(start)
+        self._fh = fh
+        self._remaining = length
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._fh.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._fh.fileno()
+
+    def close(self):
+        self._fh.close()
+
+
+def parse_range(header, size):
+    """
+    解析单个字节区间，返回闭区间 (start, end)
+    没有 Range、多区间或语法无效时返回 None（按整个文件响应）；区间不可满足时抛 RangeNotSatisfiable
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    spec = header[len('bytes='):].strip()
+    if ',' in spec:
+        return None
+    first, sep, last = spec.partition('-')
+    if not sep:
+        return None
+    try:
+        if first == '':
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else max(start, size - 1)
+            if start < 0 or end < start:
+                return None
+            end = min(end, size - 1)
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # If-None-Match 用弱比较
+    def opaque(tag):
+        tag = tag.strip()
+        return tag[2:] if tag.startswith('W/') else tag
+    return any(opaque(tag) == opaque(etag) for tag in header.split(','))
+
+
+def _common_headers(response, etag, download_name):
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = 'private, max-age=3600'
+    if download_name:
+        response['Content-Disposition'] = f"inline; filename*=UTF-8''{urllib.parse.quote(download_name)}"
+    return response
+
+
+def serve_file(request, path, name, etag, download_name=None):
+    """
+    path: 文件绝对路径；name: 存储名（MEDIA_ROOT 下的相对路径，用于代理内部跳转和推断类型）
+    """
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    if _etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    accel = settings.MEDIA_ACCEL
+    if accel:
+        response = HttpResponse(content_type=content_type)
+        if accel == 'nginx':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + urllib.parse.quote(name)
+        else:
+            response['X-Sendfile'] = path
+        return _common_headers(response, etag, download_name)
+
+    size = os.path.getsize(path)
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range or if_range == etag:
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{size}"
+            return _common_headers(response, etag, None)
+
+    start, end = byte_range if byte_range else (0, size - 1)
+    length = end - start + 1 if size else 0
+    status = 206 if byte_range else 200
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type, status=status)
+    else:
+        response = FileResponse(RangeFile(open(path, 'rb'), start, length), content_type=content_type, status=status)
+        response.block_size = STREAM_BLOCK_SIZE
+        stream_response(request, response)
+    if byte_range:
+        response['Content-Range'] = f"bytes {start}-{end}/{size}"
+    response['Content-Length'] = length
+    return _common_headers(response, etag, download_name)
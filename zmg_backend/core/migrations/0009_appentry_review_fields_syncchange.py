@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_appentry_apptag_category_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appentry',
+            name='review_reason',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='appentry',
+            name='reviewed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='appentry',
+            name='reviewed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviewed_apps', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='appentry',
+            name='search_text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant_id', models.BigIntegerField()),
+                ('user_id', models.BigIntegerField(blank=True, null=True)),
+                ('kind', models.CharField(choices=[('icon', '桌面图标'), ('resource', '资源'), ('category', '分类')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('upsert', '新增/修改'), ('delete', '删除')], default='upsert', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': '同步变更',
+                'indexes': [models.Index(fields=['tenant_id', 'id'], name='core_syncch_tenant__00f0cc_idx'), models.Index(fields=['kind', 'object_id'], name='core_syncch_kind_42bdb0_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+def seed_sync_changes(apps, schema_editor):
+    """为已有数据生成初始变更日志，首次同步即可按游标完整拉取"""
+    SyncChange = apps.get_model('core', 'SyncChange')
+    sources = (
+        ('category', apps.get_model('core', 'Category'), None),
+        ('resource', apps.get_model('core', 'Resource'), 'author_id'),
+        ('icon', apps.get_model('core', 'DesktopIcon'), 'user_id'),
+    )
+    for kind, model, owner_attr in sources:
+        fields = ['id', 'tenant_id'] + ([owner_attr] if owner_attr else [])
+        rows = model.objects.filter(tenant__isnull=False).order_by('id').values(*fields)
+        batch = []
+        for row in rows.iterator(chunk_size=2000):
+            batch.append(SyncChange(
+                tenant_id=row['tenant_id'],
+                user_id=row[owner_attr] if owner_attr else None,
+                kind=kind,
+                object_id=row['id'],
+                action='upsert',
+            ))
+            if len(batch) >= 2000:
+                SyncChange.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            SyncChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_appentry_review_fields_syncchange'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_sync_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_seed_sync_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('app', '应用'), ('resource', '资源')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('length', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='core.tenant')),
+            ],
+            options={
+                'verbose_name': '检索文档',
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('tf', models.IntegerField(default=1)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='core.searchdocument')),
+            ],
+            options={
+                'verbose_name': '检索倒排项',
+                'indexes': [models.Index(fields=['term', 'document'], name='core_search_term_43f7a6_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='searchdocument',
+            index=models.Index(fields=['tenant', 'kind'], name='core_search_tenant__01c227_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchdocument',
+            unique_together={('kind', 'object_id')},
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexQueue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('app', '应用'), ('resource', '资源')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('queued_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': '检索索引队列',
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_search_index_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AiTagJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', '排队中'), ('running', '处理中'), ('done', '已完成'), ('failed', '失败')], default='pending', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('text_hash', models.CharField(blank=True, max_length=40)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('worker', models.CharField(blank=True, max_length=32)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('resource', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ai_job', to='core.resource')),
+            ],
+            options={
+                'verbose_name': 'AI标签任务',
+                'indexes': [models.Index(fields=['status', 'run_after'], name='core_aitagj_status_37cf7e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_ai_tag_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='embedding',
+            field=models.BinaryField(blank=True, null=True, verbose_name='向量'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_blob_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='缩略图'),
+        ),
+    ]
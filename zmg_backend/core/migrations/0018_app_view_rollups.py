@@ -0,0 +1,100 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:03
+
+from datetime import timezone as dt_timezone
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def seed_rollups(apps, schema_editor):
+    """由已有的浏览明细生成小时/天汇总，之后明细可以按保留期删除"""
+    AppView = apps.get_model('core', 'AppView')
+    AppViewHourly = apps.get_model('core', 'AppViewHourly')
+    AppViewDaily = apps.get_model('core', 'AppViewDaily')
+    hourly = (
+        AppView.objects.annotate(bucket=TruncHour('created_at', tzinfo=dt_timezone.utc))
+        .values('app_id', 'bucket').annotate(n=Count('id')).order_by()
+    )
+    AppViewHourly.objects.bulk_create(
+        [AppViewHourly(app_id=row['app_id'], hour=row['bucket'], views=row['n']) for row in hourly.iterator()],
+        batch_size=2000
+    )
+    daily = (
+        AppView.objects.annotate(bucket=TruncDate('created_at', tzinfo=timezone.get_default_timezone()))
+        .values('app_id', 'bucket').annotate(n=Count('id')).order_by()
+    )
+    AppViewDaily.objects.bulk_create(
+        [AppViewDaily(app_id=row['app_id'], day=row['bucket'], views=row['n']) for row in daily.iterator()],
+        batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_resource_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppViewDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='日期（本地时区）')),
+                ('views', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': '应用浏览（天汇总）',
+            },
+        ),
+        migrations.CreateModel(
+            name='AppViewHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='小时（UTC 整点）')),
+                ('views', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': '应用浏览（小时汇总）',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='appview',
+            index=models.Index(fields=['app', 'created_at'], name='core_appvie_app_id_b9c942_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appview',
+            index=models.Index(fields=['created_at'], name='core_appvie_created_720f60_idx'),
+        ),
+        migrations.AddField(
+            model_name='appviewhourly',
+            name='app',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_views', to='core.appentry'),
+        ),
+        migrations.AddField(
+            model_name='appviewdaily',
+            name='app',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_views', to='core.appentry'),
+        ),
+        migrations.AddIndex(
+            model_name='appviewhourly',
+            index=models.Index(fields=['hour'], name='core_appvie_hour_4a609f_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='appviewhourly',
+            unique_together={('app', 'hour')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='appviewdaily',
+            unique_together={('app', 'day')},
+        ),
+        migrations.AlterField(
+            model_name='appview',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(seed_rollups, migrations.RunPython.noop),
+    ]
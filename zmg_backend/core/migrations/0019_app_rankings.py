@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_app_view_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True)),
+                ('value', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': '任务检查点',
+            },
+        ),
+        migrations.AddField(
+            model_name='appentry',
+            name='hot_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='appentry',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='appviewhourly',
+            name='ranked_views',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='appcomment',
+            index=models.Index(fields=['created_at'], name='core_appcom_created_0048df_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appentry',
+            index=models.Index(fields=['tenant', '-hot_score'], name='core_appent_tenant__ad09ba_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appentry',
+            index=models.Index(fields=['tenant', '-trending_score'], name='core_appent_tenant__121ece_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='applike',
+            index=models.Index(fields=['created_at'], name='core_applik_created_471ac7_idx'),
+        ),
+    ]
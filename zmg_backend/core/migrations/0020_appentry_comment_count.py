@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:08
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_comment_count(apps, schema_editor):
+    AppEntry = apps.get_model('core', 'AppEntry')
+    AppComment = apps.get_model('core', 'AppComment')
+    counts = (
+        AppComment.objects.filter(app=OuterRef('pk')).order_by()
+        .values('app').annotate(n=Count('id')).values('n')
+    )
+    AppEntry.objects.update(comment_count=Coalesce(Subquery(counts, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_app_rankings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appentry',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_comment_count, migrations.RunPython.noop),
+    ]
@@ -69,6 +69,34 @@ class SyncPreference(models.Model):
         verbose_name = "同步偏好"
         unique_together = ('user', 'tenant')
 
+class SyncChange(models.Model):
+    """
+    同步变更日志：自增 id 即单调递增的同步游标，每个对象只保留最新一条
+    """
+    KIND_CHOICES = (
+        ('icon', '桌面图标'),
+        ('resource', '资源'),
+        ('category', '分类')
+    )
+    ACTION_CHOICES = (
+        ('upsert', '新增/修改'),
+        ('delete', '删除')
+    )
+    # 不使用外键：级联删除租户/用户时仍需要写入删除记录
+    tenant_id = models.BigIntegerField()
+    user_id = models.BigIntegerField(null=True, blank=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default='upsert')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "同步变更"
+        indexes = [
+            models.Index(fields=['tenant_id', 'id']),
+            models.Index(fields=['kind', 'object_id']),
+        ]
+
 # 2. 分类模型
 class Category(models.Model):
     name = models.CharField("分类名称", max_length=50)
@@ -79,6 +107,20 @@ class Category(models.Model):
     def __str__(self): return self.name
     class Meta: verbose_name = "资源分类"
 
+# 资源文件的内容寻址存储
+class Blob(models.Model):
+    """
+    内容寻址文件：相同内容（SHA-256）只存一份，ref_count 为引用它的 Resource 数，归零时删除
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField("存储路径", max_length=255)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "文件内容"
+
 # 3. 资源模型
 class Resource(models.Model):
     STATUS_CHOICES = (('pending', '待审核'), ('approved', '已发布'))
@@ -100,6 +142,8 @@ class Resource(models.Model):
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     # 修改 file 字段，使用上面定义的函数
     file = models.FileField(upload_to=resource_directory_path, null=True, blank=True, verbose_name="资源文件")
+    # 文件所在的内容寻址存储（file.name 即 blob.name）；为空表示旧的独立文件
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, editable=False, related_name='resources')
     link = models.URLField(null=True, blank=True)
     # [新增] 图标类名字段 (用于存储 FontAwesome 类名，例如 'fa-solid fa-file-pdf')
     icon_class = models.CharField("图标类名", max_length=50, blank=True, null=True)
@@ -109,6 +153,10 @@ class Resource(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     ai_tags = models.CharField("AI标签", max_length=200, blank=True)
     embedding_text = models.TextField("向量文本", null=True, blank=True)
+    # float32 向量（定长字节），见 embeddings.py
+    embedding = models.BinaryField("向量", null=True, blank=True, editable=False)
+    # 缩略图存储路径 {'source': 生成时的 file.name, 'small': ..., 'large': ...}，见 thumbnails.py
+    thumbnails = models.JSONField("缩略图", default=dict, blank=True, editable=False)
 
     # 修改 save 方法，自动根据后缀赋予默认图标
     def save(self, *args, **kwargs):
@@ -139,6 +187,79 @@ class Resource(models.Model):
                 
         super().save(*args, **kwargs)
 
+class AiTagJob(models.Model):
+    """
+    AI 打标签任务（数据库队列）：每个资源一行，重复入队会复用同一行
+    """
+    STATUS_CHOICES = (
+        ('pending', '排队中'),
+        ('running', '处理中'),
+        ('done', '已完成'),
+        ('failed', '失败')
+    )
+    resource = models.OneToOneField(Resource, on_delete=models.CASCADE, related_name='ai_job')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # 已处理文本的摘要，文本未变化时重复入队直接跳过
+    text_hash = models.CharField(max_length=40, blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=32, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "AI标签任务"
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+class UploadSession(models.Model):
+    """
+    分片上传会话：分片按偏移写入 MEDIA_ROOT 下的临时文件，完成后直接改名为资源文件
+    """
+    PURPOSE_CHOICES = (('file', '普通文件'), ('h5app', 'H5应用'))
+    STATUS_CHOICES = (('uploading', '上传中'), ('complete', '已完成'))
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='upload_sessions')
+    purpose = models.CharField(max_length=10, choices=PURPOSE_CHOICES, default='file')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    # 完成时创建图标所需的表单参数（坐标、父文件夹、标题等）
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+    resource = models.ForeignKey(Resource, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "分片上传"
+
+class DesktopIconQuerySet(models.QuerySet):
+    _prefetch_previews = False
+
+    def prefetch_previews(self):
+        """
+        类似 prefetch_related：取出图标后批量加载内容对象和文件夹预览
+        """
+        clone = self._chain()
+        clone._prefetch_previews = True
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._prefetch_previews = self._prefetch_previews
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is None
+        super()._fetch_all()
+        if fetched and self._prefetch_previews and self._iterable_class is models.query.ModelIterable:
+            from .desktop_utils import load_content_objects, load_folder_previews
+            load_content_objects(self._result_cache)
+            load_folder_previews(self._result_cache)
+
 # 4. [新增] 桌面图标模型 (核心)
 class DesktopIcon(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='desktop_icons')
@@ -157,6 +278,8 @@ class DesktopIcon(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DesktopIconQuerySet.as_manager()
+
     class Meta: ordering = ['created_at']
 
 # 5. 评论模型
@@ -201,6 +324,11 @@ class AppEntry(models.Model):
     reviewed_at = models.DateTimeField(null=True, blank=True)
     view_count = models.IntegerField(default=0)
     like_count = models.IntegerField(default=0)
+    # 评论数，随评论增删在同一事务内用 F() 更新（见 signals.py）
+    comment_count = models.IntegerField(default=0)
+    # 排行分数（时间衰减的浏览/点赞/评论加权和），由 recompute_app_rankings 增量维护，见 ranking.py
+    hot_score = models.FloatField(default=0)
+    trending_score = models.FloatField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -211,7 +339,12 @@ class AppEntry(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self): return self.title
-    class Meta: verbose_name = "应用条目"
+    class Meta:
+        verbose_name = "应用条目"
+        indexes = [
+            models.Index(fields=['tenant', '-hot_score']),
+            models.Index(fields=['tenant', '-trending_score']),
+        ]
 
 class AppCollection(models.Model):
     title = models.CharField("专题标题", max_length=100)
@@ -240,7 +373,9 @@ class AppComment(models.Model):
     content = models.TextField("评论内容")
     created_at = models.DateTimeField(auto_now_add=True)
 
-    class Meta: verbose_name = "应用评论"
+    class Meta:
+        verbose_name = "应用评论"
+        indexes = [models.Index(fields=['created_at'])]
 
 class AppLike(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -250,6 +385,7 @@ class AppLike(models.Model):
     class Meta:
         verbose_name = "应用点赞"
         unique_together = ('user', 'app')
+        indexes = [models.Index(fields=['created_at'])]
 
 class AppReport(models.Model):
     REASON_CHOICES = (
@@ -267,8 +403,82 @@ class AppReport(models.Model):
     class Meta: verbose_name = "应用举报"
 
 class AppView(models.Model):
+    """
+    浏览明细（只追加，按 APP_VIEW_RAW_SAMPLE_RATE 抽样写入，超过保留期由 prune_app_views 删除）；
+    计数以下面的小时/天汇总表为准
+    """
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     app = models.ForeignKey(AppEntry, on_delete=models.CASCADE, related_name='views')
-    created_at = models.DateTimeField(auto_now_add=True)
+    # 浏览发生的时间（批量写回时保留事件时间，不用 auto_now_add）
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "应用浏览"
+        indexes = [
+            models.Index(fields=['app', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
+
+class AppViewHourly(models.Model):
+    app = models.ForeignKey(AppEntry, on_delete=models.CASCADE, related_name='hourly_views')
+    hour = models.DateTimeField("小时（UTC 整点）")
+    views = models.IntegerField(default=0)
+    # 已计入排行分数的浏览数，排行任务只处理 views - ranked_views 的增量
+    ranked_views = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "应用浏览（小时汇总）"
+        unique_together = ('app', 'hour')
+        indexes = [models.Index(fields=['hour'])]
+
+class AppViewDaily(models.Model):
+    app = models.ForeignKey(AppEntry, on_delete=models.CASCADE, related_name='daily_views')
+    day = models.DateField("日期（本地时区）")
+    views = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "应用浏览（天汇总）"
+        unique_together = ('app', 'day')
 
-    class Meta: verbose_name = "应用浏览"
\ No newline at end of file
+# 7. 全文检索倒排索引（应用商店 / 资源）
+class SearchDocument(models.Model):
+    KIND_CHOICES = (('app', '应用'), ('resource', '资源'))
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='search_documents', null=True, blank=True)
+    length = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "检索文档"
+        unique_together = ('kind', 'object_id')
+        indexes = [models.Index(fields=['tenant', 'kind'])]
+
+class SearchPosting(models.Model):
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name='postings')
+    term = models.CharField(max_length=64)
+    tf = models.IntegerField(default=1)
+
+    class Meta:
+        verbose_name = "检索倒排项"
+        indexes = [models.Index(fields=['term', 'document'])]
+
+class SearchIndexQueue(models.Model):
+    """待重建索引的对象（脏标记），由批处理统一消费"""
+    kind = models.CharField(max_length=10, choices=SearchDocument.KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    queued_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "检索索引队列"
+        unique_together = ('kind', 'object_id')
+
+# 8. 周期任务检查点
+class JobState(models.Model):
+    """周期任务的进度（上次运行时间等），按 key 区分任务"""
+    key = models.CharField(max_length=50, unique=True)
+    value = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "任务检查点"
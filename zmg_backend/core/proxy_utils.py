@@ -0,0 +1,187 @@
+"""
+对外 HTTP 代理（GitHub 等）：异步请求上游，等待期间不占用 worker
+ASGI 模式（uvicorn worker，见 gunicorn.conf.py）下每个事件循环复用一个 httpx.AsyncClient 连接池；
+WSGI 模式下每个请求的事件循环是临时的，不做池化。
+未安装 httpx 时退回 urllib，放到线程池执行，同样不阻塞事件循环。
+
+cached_fetch_json 在进程内缓存上游结果：PROXY_CACHE_TTL 内直接命中；过期后带 If-None-Match 重新验证，
+304 时沿用旧结果；同一 URL 的并发未命中合并为一次上游请求；上游失败时在 PROXY_CACHE_STALE_TTL 内返回旧结果
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+import weakref
+from collections import Counter, namedtuple
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .cache_utils import TTLCache
+
+try:
+    import httpx
+except ImportError:  # 可选依赖：pip install httpx
+    httpx = None
+
+_clients = weakref.WeakKeyDictionary()   # 事件循环 -> AsyncClient
+_pooling = False
+
+# 条目保留到 STALE_TTL（上游失败时兜底），是否新鲜由 fetched_at 判断
+_cache = TTLCache(maxsize=settings.PROXY_CACHE_MAX_ENTRIES, ttl=settings.PROXY_CACHE_STALE_TTL)
+_Entry = namedtuple('_Entry', 'fetched_at etag data')
+# URL -> concurrent.futures.Future：WSGI 模式下每个请求的事件循环不同，不能用 asyncio.Future
+_inflight = {}
+_lock = threading.Lock()
+_stats = Counter()
+
+
+class UpstreamError(Exception):
+    def __init__(self, msg, status=None):
+        super().__init__(msg)
+        self.status = status
+
+
+def enable_pooling():
+    """由 asgi.py 调用：长期运行的事件循环才值得维护连接池"""
+    global _pooling
+    _pooling = True
+
+
+def _new_client():
+    return httpx.AsyncClient(
+        timeout=settings.PROXY_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=settings.PROXY_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.PROXY_MAX_CONNECTIONS,
+        ),
+    )
+
+
+def _pooled_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = _new_client()
+    return client
+
+
+async def _fetch_httpx(url, headers):
+    if _pooling:
+        resp = await _pooled_client().get(url, headers=headers)
+    else:
+        async with _new_client() as client:
+            resp = await client.get(url, headers=headers)
+    return resp.status_code, resp.headers, resp.content
+
+
+def _fetch_urllib(url, headers):
+    req = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=settings.PROXY_TIMEOUT) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+async def fetch(url, headers):
+    """GET 上游，返回 (状态码, 响应头, 响应体)；连接失败/超时抛 UpstreamError"""
+    try:
+        if httpx is not None:
+            return await _fetch_httpx(url, headers)
+        return await sync_to_async(_fetch_urllib, thread_sensitive=False)(url, headers)
+    except Exception as e:
+        raise UpstreamError(str(e) or e.__class__.__name__)
+
+
+def _parse_json(status, body):
+    if status >= 300:
+        raise UpstreamError(f"HTTP Error {status}", status=status)
+    try:
+        return json.loads(body.decode('utf-8'))
+    except ValueError as e:
+        raise UpstreamError(f"invalid JSON from upstream: {e}", status=status)
+
+
+async def fetch_json(url, headers):
+    """GET 上游并解析 JSON；非 2xx 或响应不是 JSON 时抛 UpstreamError"""
+    status, _, body = await fetch(url, headers)
+    return _parse_json(status, body)
+
+
+def _count(key):
+    with _lock:
+        _stats[key] += 1
+
+
+def stats():
+    """本进程的缓存计数：hit / revalidated / miss / stale / coalesced，以及当前条目数"""
+    with _lock:
+        return {**dict.fromkeys(('hit', 'revalidated', 'miss', 'stale', 'coalesced'), 0), **_stats, 'entries': len(_cache)}
+
+
+def clear_cache():
+    _cache.clear()
+    with _lock:
+        _stats.clear()
+
+
+async def _refresh(url, headers, entry, transform):
+    request_headers = dict(headers)
+    if entry and entry.etag:
+        request_headers['If-None-Match'] = entry.etag
+    try:
+        status, response_headers, body = await fetch(url, request_headers)
+        if status == 304 and entry:
+            _cache.set(url, entry._replace(fetched_at=time.monotonic()))
+            _count('revalidated')
+            return entry.data, 'REVALIDATED'
+        data = transform(_parse_json(status, body))
+    except UpstreamError:
+        if entry is None:
+            _count('miss')
+            raise
+        _count('stale')
+        return entry.data, 'STALE'
+    _cache.set(url, _Entry(time.monotonic(), response_headers.get('ETag'), data))
+    _count('miss')
+    return data, 'MISS'
+
+
+async def cached_fetch_json(url, headers, transform=None):
+    """
+    带缓存的 fetch_json，返回 (数据, 缓存状态 HIT/REVALIDATED/MISS/STALE)。
+    缓存以 URL 为键（调用方负责把参数规范化后再拼 URL），transform 在写入缓存前处理响应（只缓存需要的字段）
+    """
+    transform = transform or (lambda data: data)
+    entry = _cache.get(url)
+    if entry and time.monotonic() - entry.fetched_at < settings.PROXY_CACHE_TTL:
+        _count('hit')
+        return entry.data, 'HIT'
+
+    with _lock:
+        future = _inflight.get(url)
+        leader = future is None
+        if leader:
+            future = _inflight[url] = concurrent.futures.Future()
+    if not leader:
+        _count('coalesced')
+        return await asyncio.wrap_future(future)
+
+    try:
+        result = await _refresh(url, headers, entry, transform)
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    except BaseException:
+        # 发起请求的连接被取消（客户端断开），等待中的请求按上游失败处理
+        future.set_exception(UpstreamError('upstream request cancelled'))
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _lock:
+            _inflight.pop(url, None)
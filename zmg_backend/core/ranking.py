@@ -0,0 +1,169 @@
+"""
+应用商店排行：hot（慢衰减，长期热门）与 trending（快衰减，近期上升）
+分数 = Σ 权重 × exp(λ·(事件时间 − epoch))，所有应用共用同一个 epoch，
+真实的衰减分数只差一个公共因子 exp(−λ·(now − epoch))，所以直接按存储值排序即可，
+新事件只需累加，每次运行的代价只与上次运行以来的新事件数成正比。
+点赞/评论按自增 id 游标读取（不按 created_at 时间窗，晚提交的事件 created_at 可能早于上次运行），
+最近 APP_RANK_HOLDBACK_SECONDS 秒内写入的留到下次，游标不越过可能还没提交的小 id。
+epoch 离现在太远（指数过大）时整体乘以衰减因子并前移 epoch（rebase，很少发生）。
+取消点赞不回退分数，定期用 --full 全量重算校正
+"""
+
+import math
+from collections import defaultdict
+from datetime import datetime
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min
+from django.utils import timezone
+from .models import AppComment, AppEntry, AppLike, AppViewDaily, AppViewHourly, JobState
+
+STATE_KEY = 'app_ranking'
+SCORE_FIELDS = ('hot_score', 'trending_score')
+# λ·(now − epoch) 超过该值时 rebase（exp(50) ≈ 5e21，离 float 上限很远）
+REBASE_EXPONENT = 50
+# 刷新线程写回略有延迟，小时汇总多回看一小时
+VIEW_LOOKBACK = timezone.timedelta(hours=1)
+BATCH_SIZE = 1000
+
+
+def _rates():
+    """各分数的衰减率 λ（每秒），由半衰期换算"""
+    return {
+        'hot_score': math.log(2) / (settings.APP_HOT_HALF_LIFE_HOURS * 3600),
+        'trending_score': math.log(2) / (settings.APP_TRENDING_HALF_LIFE_HOURS * 3600),
+    }
+
+
+def _load_state():
+    state = JobState.objects.filter(key=STATE_KEY).first()
+    if not state or 'cursors' not in state.value:
+        return None
+    return {
+        'epoch': datetime.fromisoformat(state.value['epoch']),
+        'last_run': datetime.fromisoformat(state.value['last_run']),
+        'cursors': state.value['cursors'],
+    }
+
+
+def _save_state(epoch, last_run, cursors):
+    JobState.objects.update_or_create(key=STATE_KEY, defaults={'value': {
+        'epoch': epoch.isoformat(), 'last_run': last_run.isoformat(), 'cursors': cursors,
+    }})
+
+
+class _Scores:
+    """按应用累加各分数的增量"""
+    def __init__(self, epoch):
+        self.epoch = epoch
+        self.rates = _rates()
+        self.weights = settings.APP_RANK_WEIGHTS
+        self.deltas = defaultdict(lambda: dict.fromkeys(SCORE_FIELDS, 0.0))
+
+    def add(self, app_id, kind, at, n=1):
+        age = (at - self.epoch).total_seconds()
+        delta = self.deltas[app_id]
+        for field, rate in self.rates.items():
+            delta[field] += self.weights[kind] * n * math.exp(rate * age)
+
+
+def _rebase(epoch, now):
+    """epoch 前移到 now：已有分数乘以 exp(−λ·Δ)"""
+    shift = (now - epoch).total_seconds()
+    AppEntry.objects.update(**{
+        field: F(field) * math.exp(-rate * shift) for field, rate in _rates().items()
+    })
+    return now
+
+
+def _collect_views_since(scores, since):
+    """小时汇总里尚未计入的浏览（views − ranked_views），记在该小时的中点"""
+    rows = list(
+        AppViewHourly.objects.filter(hour__gte=since - VIEW_LOOKBACK, views__gt=F('ranked_views'))
+        .values_list('id', 'app_id', 'hour', 'views', 'ranked_views')
+    )
+    for _, app_id, hour, views, ranked in rows:
+        scores.add(app_id, 'view', hour + timezone.timedelta(minutes=30), views - ranked)
+    # 标记为读到的值；期间新写回的浏览留到下次
+    AppViewHourly.objects.bulk_update(
+        [AppViewHourly(pk=pk, ranked_views=views) for pk, _, _, views, _ in rows], ['ranked_views'], batch_size=BATCH_SIZE
+    )
+    return len(rows)
+
+
+def _collect_events(scores, model, kind, after, now):
+    """
+    计入 id > after 的事件，返回 (事件数, 新游标)
+    只读到第一条仍在暂缓期内的事件之前：并发事务不按 id 顺序提交，游标越过还没提交的小 id 就会永久漏计
+    """
+    cutoff = now - timezone.timedelta(seconds=settings.APP_RANK_HOLDBACK_SECONDS)
+    rows = model.objects.filter(id__gt=after)
+    recent = rows.filter(created_at__gt=cutoff).aggregate(first=Min('id'))['first']
+    if recent is not None:
+        rows = rows.filter(id__lt=recent)
+    count, cursor = 0, after
+    for pk, app_id, created_at in rows.order_by('id').values_list('id', 'app_id', 'created_at').iterator(chunk_size=BATCH_SIZE):
+        scores.add(app_id, kind, min(created_at, now))
+        count, cursor = count + 1, pk
+    return count, cursor
+
+
+def _collect_all_events(scores, cursors, now):
+    events = 0
+    for model, kind in ((AppLike, 'like'), (AppComment, 'comment')):
+        count, cursors[kind] = _collect_events(scores, model, kind, cursors.get(kind, 0), now)
+        events += count
+    return events
+
+
+def _apply_increments(scores):
+    for app_id, delta in scores.deltas.items():
+        AppEntry.objects.filter(pk=app_id).update(**{field: F(field) + value for field, value in delta.items()})
+
+
+def recompute_full(now=None):
+    """全量重算（首次运行或 --full）：浏览取天汇总（记在当天正午），点赞/评论取全部明细"""
+    now = now or timezone.now()
+    scores = _Scores(now)
+    tz = timezone.get_default_timezone()
+    with transaction.atomic():
+        for app_id, day, views in AppViewDaily.objects.values_list('app_id', 'day', 'views').iterator(chunk_size=BATCH_SIZE):
+            noon = timezone.make_aware(datetime(day.year, day.month, day.day, 12), tz)
+            scores.add(app_id, 'view', min(noon, now), views)
+        cursors = {}
+        events = _collect_all_events(scores, cursors, now)
+        # 当前小时汇总都已体现在天汇总里
+        AppViewHourly.objects.update(ranked_views=F('views'))
+
+        AppEntry.objects.update(hot_score=0, trending_score=0)
+        apps = [AppEntry(pk=app_id, **delta) for app_id, delta in scores.deltas.items()]
+        AppEntry.objects.bulk_update(apps, list(SCORE_FIELDS), batch_size=BATCH_SIZE)
+        _save_state(now, now, cursors)
+    return {'mode': 'full', 'apps': len(apps), 'events': events}
+
+
+def recompute(now=None, full=False):
+    """增量更新排行分数，返回 {'mode', 'apps', 'events'}"""
+    now = now or timezone.now()
+    state = None if full else _load_state()
+    if state is None:
+        return recompute_full(now)
+
+    epoch, since, cursors = state['epoch'], state['last_run'], state['cursors']
+    with transaction.atomic():
+        if max(_rates().values()) * (now - epoch).total_seconds() > REBASE_EXPONENT:
+            epoch = _rebase(epoch, now)
+        scores = _Scores(epoch)
+        events = _collect_views_since(scores, since)
+        events += _collect_all_events(scores, cursors, now)
+        _apply_increments(scores)
+        _save_state(epoch, now, cursors)
+    return {'mode': 'incremental', 'apps': len(scores.deltas), 'events': events}
+
+
+def order_by_score(qs, ordering):
+    """?ordering=hot / trending；其他值返回 None"""
+    field = {'hot': 'hot_score', 'trending': 'trending_score'}.get(ordering)
+    if field is None:
+        return None
+    return qs.order_by(f'-{field}', '-created_at')
@@ -0,0 +1,23 @@
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    application/x-ndjson：每行一个 JSON 对象
+    视图一般直接返回 StreamingHttpResponse，这里只负责内容协商和非流式兜底
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(ndjson_line(row) for row in rows).encode(self.charset)
+
+
+def ndjson_line(obj):
+    return json.dumps(obj, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
@@ -0,0 +1,128 @@
+"""
+读多写少列表接口的响应缓存（分类、应用标签、专题合集、我的成员关系）
+每个 (作用域, 租户/用户) 有一个代次计数，存放在共享缓存（settings.CACHES）里；
+缓存键和 ETag 都包含代次，数据变化时信号只需把代次加一（O(1)），旧条目不再被读到，等过期自然淘汰。
+客户端带 If-None-Match 时只需读一次代次即可返回 304，不查库、不序列化
+"""
+
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+GLOBAL = 'global'
+
+
+def _generation_key(scope, owner):
+    return f"gen:{scope}:{GLOBAL if owner is None else owner}"
+
+
+def _seed():
+    # 代次被缓存淘汰后从当前时间（微秒）重新起步，不会与淘汰前的值重复
+    return time.time_ns() // 1000
+
+
+def generations(scopes):
+    """[(作用域, 租户/用户 id), ...] -> 当前代次列表"""
+    keys = [_generation_key(scope, owner) for scope, owner in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _seed(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def _bump_now(scope, owner):
+    key = _generation_key(scope, owner)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _seed(), timeout=None)
+
+
+def _settling_key(scope, owner):
+    return f"settling:{scope}:{GLOBAL if owner is None else owner}"
+
+
+def _bump_committed(scope, owner):
+    _bump_now(scope, owner)
+    if settings.DATABASE_REPLICAS:
+        # 副本可能还没复制到这次提交，期间从副本读到的旧数据不能以新代次写入缓存或作为 ETag：
+        # 复制窗口内标记为“刚变化”，这段时间列表不走缓存
+        cache.set(_settling_key(scope, owner), 1, timeout=settings.DATABASE_REPLICA_PIN_SECONDS)
+
+
+def settling(scopes):
+    """是否有作用域刚在复制窗口内变化过（只在配置了只读副本时才可能为真）"""
+    if not settings.DATABASE_REPLICAS:
+        return False
+    return bool(cache.get_many([_settling_key(scope, owner) for scope, owner in scopes]))
+
+
+def bump(scope, owner=None):
+    """
+    让 (作用域, 租户/用户) 下缓存的响应全部失效。
+    立即加一保证同一事务内随后的读取不命中旧数据；提交后再加一，
+    丢弃并发请求在提交前读到旧数据并写入的条目
+    """
+    _bump_now(scope, owner)
+    transaction.on_commit(lambda: _bump_committed(scope, owner), robust=True)
+
+
+def etag_matches(request, etag):
+    """If-None-Match 是否包含 etag（按弱比较）"""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(',')]
+    return '*' in candidates or etag in candidates or etag.removeprefix('W/') in candidates
+
+
+class CachedListMixin:
+    """
+    给 ViewSet 的 list 加响应缓存和 ETag/304。
+    子类覆盖 cache_scopes(request)，返回决定列表内容的 [(作用域, 租户/用户 id), ...]，默认返回 None 即不缓存；
+    cache_variant(request) 区分同一作用域下因角色不同而不同的结果
+    """
+    # 列表中有不经代次失效的内容（例如计数）时设置：缓存和 ETag 每 cache_timeout 秒换一次，最多旧这么久
+    cache_timeout = None
+
+    def cache_scopes(self, request):
+        return None
+
+    def cache_variant(self, request):
+        return ''
+
+    def list(self, request, *args, **kwargs):
+        timeout = settings.RESPONSE_CACHE_TTL
+        if self.cache_timeout is not None:
+            timeout = min(timeout, self.cache_timeout)
+        scopes = self.cache_scopes(request) if timeout > 0 else None
+        if not scopes or settling(scopes):
+            return super().list(request, *args, **kwargs)
+
+        parts = [f"{scope}:{owner}:{gen}" for (scope, owner), gen in zip(scopes, generations(scopes))]
+        parts += [self.cache_variant(request), request.get_full_path()]
+        if self.cache_timeout is not None:
+            # 只看代次的话计数变化后客户端会一直拿到 304
+            parts.append(int(time.time() // timeout))
+        digest = hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()
+        etag = f'W/"{digest}"'
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        key = f"resp:{digest}"
+        data = cache.get(key)
+        if data is not None:
+            return Response(data, headers=headers)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, timeout)
+            for name, value in headers.items():
+                response[name] = value
+        return response
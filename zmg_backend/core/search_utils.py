@@ -0,0 +1,264 @@
+"""
+全文检索：倒排索引 + BM25 排序
+分词见 tokenizer.py，索引存放在数据库表中（SearchDocument / SearchPosting）
+"""
+
+import logging
+import math
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count
+from .models import AppEntry, Resource, SearchDocument, SearchPosting, SearchIndexQueue
+from .tokenizer import tokenize, split_prefix, is_cjk
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 英文/数字查询词按前缀扩展（"phys" 命中 "physics"），每个词最多扩展到的词数（按文档频次取前几个）
+PREFIX_EXPANSIONS = 20
+
+
+# --- 建索引 ---
+
+def _app_text(app):
+    tags = ' '.join(tag.name for tag in app.tags.all())
+    # 标题重复一次，相当于标题权重加倍
+    return ' '.join([app.title, app.title, app.summary or '', tags])
+
+
+def _resource_text(res):
+    return ' '.join([res.title, res.title, res.description or '', (res.ai_tags or '').replace(',', ' ')])
+
+
+def build_search_text(app):
+    """AppEntry.search_text：标题 + 简介 + 标签（需预取 tags）"""
+    tags_text = " ".join(tag.name for tag in app.tags.all())
+    return f"{app.title} {app.summary or ''} {tags_text}".strip()
+
+
+def _load_apps(ids):
+    return AppEntry.objects.filter(id__in=ids).prefetch_related('tags')
+
+
+def _load_resources(ids):
+    return Resource.objects.filter(id__in=ids)
+
+
+SEARCH_SOURCES = {
+    'app': (AppEntry, _app_text),
+    'resource': (Resource, _resource_text),
+}
+
+SEARCH_LOADERS = {
+    'app': _load_apps,
+    'resource': _load_resources,
+}
+
+
+def _documents(kind, object_ids):
+    return {
+        doc.object_id: doc
+        for doc in SearchDocument.objects.filter(kind=kind, object_id__in=list(object_ids))
+    }
+
+
+def index_objects(kind, objects):
+    """（重新）索引一批对象，已有文档的倒排项整体替换"""
+    _, text_func = SEARCH_SOURCES[kind]
+    objects = list(objects)
+    if not objects:
+        return 0
+
+    with transaction.atomic():
+        existing = _documents(kind, [o.pk for o in objects])
+        SearchPosting.objects.filter(document__in=existing.values()).delete()
+
+        counters = {}
+        new_docs, changed_docs = [], []
+        for obj in objects:
+            counter = Counter(tokenize(text_func(obj), unigrams=True))
+            counters[obj.pk] = counter
+            doc = existing.get(obj.pk)
+            if doc is None:
+                new_docs.append(SearchDocument(kind=kind, object_id=obj.pk, tenant_id=obj.tenant_id,
+                                               length=sum(counter.values())))
+            else:
+                doc.tenant_id = obj.tenant_id
+                doc.length = sum(counter.values())
+                changed_docs.append(doc)
+
+        SearchDocument.objects.bulk_create(new_docs)
+        SearchDocument.objects.bulk_update(changed_docs, ['tenant', 'length'])
+        if any(doc.pk is None for doc in new_docs):
+            # 数据库不支持 RETURNING 时 bulk_create 不回填主键，重新查询一次
+            existing = _documents(kind, counters.keys())
+        else:
+            existing.update((doc.object_id, doc) for doc in new_docs)
+
+        postings = [
+            SearchPosting(document=existing[object_id], term=term, tf=tf)
+            for object_id, counter in counters.items()
+            for term, tf in counter.items()
+        ]
+        SearchPosting.objects.bulk_create(postings, batch_size=2000)
+    return len(objects)
+
+
+def reindex(kind, objects):
+    """
+    重建一批对象：应用同时刷新 search_text（bulk_update 只写有变化的行），再更新倒排索引
+    返回 (处理数, search_text 变化数)
+    """
+    objects = list(objects)
+    changed = []
+    if kind == 'app':
+        for app in objects:
+            text = build_search_text(app)
+            if app.search_text != text:
+                app.search_text = text
+                changed.append(app)
+        AppEntry.objects.bulk_update(changed, ['search_text'], batch_size=500)
+    index_objects(kind, objects)
+    return len(objects), len(changed)
+
+
+def remove_objects(kind, object_ids):
+    SearchDocument.objects.filter(kind=kind, object_id__in=list(object_ids)).delete()
+
+
+# --- 增量索引：信号打脏标记入队，由 build_search_index --pending（--watch 常驻）批量处理 ---
+
+def mark_dirty(kind, object_ids, inline=True):
+    """
+    入队；inline 且对象数不超过 SEARCH_INLINE_INDEX_LIMIT 时（单个应用/资源的编辑），
+    提交后顺便处理本事务标记的对象，搜索结果立即可见。批量标记（如全局标签改名涉及的所有应用）只入队
+    """
+    ids = {object_id for object_id in object_ids if object_id}
+    if not ids:
+        return
+    SearchIndexQueue.objects.bulk_create(
+        [SearchIndexQueue(kind=kind, object_id=object_id) for object_id in ids], ignore_conflicts=True
+    )
+    if inline and len(ids) <= settings.SEARCH_INLINE_INDEX_LIMIT:
+        transaction.on_commit(lambda: process_marked(kind, ids), robust=True)
+
+
+def process_marked(kind, object_ids):
+    """处理队列中指定的对象（已被其他进程认领的跳过），返回处理数"""
+    batch = list(
+        SearchIndexQueue.objects.filter(kind=kind, object_id__in=object_ids).values_list('id', 'kind', 'object_id')
+    )
+    return _process_batch(batch)
+
+
+def process_dirty(batch_size=500):
+    """消费整个脏标记队列，返回处理的对象数"""
+    processed = 0
+    while True:
+        batch = list(SearchIndexQueue.objects.order_by('id').values_list('id', 'kind', 'object_id')[:batch_size])
+        if not batch:
+            return processed
+        processed += _process_batch(batch)
+
+
+def _process_batch(batch):
+    """
+    先删除（认领）队列条目再处理，处理期间的新修改会重新入队
+    处理失败时把认领的条目放回队列
+    """
+    if not batch:
+        return 0
+    SearchIndexQueue.objects.filter(id__in=[row[0] for row in batch]).delete()
+
+    ids_by_kind = defaultdict(set)
+    for _, kind, object_id in batch:
+        ids_by_kind[kind].add(object_id)
+    try:
+        for kind, ids in ids_by_kind.items():
+            objects = list(SEARCH_LOADERS[kind](ids))
+            reindex(kind, objects)
+            # 已删除的对象
+            remove_objects(kind, ids - {obj.pk for obj in objects})
+    except Exception:
+        logger.exception("search index batch failed, requeueing %d items", len(batch))
+        SearchIndexQueue.objects.bulk_create(
+            [SearchIndexQueue(kind=kind, object_id=object_id) for _, kind, object_id in batch],
+            ignore_conflicts=True
+        )
+        raise
+    return len(batch)
+
+
+# --- 查询 ---
+
+def _expand_prefixes(postings, terms):
+    """英文/数字词扩展为以它开头的已索引词；中文已按单字/二元组索引，不需要扩展"""
+    expanded = []
+    for term in terms:
+        expanded.append(term)
+        if is_cjk(term):
+            continue
+        rows = (
+            postings.filter(term__gt=term, term__lt=term + '\uffff')
+            .values('term').annotate(df=Count('id')).order_by('-df', 'term')[:PREFIX_EXPANSIONS]
+        )
+        expanded.extend(row['term'] for row in rows)
+    return list(dict.fromkeys(expanded))
+
+
+def search(tenant, kind, query, limit=100, object_ids=None):
+    """
+    在租户范围内检索，返回按 BM25 分数降序的 [(object_id, score), ...]
+    object_ids 限定可见对象（id 列表或子查询），在截取前 limit 个之前过滤
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not tenant or not terms:
+        return []
+
+    docs = SearchDocument.objects.filter(tenant=tenant, kind=kind)
+    if object_ids is not None:
+        docs = docs.filter(object_id__in=object_ids)
+    stats = docs.aggregate(n=Count('id'), avgdl=Avg('length'))
+    total, avgdl = stats['n'], stats['avgdl'] or 1.0
+    if not total:
+        return []
+
+    postings = SearchPosting.objects.filter(document__tenant=tenant, document__kind=kind)
+    if object_ids is not None:
+        postings = postings.filter(document__object_id__in=object_ids)
+    terms = _expand_prefixes(postings, terms)
+    rows = list(
+        postings.filter(term__in=terms).values_list('term', 'tf', 'document__object_id', 'document__length')
+    )
+    df = Counter(term for term, _, _, _ in rows)
+    scores = defaultdict(float)
+    for term, tf, object_id, length in rows:
+        idf = math.log(1 + (total - df[term] + 0.5) / (df[term] + 0.5))
+        norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avgdl)
+        scores[object_id] += idf * tf * (BM25_K1 + 1) / norm
+
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+    return ranked[:limit]
+
+
+def suggest(tenant, kind, query, limit=10, object_ids=None):
+    """
+    前缀补全：用 term 的范围查询（可走索引）找出以前缀开头的词，按文档频次排序
+    返回 [(补全文本, 文档数), ...]
+    """
+    head, prefix = split_prefix(query)
+    if not tenant or not prefix:
+        return []
+    postings = SearchPosting.objects.filter(
+        document__tenant=tenant, document__kind=kind,
+        term__gte=prefix, term__lt=prefix + '\uffff'
+    )
+    if object_ids is not None:
+        postings = postings.filter(document__object_id__in=object_ids)
+    if is_cjk(prefix):
+        # 单字本身也被索引了，不作为补全结果
+        postings = postings.exclude(term=prefix)
+    rows = postings.values('term').annotate(df=Count('id')).order_by('-df', 'term')[:limit]
+    return [(head + row['term'], row['df']) for row in rows]
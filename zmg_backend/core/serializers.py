@@ -5,6 +5,8 @@ from .models import (
     AppEntry, AppTag, AppCollection, AppCollectionItem, AppComment
 )
 import uuid
+from django.urls import reverse
+from .thumbnails import thumbnail_urls
 
 # --- 基础序列化器 ---
 
@@ -37,9 +39,18 @@ class CategorySerializer(serializers.ModelSerializer):
 class ResourceSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
+    thumb_small = serializers.SerializerMethodField()
+    thumb_large = serializers.SerializerMethodField()
     class Meta: 
         model = Resource
-        fields = '__all__'
+        # 向量和缩略图存储路径只在服务端使用
+        exclude = ['embedding', 'thumbnails']
+
+    def get_thumb_small(self, obj):
+        return thumbnail_urls(obj)['thumb_small']
+
+    def get_thumb_large(self, obj):
+        return thumbnail_urls(obj)['thumb_large']
 
 class CommentSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
@@ -67,6 +78,8 @@ class AppEntrySerializer(serializers.ModelSerializer):
             'reviewed_by', 'review_reason', 'reviewed_at',
             'view_count', 'like_count', 'comment_count', 'created_at', 'updated_at'
         ]
+        # 计数由 F() 增量维护（counters.py / signals.py），不接受客户端写入
+        read_only_fields = ['view_count', 'like_count']
 
     def create(self, validated_data):
         tag_names = validated_data.pop('tag_names', [])
@@ -78,7 +91,8 @@ class AppEntrySerializer(serializers.ModelSerializer):
         tag_names = validated_data.pop('tag_names', None)
         for k, v in validated_data.items():
             setattr(instance, k, v)
-        instance.save()
+        # 只写本次修改的字段，不用内存里的旧计数/排行分数覆盖并发的 F() 增量
+        instance.save(update_fields=[*validated_data, 'updated_at'])
         if tag_names is not None:
             instance.tags.clear()
             self._save_tags(instance, tag_names)
@@ -132,6 +146,16 @@ class RegisterSerializer(serializers.ModelSerializer):
 
 # --- 核心：桌面图标序列化 ---
 
+class DesktopIconListSerializer(serializers.ListSerializer):
+    """
+    列表序列化前批量加载 content_object，避免每个图标一次查询
+    """
+    def to_representation(self, data):
+        from .desktop_utils import load_content_objects
+        icons = list(data.all() if hasattr(data, 'all') else data)
+        load_content_objects(icons)
+        return super().to_representation(icons)
+
 class DesktopIconSerializer(serializers.ModelSerializer):
     data = serializers.SerializerMethodField()
     type = serializers.SerializerMethodField()
@@ -142,6 +166,7 @@ class DesktopIconSerializer(serializers.ModelSerializer):
         from .models import DesktopIcon
         model = DesktopIcon
         fields = '__all__'
+        list_serializer_class = DesktopIconListSerializer
 
     def get_type(self, obj):
         if not obj.content_type: return 'unknown'
@@ -153,12 +178,17 @@ class DesktopIconSerializer(serializers.ModelSerializer):
         # 如果是文件
         if obj.content_type.model == 'resource':
             res = obj.content_object
+            thumbs = thumbnail_urls(res)
             return {
                 'id': res.id,
                 'title': res.title,
-                'cover': res.cover.url if res.cover else None,
+                # 没有手动封面时用生成的大缩略图
+                'cover': res.cover.url if res.cover else thumbs['thumb_large'],
+                **thumbs,
                 'kind': res.kind,
                 'file': res.file.url if res.file else None,
+                # 需要鉴权、支持拖动的下发地址；播放器先 POST <media>token/ 换取带短期令牌的播放地址
+                'media': reverse('media_resource', args=[res.id]) if res.file else None,
                 'link': res.link,
                 'icon_class': res.icon_class 
             }
@@ -179,6 +209,10 @@ class DesktopIconSerializer(serializers.ModelSerializer):
         """
         if not obj.content_type or obj.content_type.model != 'category':
             return []
+
+        # 视图通过 prefetch_previews() 批量预取时直接使用
+        if hasattr(obj, '_folder_preview'):
+            return obj._folder_preview
             
         cat = obj.content_object
         if not cat: 
@@ -195,8 +229,8 @@ class DesktopIconSerializer(serializers.ModelSerializer):
                 item['type'] = child.content_type.model
                 if child.content_type.model == 'resource':
                     res = child.content_object
-                    if res and res.cover:
-                        item['cover'] = res.cover.url
+                    if res:
+                        item['cover'] = thumbnail_urls(res)['thumb_small'] or (res.cover.url if res.cover else None)
             preview_list.append(item)
             
         return preview_list
\ No newline at end of file
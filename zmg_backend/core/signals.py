@@ -0,0 +1,189 @@
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.db.models import F
+from .models import (
+    Membership, Tenant, AppEntry, AppTag, AppComment, Resource, Category, AppCollection, AppCollectionItem
+)
+from .tenant_utils import invalidate_membership_cache
+from .sync_utils import SYNC_KINDS, record_changes
+from .search_utils import mark_dirty, remove_objects
+from .ai_jobs import enqueue_ai_tagging
+from .blob_utils import stage_uploaded_file, commit_staged_file, release as release_blob
+from .thumbnails import needs_thumbnails, remove_thumbnails, schedule_thumbnails
+from .response_cache import bump as bump_response_cache
+
+
+# --- 租户/成员缓存失效 ---
+
+@receiver([post_save, post_delete], sender=Membership)
+def membership_changed(sender, instance, **kwargs):
+    invalidate_membership_cache(instance.user_id)
+
+@receiver([post_save, post_delete], sender=Tenant)
+def tenant_changed(sender, instance, **kwargs):
+    invalidate_membership_cache()
+
+
+# --- 同步变更日志 ---
+
+def _sync_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_changes(sender, [instance])
+
+def _sync_deleted(sender, instance, **kwargs):
+    record_changes(sender, [instance], action='delete')
+
+for _model in SYNC_KINDS:
+    post_save.connect(_sync_saved, sender=_model, dispatch_uid=f'sync_saved_{_model.__name__}')
+    post_delete.connect(_sync_deleted, sender=_model, dispatch_uid=f'sync_deleted_{_model.__name__}')
+
+
+# --- 全文检索索引（只打脏标记，提交后批量重建） ---
+
+@receiver(post_save, sender=AppEntry)
+def app_entry_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    # search_text 由索引批处理自己维护，单独更新它时无需再入队
+    if not raw and update_fields != frozenset(['search_text']):
+        mark_dirty('app', [instance.pk])
+
+@receiver(m2m_changed, sender=AppEntry.tags.through)
+def app_entry_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        mark_dirty('app', [instance.pk])
+    elif action == 'pre_clear':
+        mark_dirty('app', instance.apps.values_list('id', flat=True))
+    else:
+        mark_dirty('app', pk_set or [])
+
+@receiver(post_save, sender=AppTag)
+def app_tag_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        mark_dirty('app', instance.apps.values_list('id', flat=True), inline=False)
+
+@receiver(pre_delete, sender=AppTag)
+def app_tag_deleted(sender, instance, **kwargs):
+    # 标签是全局的，可能涉及所有租户的大量应用：只入队，不在请求里重建
+    mark_dirty('app', instance.apps.values_list('id', flat=True), inline=False)
+
+@receiver(post_save, sender=Resource)
+def resource_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        mark_dirty('resource', [instance.pk])
+
+@receiver(post_delete, sender=AppEntry)
+def app_entry_deleted(sender, instance, **kwargs):
+    remove_objects('app', [instance.pk])
+
+@receiver(post_delete, sender=Resource)
+def resource_deleted(sender, instance, **kwargs):
+    remove_objects('resource', [instance.pk])
+
+
+# --- AI 打标签：新资源或标题/描述可能变化的保存提交后入队，由 run_ai_worker 异步处理 ---
+
+AI_TEXT_FIELDS = frozenset(['title', 'description'])
+
+@receiver(post_save, sender=Resource)
+def resource_saved_for_ai(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or instance.kind == 'link':
+        return
+    # 文本是否真的变了由 enqueue_ai_tagging 比较 text_hash 判断
+    if created or update_fields is None or AI_TEXT_FIELDS & update_fields:
+        transaction.on_commit(lambda: enqueue_ai_tagging(instance), robust=True)
+
+
+# --- 内容寻址存储：新上传的文件提交后存为 blob，删除资源时释放引用 ---
+
+@receiver(pre_save, sender=Resource, dispatch_uid='resource_file_to_blob')
+def resource_file_to_blob(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._staged_file = stage_uploaded_file(instance)
+
+@receiver(post_save, sender=Resource, dispatch_uid='resource_commit_blob')
+def resource_commit_blob(sender, instance, raw=False, **kwargs):
+    staged = instance.__dict__.pop('_staged_file', None)
+    if staged:
+        transaction.on_commit(lambda: commit_staged_file(instance, staged), robust=True)
+
+@receiver(post_delete, sender=Resource, dispatch_uid='resource_release_blob')
+def resource_release_blob(sender, instance, **kwargs):
+    if instance.blob_id:
+        blob_id = instance.blob_id
+        transaction.on_commit(lambda: release_blob(blob_id), robust=True)
+
+
+# --- 缩略图：图片/视频文件提交后交给渲染进程池 ---
+
+@receiver(post_save, sender=Resource, dispatch_uid='resource_schedule_thumbnails')
+def resource_schedule_thumbnails(sender, instance, raw=False, **kwargs):
+    if not raw and needs_thumbnails(instance):
+        resource_id = instance.pk
+        transaction.on_commit(lambda: schedule_thumbnails(resource_id), robust=True)
+
+@receiver(post_delete, sender=Resource, dispatch_uid='resource_remove_thumbnails')
+def resource_remove_thumbnails(sender, instance, **kwargs):
+    # blob 的缩略图随 blob 一起释放；旧的独立文件在这里删除
+    if not instance.blob_id and instance.file:
+        name = instance.file.name
+        transaction.on_commit(lambda: remove_thumbnails(name), robust=True)
+
+
+# --- 应用评论数：随评论增删维护 AppEntry.comment_count ---
+
+@receiver(post_save, sender=AppComment, dispatch_uid='app_comment_created')
+def app_comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AppEntry.objects.filter(pk=instance.app_id).update(comment_count=F('comment_count') + 1)
+
+@receiver(post_delete, sender=AppComment, dispatch_uid='app_comment_deleted')
+def app_comment_deleted(sender, instance, **kwargs):
+    AppEntry.objects.filter(pk=instance.app_id, comment_count__gt=0).update(comment_count=F('comment_count') - 1)
+
+
+# --- 列表响应缓存：数据变化时把对应租户/用户的代次加一 ---
+
+@receiver([post_save, post_delete], sender=Category, dispatch_uid='category_bump_cache')
+def category_changed(sender, instance, **kwargs):
+    bump_response_cache('categories', instance.tenant_id)
+
+@receiver([post_save, post_delete], sender=AppTag, dispatch_uid='app_tag_bump_cache')
+def app_tag_changed(sender, instance, **kwargs):
+    # 专题合集内嵌标签，其缓存键也包含标签代次
+    bump_response_cache('app_tags')
+
+@receiver([post_save, post_delete], sender=AppCollection, dispatch_uid='app_collection_bump_cache')
+def app_collection_changed(sender, instance, **kwargs):
+    bump_response_cache('app_collections', instance.tenant_id)
+
+@receiver([post_save, post_delete], sender=AppCollectionItem, dispatch_uid='app_collection_item_bump_cache')
+def app_collection_item_changed(sender, instance, **kwargs):
+    tenant_id = AppCollection.objects.filter(pk=instance.collection_id).values_list('tenant_id', flat=True).first()
+    bump_response_cache('app_collections', tenant_id)
+
+@receiver([post_save, post_delete], sender=AppEntry, dispatch_uid='app_entry_bump_cache')
+def app_entry_changed(sender, instance, raw=False, **kwargs):
+    # 专题合集内嵌应用；计数缓冲的 F() update 不经过这里
+    if not raw:
+        bump_response_cache('app_collections', instance.tenant_id)
+
+@receiver(m2m_changed, sender=AppEntry.tags.through, dispatch_uid='app_entry_tags_bump_cache')
+def app_entry_tags_bump_cache(sender, instance, action, reverse, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        if reverse:
+            bump_response_cache('app_tags')
+        else:
+            bump_response_cache('app_collections', instance.tenant_id)
+
+@receiver([post_save, post_delete], sender=Membership, dispatch_uid='membership_bump_cache')
+def membership_bump_cache(sender, instance, **kwargs):
+    bump_response_cache('memberships', instance.user_id)
+
+@receiver(post_save, sender=Tenant, dispatch_uid='tenant_bump_cache')
+def tenant_bump_cache(sender, instance, created, raw=False, **kwargs):
+    # 成员关系列表内嵌租户信息；删除租户时成员关系级联删除，由上面的信号处理
+    if not created and not raw:
+        for user_id in instance.memberships.values_list('user_id', flat=True):
+            bump_response_cache('memberships', user_id)
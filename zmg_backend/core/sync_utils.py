@@ -0,0 +1,46 @@
+"""
+同步变更日志：记录图标/资源/分类的新增、修改与删除（墓碑）
+"""
+
+from django.conf import settings
+from django.utils import timezone
+from .models import SyncChange, DesktopIcon, Resource, Category
+
+SYNC_KINDS = {
+    DesktopIcon: ('icon', 'user_id'),
+    Resource: ('resource', 'author_id'),
+    Category: ('category', None),
+}
+
+
+def record_changes(model, objects, action='upsert'):
+    """
+    写入变更日志；同一对象的旧记录会被删除，日志大小与对象数量同阶
+    代价：每次保存在同一事务里多一条 DELETE（按 kind, object_id 索引）和一条 INSERT，批量写入时按批合并
+    """
+    kind, owner_attr = SYNC_KINDS[model]
+    entries = [
+        SyncChange(
+            tenant_id=obj.tenant_id,
+            user_id=getattr(obj, owner_attr) if owner_attr else None,
+            kind=kind,
+            object_id=obj.pk,
+            action=action,
+        )
+        for obj in objects
+        if obj.tenant_id and obj.pk
+    ]
+    if not entries:
+        return
+    SyncChange.objects.filter(kind=kind, object_id__in=[e.object_id for e in entries]).delete()
+    SyncChange.objects.bulk_create(entries)
+
+
+def settled_changes(queryset):
+    """
+    去掉最近 SYNC_PULL_HOLDBACK_SECONDS 秒内写入的变更，留到下次拉取
+    自增 id 在插入时分配、提交后才可见，并发事务可能不按 id 顺序提交（PostgreSQL 上常见）：
+    游标一旦越过还没提交的小 id，这条变更就再也拉不到。暂缓最近的变更后，耗时短于该窗口的事务不会被跳过
+    """
+    cutoff = timezone.now() - timezone.timedelta(seconds=settings.SYNC_PULL_HOLDBACK_SECONDS)
+    return queryset.filter(created_at__lte=cutoff)
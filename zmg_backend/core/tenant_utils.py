@@ -1,40 +1,94 @@
+from django.conf import settings
 from django.utils.dateparse import parse_datetime
-from .models import Membership
+from .cache_utils import TTLCache
+from .models import Membership, Tenant
 
-def get_current_membership(request):
-    if not request.user or not request.user.is_authenticated:
-        return None
-
-    tenant_id = (
-        request.headers.get('X-Tenant-Id') or
-        request.query_params.get('tenant_id') or
-        request.data.get('tenant_id')
-    )
+# (user_id, 请求中的租户标识) -> (Membership 字段值, Tenant 字段值)
+# 只缓存不可变的字段值，每个请求重建自己的实例，调用方修改实例不会串到其他请求/线程；
+# Membership/Tenant 变更时由 signals 失效本进程，其他 worker 最迟 TENANT_CACHE_TTL 秒后看到（含撤销成员）
+_membership_cache = TTLCache(
+    maxsize=getattr(settings, 'TENANT_CACHE_SIZE', 2048),
+    ttl=getattr(settings, 'TENANT_CACHE_TTL', 30),
+)
+_UNSET = object()
 
+def _resolve_membership(user, tenant_id):
     if tenant_id:
         membership = Membership.objects.select_related('tenant').filter(
-            user=request.user,
+            user=user,
             tenant_id=tenant_id
         ).first()
         if membership:
             return membership
 
     membership = Membership.objects.select_related('tenant').filter(
-        user=request.user,
+        user=user,
         is_default=True
     ).first()
 
     if not membership:
         membership = Membership.objects.select_related('tenant').filter(
-            user=request.user
+            user=user
         ).first()
 
     return membership
 
+def _field_values(obj):
+    return tuple(getattr(obj, field.attname) for field in obj._meta.concrete_fields)
+
+def _from_values(model, values):
+    return model.from_db('default', [field.attname for field in model._meta.concrete_fields], values)
+
+def _freeze(membership):
+    if membership is None:
+        return None
+    return _field_values(membership), _field_values(membership.tenant)
+
+def _thaw(frozen):
+    if frozen is None:
+        return None
+    membership_values, tenant_values = frozen
+    membership = _from_values(Membership, membership_values)
+    membership.tenant = _from_values(Tenant, tenant_values)
+    return membership
+
+def get_current_membership(request):
+    if not request.user or not request.user.is_authenticated:
+        return None
+
+    # 同一请求内只解析一次（DRF Request 与底层 HttpRequest 共用）
+    raw_request = getattr(request, '_request', request)
+    membership = getattr(raw_request, '_current_membership', _UNSET)
+    if membership is not _UNSET:
+        return membership
+
+    tenant_id = (
+        request.headers.get('X-Tenant-Id') or
+        request.query_params.get('tenant_id') or
+        request.data.get('tenant_id')
+    )
+
+    key = (request.user.pk, str(tenant_id or ''))
+    frozen = _membership_cache.get(key, _UNSET)
+    if frozen is _UNSET:
+        membership = _resolve_membership(request.user, tenant_id)
+        _membership_cache.set(key, _freeze(membership))
+    else:
+        membership = _thaw(frozen)
+
+    raw_request._current_membership = membership
+    return membership
+
 def get_current_tenant(request):
     membership = get_current_membership(request)
     return membership.tenant if membership else None
 
+def invalidate_membership_cache(user_id=None):
+    if user_id is None:
+        _membership_cache.clear()
+    else:
+        _membership_cache.discard_where(lambda key: key[0] == user_id)
+
 def parse_client_datetime(value):
     if not value:
         return None
@@ -1,8 +1,46 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from unittest import mock
+import tempfile
+import time
+import urllib.parse
+import zipfile
+from io import BytesIO, StringIO
+from django.core.management import call_command
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import DatabaseError, connection, transaction
 from django.contrib.contenttypes.models import ContentType
-from rest_framework.test import APIClient
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+from django.core.files.base import ContentFile
 from django.utils import timezone
-from .models import User, Tenant, Membership, Category, DesktopIcon, SyncPreference
+from django.db.models import F
+from django.conf import settings
+from django.core.cache import cache
+from .models import (
+    User, Tenant, Membership, Category, DesktopIcon, SyncPreference, Resource, AppEntry, AppTag,
+    SearchIndexQueue, AiTagJob, UploadSession, Blob, AppLike, AppView, AppViewDaily, AppViewHourly,
+    AppCollection, AppCollectionItem, AppComment, SyncChange
+)
+from .serializers import DesktopIconSerializer
+from .tenant_utils import get_current_membership, invalidate_membership_cache
+from .search_utils import search as search_index, process_dirty
+from .tokenizer import tokenize, load_dictionary
+from .ai_jobs import run_batch, enqueue_ai_tagging
+from .ai_utils import save_ai_results
+from .counters import flush as flush_counters
+from .upload_utils import purge_stale_sessions
+from .media_utils import serve_file
+from .response_cache import settling
+from .proxy_utils import cached_fetch_json, clear_cache as clear_proxy_cache, stats as proxy_cache_stats
+from .embeddings import BruteForceIndex, IVFIndex, embed_resources, clear_index_cache, get_tenant_index, normalize_rows
 
 class TenantSyncTests(TestCase):
     def setUp(self):
@@ -72,4 +110,1385 @@ class TenantSyncTests(TestCase):
         self.assertEqual(res.status_code, 200)
         icon.refresh_from_db()
         self.assertEqual(icon.x, 10)
-        self.assertEqual(icon.y, 10)
\ No newline at end of file
+        self.assertEqual(icon.y, 10)
+
+    def test_sync_push_bulk_update(self):
+        cat = Category.objects.create(name='C1', tenant=self.tenant1)
+        ct = ContentType.objects.get_for_model(Category)
+        icons = [
+            DesktopIcon.objects.create(
+                user=self.user, tenant=self.tenant1, title=f'I{i}',
+                content_type=ct, object_id=cat.id, x=0, y=0
+            )
+            for i in range(5)
+        ]
+        other = DesktopIcon.objects.create(user=self.user2, tenant=self.tenant2, title='O', x=0, y=0)
+        stale = (icons[0].updated_at - timezone.timedelta(days=1)).isoformat()
+
+        self.client.force_authenticate(user=self.user)
+        payload = {
+            'conflict_strategy': 'server_wins',
+            'icons': [{'id': icon.id, 'x': 100} for icon in icons[1:]] + [
+                {'id': icons[0].id, 'x': 50, 'updated_at': stale},
+                {'id': other.id, 'x': 50},
+            ]
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post('/api/sync/push/', payload, format='json')
+        self.assertEqual(res.status_code, 200)
+        icon_queries = [q for q in ctx.captured_queries if 'core_desktopicon' in q['sql']]
+        self.assertEqual(len(icon_queries), 2)
+        # 读取时给图标行加锁（SQLite 不支持行锁，整库写锁已经串行）
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', icon_queries[0]['sql'])
+
+        data = res.data['data']
+        self.assertEqual(data['updated'], 4)
+        self.assertEqual([c['id'] for c in data['conflicts']], [icons[0].id])
+        self.assertEqual(data['missing'], [other.id])
+        self.assertEqual(
+            sorted(DesktopIcon.objects.filter(user=self.user).values_list('x', flat=True)),
+            [0, 100, 100, 100, 100]
+        )
+        other.refresh_from_db()
+        self.assertEqual(other.x, 0)
+
+    @override_settings(SYNC_PULL_HOLDBACK_SECONDS=0)
+    def test_sync_pull_cursor_pages_and_tombstones(self):
+        cats = [Category.objects.create(name=f'C{i}', tenant=self.tenant1) for i in range(3)]
+        Category.objects.create(name='Other', tenant=self.tenant2)
+        self.client.force_authenticate(user=self.user)
+
+        res = self.client.post('/api/sync/pull/', {'limit': 2}, format='json')
+        data = res.data['data']
+        self.assertTrue(data['has_more'])
+        self.assertEqual([c['name'] for c in data['categories']], ['C0', 'C1'])
+
+        res = self.client.post('/api/sync/pull/', {'cursor': data['cursor'], 'limit': 2}, format='json')
+        data = res.data['data']
+        self.assertFalse(data['has_more'])
+        self.assertEqual([c['name'] for c in data['categories']], ['C2'])
+
+        cursor = data['cursor']
+        cats[0].name = 'C0-renamed'
+        cats[0].save()
+        deleted_id = cats[1].id
+        cats[1].delete()
+        res = self.client.post('/api/sync/pull/', {'cursor': cursor}, format='json')
+        data = res.data['data']
+        self.assertEqual([c['name'] for c in data['categories']], ['C0-renamed'])
+        self.assertEqual(data['tombstones'], [{'kind': 'category', 'id': deleted_id}])
+
+        res = self.client.post('/api/sync/pull/', {'cursor': data['cursor']}, format='json')
+        self.assertEqual(res.data['data']['categories'], [])
+        self.assertEqual(res.data['data']['tombstones'], [])
+
+    @override_settings(SYNC_PULL_HOLDBACK_SECONDS=0)
+    def test_sync_pull_ndjson_stream(self):
+        cat = Category.objects.create(name='C1', tenant=self.tenant1)
+        DesktopIcon.objects.create(user=self.user, tenant=self.tenant1, title='I1', content_object=cat)
+        DesktopIcon.objects.create(user=self.user2, tenant=self.tenant2, title='I2')
+        self.client.force_authenticate(user=self.user)
+
+        res = self.client.post('/api/sync/pull/', {}, format='json', HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        self.assertTrue(res['Content-Type'].startswith('application/x-ndjson'))
+        lines = [json.loads(line) for line in b''.join(res.streaming_content).decode().splitlines()]
+        self.assertEqual([line['type'] for line in lines], ['category', 'icon', 'end'])
+        self.assertEqual(lines[1]['data']['title'], 'I1')
+
+        res = self.client.post('/api/sync/pull/', {'cursor': lines[-1]['cursor']}, format='json')
+        self.assertEqual(res.data['data']['icons'], [])
+
+    def test_sync_pull_holds_back_recent_changes(self):
+        Category.objects.create(name='C1', tenant=self.tenant1)
+        self.client.force_authenticate(user=self.user)
+        data = self.client.post('/api/sync/pull/', {}, format='json').data['data']
+        self.assertEqual((data['categories'], data['cursor']), ([], 0))
+
+        SyncChange.objects.update(created_at=timezone.now() - timezone.timedelta(seconds=10))
+        data = self.client.post('/api/sync/pull/', {}, format='json').data['data']
+        self.assertEqual([c['name'] for c in data['categories']], ['C1'])
+
+class DesktopListingQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='u1', password='pass123')
+        self.tenant = Tenant.objects.create(name='T1', slug='t1', owner=self.user)
+        Membership.objects.create(user=self.user, tenant=self.tenant, role='owner', is_default=True)
+        self.client.force_authenticate(user=self.user)
+        # 预热租户缓存，保证各次统计口径一致
+        self.client.get('/api/desktop/')
+
+    def add_resource_icons(self, count):
+        for i in range(count):
+            res = Resource.objects.create(
+                title=f'R{i}', author=self.user, tenant=self.tenant,
+                kind='link', link='https://example.com'
+            )
+            DesktopIcon.objects.create(user=self.user, tenant=self.tenant, title=res.title, content_object=res)
+
+    def list_query_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get('/api/desktop/', {'parent_id': 'root'})
+        self.assertEqual(res.status_code, 200)
+        return len(ctx.captured_queries), res
+
+    def test_listing_query_count_is_constant(self):
+        self.add_resource_icons(2)
+        small, _ = self.list_query_count()
+        self.add_resource_icons(10)
+        large, res = self.list_query_count()
+        self.assertEqual(small, large)
+        self.assertEqual(res.data['count'], 12)
+
+    def add_folder_icons(self, count, children=5):
+        for i in range(count):
+            cat = Category.objects.create(name=f'F{i}', tenant=self.tenant)
+            DesktopIcon.objects.create(user=self.user, tenant=self.tenant, title=cat.name, content_object=cat)
+            for j in range(children):
+                res = Resource.objects.create(
+                    title=f'F{i}-{j}', author=self.user, tenant=self.tenant,
+                    kind='image', cover=f'covers/{i}-{j}.png' if j % 2 else None
+                )
+                DesktopIcon.objects.create(
+                    user=self.user, tenant=self.tenant, title=res.title,
+                    content_object=res, parent_folder=cat
+                )
+
+    def test_folder_preview_query_count_is_constant(self):
+        self.add_folder_icons(1)
+        small, _ = self.list_query_count()
+        self.add_folder_icons(6)
+        large, res = self.list_query_count()
+        self.assertEqual(small, large)
+        self.assertEqual(len(res.data['results']), 7)
+
+    def test_listing_matches_single_serialization(self):
+        self.add_resource_icons(3)
+        self.add_folder_icons(2)
+        _, res = self.list_query_count()
+        expected = [
+            DesktopIconSerializer(icon).data
+            for icon in DesktopIcon.objects.filter(parent_folder__isnull=True)
+        ]
+        self.assertEqual(res.data['results'], expected)
+
+    def test_unchanged_listing_returns_304(self):
+        self.add_resource_icons(2)
+        self.add_folder_icons(1, children=2)
+        path = '/api/desktop/?parent_id=root'
+        etag = self.client.get(path)['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertEqual(self.client.get('/api/desktop/?parent_id=recent', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # 文件夹预览里的资源生成了缩略图：图标本身没变，版本戳也要变
+        child = DesktopIcon.objects.filter(parent_folder__isnull=False).first()
+        Resource.objects.filter(pk=child.object_id).update(
+            thumbnails={'small': 'x.small.webp'}, updated_at=timezone.now()
+        )
+        res = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        etag = res['ETag']
+
+        icon = DesktopIcon.objects.filter(parent_folder__isnull=True, object_id__isnull=False).first()
+        self.client.patch(f'/api/desktop/{icon.id}/move/', {'x': 10}, format='json')
+        res = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        etag = res['ETag']
+
+        # 删除不是最新修改的资源：图标还在，最新修改时间也没变
+        oldest = Resource.objects.filter(
+            id__in=DesktopIcon.objects.filter(parent_folder__isnull=True).values('object_id')
+        ).order_by('updated_at').first()
+        Resource.objects.filter(pk=oldest.pk).delete()
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+class MembershipCacheTests(TestCase):
+    def setUp(self):
+        invalidate_membership_cache()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='u1', password='pass123')
+        self.tenant1 = Tenant.objects.create(name='T1', slug='t1', owner=self.user)
+        self.tenant2 = Tenant.objects.create(name='T2', slug='t2', owner=self.user)
+        Membership.objects.create(user=self.user, tenant=self.tenant1, role='owner', is_default=True)
+        self.client.force_authenticate(user=self.user)
+
+    def membership_queries(self, path, **extra):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(path, **extra)
+        self.assertEqual(res.status_code, 200)
+        return [q for q in ctx.captured_queries if 'core_membership' in q['sql']]
+
+    def test_warm_cache_skips_membership_queries(self):
+        self.assertTrue(self.membership_queries('/api/apps/'))
+        self.assertEqual(self.membership_queries('/api/apps/'), [])
+        self.assertEqual(self.membership_queries('/api/resources/'), [])
+
+    def test_membership_change_invalidates_cache(self):
+        self.membership_queries('/api/categories/', HTTP_X_TENANT_ID=str(self.tenant2.id))
+        Category.objects.create(name='C2', tenant=self.tenant2)
+        res = self.client.get('/api/categories/', HTTP_X_TENANT_ID=str(self.tenant2.id))
+        self.assertEqual(res.data['count'], 0)
+
+        Membership.objects.create(user=self.user, tenant=self.tenant2, role='member')
+        res = self.client.get('/api/categories/', HTTP_X_TENANT_ID=str(self.tenant2.id))
+        self.assertEqual(res.data['count'], 1)
+
+    def test_cached_membership_is_not_shared_between_requests(self):
+        def current_membership():
+            request = Request(APIRequestFactory().get('/api/apps/'))
+            request.user = self.user
+            return get_current_membership(request)
+
+        first = current_membership()
+        first.role = 'member'
+        first.tenant.name = '改过'
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = current_membership()
+        self.assertEqual(ctx.captured_queries, [])
+        self.assertIsNot(second, first)
+        self.assertEqual((second.role, second.tenant.name, second.tenant_id), ('owner', 'T1', self.tenant1.id))
+        self.assertFalse(second._state.adding)
+
+class SearchTests(TestCase):
+    def setUp(self):
+        invalidate_membership_cache()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='u1', password='pass123')
+        self.tenant = Tenant.objects.create(name='T1', slug='t1', owner=self.user)
+        self.other_tenant = Tenant.objects.create(name='T2', slug='t2', owner=self.user)
+        Membership.objects.create(user=self.user, tenant=self.tenant, role='member', is_default=True)
+        self.client.force_authenticate(user=self.user)
+
+    def create_app(self, title, summary='', tenant=None, status='approved'):
+        return AppEntry.objects.create(
+            title=title, summary=summary, link='https://example.com',
+            author=self.user, tenant=tenant or self.tenant, status=status
+        )
+
+    def test_app_search_ranks_by_relevance(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            weak = self.create_app('数学练习', '包含一点物理知识')
+            strong = self.create_app('物理实验', '经典物理力学演示')
+            self.create_app('英语听力')
+            self.create_app('物理实验', tenant=self.other_tenant)
+            self.create_app('物理草稿', status='pending')
+
+        res = self.client.get('/api/apps/', {'search': '物理'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([a['id'] for a in res.data['results']], [strong.id, weak.id])
+
+    def test_short_and_prefix_queries_match(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            app = self.create_app('物理实验', 'physics demo')
+        for query in ('物', '理实', 'phys'):
+            res = self.client.get('/api/apps/', {'search': query})
+            self.assertEqual([a['id'] for a in res.data['results']], [app.id], query)
+
+    @override_settings(SEARCH_MAX_RESULTS=2)
+    def test_hidden_hits_do_not_crowd_out_visible_ones(self):
+        other = User.objects.create_user(username='u2', password='pass123')
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                AppEntry.objects.create(
+                    title='光学 光学 光学', link='https://example.com', author=other,
+                    tenant=self.tenant, status='pending'
+                )
+            visible = self.create_app('光学实验')
+        res = self.client.get('/api/search/', {'q': '光学'})
+        self.assertEqual([item['id'] for item in res.data['data']], [visible.id])
+
+    def test_api_search_returns_scores(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            app = self.create_app('Physics Lab', 'gravity demo')
+            Resource.objects.create(title='gravity notes', author=self.user, tenant=self.tenant, kind='doc')
+        res = self.client.get('/api/search/', {'q': 'gravity'})
+        self.assertEqual(res.status_code, 200)
+        data = res.data['data']
+        self.assertEqual({item['type'] for item in data}, {'app', 'resource'})
+        self.assertTrue(all(item['relevance'] > 0 for item in data))
+        self.assertIn(app.id, [item['id'] for item in data if item['type'] == 'app'])
+
+    def test_tag_changes_reindex_incrementally(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post('/api/apps/', {
+                'title': 'Lab', 'link': 'https://example.com', 'tag_names': ['optics']
+            }, format='json')
+        self.assertEqual(res.status_code, 201)
+        app = AppEntry.objects.get(id=res.data['id'])
+        self.assertEqual(app.search_text, 'Lab  optics')
+        self.assertEqual(SearchIndexQueue.objects.count(), 0)
+        self.assertEqual([i for i, _ in search_index(self.tenant, 'app', 'optics')], [app.id])
+
+        # 全局标签改名只入队，提交时不在请求里重建
+        tag = AppTag.objects.get(name='optics')
+        tag.name = 'lasers'
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.save()
+        self.assertEqual(SearchIndexQueue.objects.count(), 1)
+        self.assertEqual(process_dirty(), 1)
+        app.refresh_from_db()
+        self.assertEqual(app.search_text, 'Lab  lasers')
+        self.assertEqual([i for i, _ in search_index(self.tenant, 'app', 'lasers')], [app.id])
+        self.assertEqual(search_index(self.tenant, 'app', 'optics'), [])
+
+    def test_commit_indexes_only_its_own_objects(self):
+        backlog = SearchIndexQueue.objects.create(kind='resource', object_id=12345)
+        with self.captureOnCommitCallbacks(execute=True):
+            app = self.create_app('Optics')
+        self.assertEqual(list(SearchIndexQueue.objects.values_list('id', flat=True)), [backlog.id])
+        self.assertEqual([i for i, _ in search_index(self.tenant, 'app', 'optics')], [app.id])
+
+    @override_settings(SEARCH_INLINE_INDEX_LIMIT=1)
+    def test_large_marks_are_left_to_the_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            apps = [self.create_app('Optics'), self.create_app('Lasers')]
+        with self.captureOnCommitCallbacks(execute=True):
+            AppTag.objects.create(name='physics').apps.add(*apps)
+        self.assertEqual(SearchIndexQueue.objects.count(), 2)
+        out = StringIO()
+        call_command('build_search_index', pending=True, stdout=out)
+        self.assertIn('Rows: 2', out.getvalue())
+        self.assertEqual(SearchIndexQueue.objects.count(), 0)
+        self.assertEqual(len(search_index(self.tenant, 'app', 'physics')), 2)
+
+    def test_build_search_index_since(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            app = self.create_app('Gravity')
+        AppEntry.objects.filter(id=app.id).update(search_text='stale')
+        out = StringIO()
+        call_command('build_search_index', kind='app', since='2000-01-01', stdout=out)
+        self.assertIn('rows/s', out.getvalue())
+        app.refresh_from_db()
+        self.assertEqual(app.search_text, 'Gravity')
+
+    def test_suggest_completes_prefix(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_app('物理实验', '光学实验')
+            self.create_app('实验记录')
+            self.create_app('实习笔记', status='pending')
+        res = self.client.get('/api/apps/suggest/', {'q': '物理实'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data[0], {'text': '物理实验', 'count': 2})
+        self.assertNotIn('物理实习', [item['text'] for item in res.data])
+
+    def test_tokenizer_dictionary_segmentation(self):
+        self.assertEqual(tokenize('物理ABC'), ['物理', 'abc'])
+        with override_settings(SEARCH_DICT_PATH=self.write_dictionary(['牛顿定律'])):
+            load_dictionary.cache_clear()
+            try:
+                self.assertIn('牛顿定律', tokenize('牛顿定律演示'))
+            finally:
+                load_dictionary.cache_clear()
+        self.assertNotIn('牛顿定律', tokenize('牛顿定律演示'))
+
+    def write_dictionary(self, words):
+        handle = tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8')
+        handle.write('\n'.join(words))
+        handle.close()
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+@override_settings(AI_SIMULATED_LATENCY=0, AI_JOB_RETRY_DELAY=0)
+class AiTaggingQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u1', password='pass123')
+        self.tenant = Tenant.objects.create(name='T1', slug='t1', owner=self.user)
+
+    def create_resource(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Resource.objects.create(title=title, author=self.user, tenant=self.tenant, kind='doc')
+
+    def test_new_resource_is_tagged_in_background(self):
+        res = self.create_resource('物理公式')
+        self.assertEqual(res.ai_tags, '')
+        self.assertEqual(AiTagJob.objects.get(resource=res).status, 'pending')
+
+        self.assertEqual(run_batch(), (1, 0))
+        res.refresh_from_db()
+        self.assertEqual(res.ai_tags, '#物理,#公式推导')
+        self.assertEqual(AiTagJob.objects.get(resource=res).status, 'done')
+
+        # 文本未变化时重复入队不会再处理
+        enqueue_ai_tagging(res)
+        self.assertEqual(run_batch(), (0, 0))
+
+    def test_failed_batch_is_retried(self):
+        res = self.create_resource('试卷')
+        with mock.patch('core.ai_jobs.analyze_texts_with_ai', side_effect=RuntimeError('boom')):
+            self.assertEqual(run_batch(), (0, 1))
+        job = AiTagJob.objects.get(resource=res)
+        self.assertEqual((job.status, job.attempts, job.last_error), ('pending', 1, 'boom'))
+
+        self.assertEqual(run_batch(), (1, 0))
+        res.refresh_from_db()
+        self.assertEqual(res.ai_tags, '#期末复习')
+
+    def test_edited_text_is_retagged(self):
+        res = self.create_resource('试卷')
+        self.assertEqual(run_batch(), (1, 0))
+
+        res.title = '物理公式'
+        with self.captureOnCommitCallbacks(execute=True):
+            res.save()
+        self.assertEqual(AiTagJob.objects.get(resource=res).status, 'pending')
+        self.assertEqual(run_batch(), (1, 0))
+        res.refresh_from_db()
+        self.assertEqual(res.ai_tags, '#物理,#公式推导')
+
+    def test_edit_during_batch_requeues_job(self):
+        res = self.create_resource('试卷')
+
+        def edit_then_analyze(texts):
+            Resource.objects.filter(id=res.id).update(title='物理公式')
+            return ['#期末复习' for _ in texts]
+
+        with mock.patch('core.ai_jobs.analyze_texts_with_ai', side_effect=edit_then_analyze):
+            self.assertEqual(run_batch(), (0, 0))
+        self.assertEqual(AiTagJob.objects.get(resource=res).status, 'pending')
+        self.assertEqual(run_batch(), (1, 0))
+        res.refresh_from_db()
+        self.assertEqual(res.ai_tags, '#物理,#公式推导')
+
+    def test_missing_results_are_retried(self):
+        self.create_resource('试卷')
+        self.create_resource('物理公式')
+        with mock.patch('core.ai_jobs.analyze_texts_with_ai', return_value=['#期末复习']):
+            self.assertEqual(run_batch(), (1, 1))
+        statuses = dict(AiTagJob.objects.values_list('resource_id', 'status'))
+        self.assertEqual(sorted(statuses.values()), ['done', 'pending'])
+        self.assertEqual(run_batch(), (1, 0))
+        self.assertEqual(set(AiTagJob.objects.values_list('status', flat=True)), {'done'})
+
+
+class RelatedResourceTests(TestCase):
+    def setUp(self):
+        clear_index_cache()
+        invalidate_membership_cache()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='u1', password='pass123')
+        self.tenant = Tenant.objects.create(name='T1', slug='t1', owner=self.user)
+        self.other_tenant = Tenant.objects.create(name='T2', slug='t2', owner=self.user)
+        Membership.objects.create(user=self.user, tenant=self.tenant, role='owner', is_default=True)
+        self.client.force_authenticate(user=self.user)
+
+    def create_resource(self, title, description='', tenant=None):
+        return Resource.objects.create(
+            title=title, description=description, author=self.user,
+            tenant=tenant or self.tenant, kind='link', link='https://example.com'
+        )
+
+    def test_related_ranks_by_similarity(self):
+        base = self.create_resource('牛顿力学', '经典力学公式推导')
+        close = self.create_resource('力学公式', '牛顿定律推导练习')
+        far = self.create_resource('英语听力', '期末听力材料')
+        self.create_resource('牛顿力学', '经典力学公式推导', tenant=self.other_tenant)
+        self.assertEqual(embed_resources(Resource.objects.all()), 4)
+
+        res = self.client.get(f'/api/resources/{base.id}/related/', {'k': 5})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([item['id'] for item in res.data], [close.id, far.id])
+        self.assertGreater(res.data[0]['similarity'], res.data[1]['similarity'])
+
+    @override_settings(EMBEDDING_INDEX_CHECK_INTERVAL=0)
+    def test_reembed_rebuilds_index_off_the_request_path(self):
+        base = self.create_resource('牛顿力学')
+        embed_resources([base])
+        index = get_tenant_index(self.tenant.id)
+        before = Resource.objects.get(pk=base.pk).updated_at
+        embed_resources(Resource.objects.filter(pk=base.pk))
+        self.assertGreater(Resource.objects.get(pk=base.pk).updated_at, before)
+        # 版本戳变化：继续返回旧索引，重建交给后台
+        with mock.patch('core.embeddings._rebuild_in_background') as rebuild:
+            self.assertIs(get_tenant_index(self.tenant.id), index)
+        rebuild.assert_called_once()
+
+    def test_ai_results_store_real_vector(self):
+        res = self.create_resource('物理公式')
+        save_ai_results(res, '#物理,#公式推导')
+        res.refresh_from_db()
+        self.assertEqual(len(bytes(res.embedding)), settings.EMBEDDING_DIM * 4)
+        self.assertIn('物理公式', res.embedding_text)
+
+    def test_ivf_matches_exact_search(self):
+        rng = np.random.default_rng(0)
+        centers = normalize_rows(rng.standard_normal((20, 32)).astype(np.float32))
+        matrix = normalize_rows(centers[rng.integers(0, 20, 2000)] + rng.standard_normal((2000, 32)).astype(np.float32) * 0.05)
+        ids = np.arange(1, 2001)
+        exact, ivf = BruteForceIndex(ids, matrix), IVFIndex(ids, matrix, nprobe=4)
+        for row in range(0, 2000, 200):
+            expected = exact.search(matrix[row], k=5, exclude={row + 1})
+            self.assertEqual(ivf.search(matrix[row], k=5, exclude={row + 1})[0][0], expected[0][0])
+        # 指定候选集时精确检索
+        expected = sorted([3, 7, 9], key=lambda i: -float(matrix[i - 1] @ matrix[0]))
+        self.assertEqual([i for i, _ in ivf.search(matrix[0], k=5, candidates=[3, 7, 9])], expected)
+
+
+class MediaRootMixin:
+    """每个测试使用独立的临时 MEDIA_ROOT（含上传临时目录），结束后删除；media_settings 为额外覆盖的配置"""
+    media_settings = {}
+
+    def setUp(self):
+        super().setUp()
+        invalidate_membership_cache()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(
+            MEDIA_ROOT=self.media_root, UPLOAD_TEMP_DIR=os.path.join(self.media_root, 'uploads_tmp'),
+            **self.media_settings
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+
+class ChunkedUploadTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='u1', password='pass123')
+        self.tenant = Tenant.objects.create(name='T1', slug='t1', owner=self.user)
+        Membership.objects.create(user=self.user, tenant=self.tenant, role='owner', is_default=True)
+        self.client.force_authenticate(user=self.user)
+
+    def put_chunk(self, upload_id, offset, data, checksum=None):
+        return self.client.post('/api/desktop/upload_chunk/', {
+            'upload_id': upload_id, 'offset': offset,
+            'checksum': checksum or hashlib.sha256(data).hexdigest(),
+            'chunk': SimpleUploadedFile('blob', data),
+        }, format='multipart')
+
+    def test_chunked_upload_resumes_and_assembles_resource(self):
+        payload = b'0123456789abcdef'
+        res = self.client.post('/api/desktop/upload_init/', {'filename': 'lesson.mp4', 'size': len(payload), 'x': 10, 'y': 20}, format='json')
+        self.assertEqual(res.status_code, 201)
+        upload_id = res.data['upload_id']
+
+        self.assertEqual(self.put_chunk(upload_id, 0, payload[:6]).data['received'], 6)
+        # 重发已确认的分片（客户端超时重试）不影响进度
+        self.assertEqual(self.put_chunk(upload_id, 0, payload[:6]).data['received'], 6)
+        # 校验失败、跳跃偏移都被拒绝
+        self.assertEqual(self.put_chunk(upload_id, 6, payload[6:12], checksum='0' * 64).status_code, 400)
+        # 校验失败的分片不写入临时文件
+        part, = os.listdir(os.path.join(self.media_root, 'uploads_tmp'))
+        with open(os.path.join(self.media_root, 'uploads_tmp', part), 'rb') as fh:
+            self.assertEqual(fh.read(), payload[:6])
+        gap = self.put_chunk(upload_id, 10, payload[10:])
+        self.assertEqual((gap.status_code, gap.data['received']), (409, 6))
+        self.assertEqual(self.client.post('/api/desktop/upload_complete/', {'upload_id': upload_id}).status_code, 409)
+
+        self.assertEqual(self.client.get('/api/desktop/upload_status/', {'upload_id': upload_id}).data['received'], 6)
+        self.assertEqual(self.put_chunk(upload_id, 6, payload[6:]).data['received'], len(payload))
+
+        res = self.client.post('/api/desktop/upload_complete/', {'upload_id': upload_id})
+        self.assertEqual(res.status_code, 200)
+        icon = DesktopIcon.objects.get(id=res.data['id'])
+        self.assertEqual((icon.x, icon.y), (10, 20))
+        resource = icon.content_object
+        self.assertEqual(resource.kind, 'video')
+        self.assertTrue(resource.file.name.startswith('blobs/'))
+        self.assertEqual(resource.blob.sha256, hashlib.sha256(payload).hexdigest())
+        with resource.file.open('rb') as fh:
+            self.assertEqual(fh.read(), payload)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads_tmp')), [])
+        self.assertEqual(UploadSession.objects.get(pk=upload_id).resource_id, resource.id)
+
+        # 重复 complete 不会再创建资源
+        self.assertEqual(self.client.post('/api/desktop/upload_complete/', {'upload_id': upload_id}).status_code, 409)
+        self.assertEqual(Resource.objects.count(), 1)
+
+    def test_failed_store_can_retry_complete(self):
+        payload = b'retry me'
+        upload_id = self.client.post('/api/desktop/upload_init/', {'filename': 'a.pdf', 'size': len(payload)}, format='json').data['upload_id']
+        self.put_chunk(upload_id, 0, payload)
+
+        with mock.patch.object(Blob.objects, 'create', side_effect=DatabaseError('disk full')):
+            res = self.client.post('/api/desktop/upload_complete/', {'upload_id': upload_id})
+        self.assertEqual(res.status_code, 500)
+        self.assertEqual(UploadSession.objects.get(pk=upload_id).status, 'uploading')
+        self.assertEqual(Blob.objects.count(), 0)
+
+        res = self.client.post('/api/desktop/upload_complete/', {'upload_id': upload_id})
+        self.assertEqual(res.status_code, 200)
+        with DesktopIcon.objects.get(id=res.data['id']).content_object.file.open('rb') as fh:
+            self.assertEqual(fh.read(), payload)
+
+    def test_upload_session_is_private(self):
+        res = self.client.post('/api/desktop/upload_init/', {'filename': 'a.pdf', 'size': 3}, format='json')
+        other = User.objects.create_user(username='u2', password='pass123')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.put_chunk(res.data['upload_id'], 0, b'abc').status_code, 404)
+
+
+class BlobStorageTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def join_tenant(self, username):
+        user = User.objects.create_user(username=username, password='pass123')
+        tenant = Tenant.objects.create(name=username, slug=username, owner=user)
+        Membership.objects.create(user=user, tenant=tenant, role='owner', is_default=True)
+        return user
+
+    def upload(self, user, content, name='textbook.pdf'):
+        self.client.force_authenticate(user=user)
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post('/api/desktop/upload_file/', {'file': SimpleUploadedFile(name, content)}, format='multipart')
+        self.assertEqual(res.status_code, 200)
+        return res.data['id']
+
+    def test_identical_uploads_share_one_blob(self):
+        users = [self.join_tenant(f'student{i}') for i in range(2)]
+        icon_ids = [self.upload(user, b'%PDF same book') for user in users]
+        self.upload(users[0], b'%PDF other book')
+
+        self.assertEqual(Blob.objects.count(), 2)
+        blob = Blob.objects.get(sha256=hashlib.sha256(b'%PDF same book').hexdigest())
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(set(Resource.objects.filter(blob=blob).values_list('file', flat=True)), {blob.name})
+        path = os.path.join(self.media_root, blob.name)
+        self.assertTrue(os.path.isfile(path))
+
+        for user, icon_id, remaining in zip(users, icon_ids, [1, 0]):
+            self.client.force_authenticate(user=user)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.client.delete(f'/api/desktop/{icon_id}/uninstall/').status_code, 200)
+            if remaining:
+                blob.refresh_from_db()
+                self.assertEqual(blob.ref_count, remaining)
+                self.assertTrue(os.path.isfile(path))
+        self.assertFalse(Blob.objects.filter(pk=blob.pk).exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_rolled_back_upload_leaves_no_blob(self):
+        user = self.join_tenant('teacher')
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Resource.objects.create(title='draft', author=user, file=SimpleUploadedFile('a.pdf', b'%PDF draft'))
+                raise RuntimeError('rollback')
+        self.assertEqual(Blob.objects.count(), 0)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'blobs')))
+
+        stale = timezone.now() + timezone.timedelta(seconds=1)
+        self.assertEqual(purge_stale_sessions(stale), 1)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads_tmp')), [])
+
+    def test_migrate_legacy_files(self):
+        user = self.join_tenant('teacher')
+        os.makedirs(os.path.join(self.media_root, 'resources'))
+        for name in ('a.pdf', 'b.pdf'):
+            with open(os.path.join(self.media_root, 'resources', name), 'wb') as fh:
+                fh.write(b'same')
+            Resource.objects.filter(pk=Resource.objects.create(title=name, author=user).pk).update(file=f'resources/{name}')
+
+        call_command('migrate_blobs', stdout=StringIO())
+        blob = Blob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'resources')), [])
+
+
+class H5AppInstallTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='u1', password='pass123')
+        self.tenant = Tenant.objects.create(name='T1', slug='t1', owner=self.user)
+        Membership.objects.create(user=self.user, tenant=self.tenant, role='owner', is_default=True)
+        self.client.force_authenticate(user=self.user)
+
+    def make_zip(self, members):
+        buf = tempfile.SpooledTemporaryFile()
+        with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for name, data in members.items():
+                zf.writestr(name, data)
+        buf.seek(0)
+        return SimpleUploadedFile('game.zip', buf.read(), content_type='application/zip')
+
+    def install(self, package):
+        return self.client.post('/api/desktop/install_h5_app/', {'file': package, 'title': 'Game'}, format='multipart')
+
+    def test_install_extracts_once_and_uninstall_cleans_up(self):
+        members = {'game/index.html': b'<h1>hi</h1>', 'game/js/main.js': b'console.log(1)'}
+        res = self.install(self.make_zip(members))
+        self.assertEqual(res.status_code, 200)
+        first = Resource.objects.get(id=res.data['data']['data']['id'])
+        self.assertEqual(first.kind, 'link')
+        key = first.blob.sha256
+        self.assertEqual(first.link, f'/media/h5apps/{key}/game/index.html')
+        app_root = os.path.join(self.media_root, 'h5apps', key)
+        with open(os.path.join(app_root, 'game', 'js', 'main.js'), 'rb') as fh:
+            self.assertEqual(fh.read(), b'console.log(1)')
+        with open(os.path.join(self.media_root, 'h5apps', f'{key}.manifest.json'), encoding='utf-8') as fh:
+            manifest = json.load(fh)
+        self.assertEqual(manifest['entry'], 'game/index.html')
+        self.assertEqual({f['path']: f['sha256'] for f in manifest['files']}['game/index.html'],
+                         hashlib.sha256(b'<h1>hi</h1>').hexdigest())
+        # DEBUG=False 时由视图按清单下发，清单外的路径 404
+        self.assertEqual(b''.join(self.client.get(first.link).streaming_content), b'<h1>hi</h1>')
+        self.assertEqual(self.client.get(f'/media/h5apps/{key}/game/missing.js').status_code, 404)
+
+        # 同一个包再次安装：按哈希跳过解压
+        with mock.patch('core.h5_utils._extract') as extract:
+            second = self.install(self.make_zip(members))
+        extract.assert_not_called()
+        self.assertEqual(second.data['data']['data']['link'], first.link)
+
+        for icon_id, gone in ((res.data['data']['id'], False), (second.data['data']['id'], True)):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.delete(f'/api/desktop/{icon_id}/uninstall/')
+            self.assertEqual(os.path.exists(app_root), not gone)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'h5apps')), [])
+
+    def test_rejects_zip_slip_and_bombs(self):
+        res = self.install(self.make_zip({'index.html': b'ok', '../evil.js': b'x'}))
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'evil.js')))
+
+        with self.settings(H5_MAX_TOTAL_SIZE=4096):
+            res = self.install(self.make_zip({'index.html': b'0' * 10000}))
+        self.assertEqual(res.status_code, 400)
+        # 其他异常同样释放已入库的包
+        with mock.patch('core.views.DesktopIcon.objects.create', side_effect=RuntimeError('db down')):
+            self.assertEqual(self.install(self.make_zip({'index.html': b'ok'})).status_code, 500)
+
+        self.assertFalse(Resource.objects.exists())
+        self.assertFalse(Blob.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'h5apps')), [])
+
+
+class MediaDeliveryTests(MediaRootMixin, TestCase):
+    media_settings = {'MEDIA_ACCEL': '', 'THUMBNAIL_WORKERS': 0}
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='u1', password='pass123')
+        self.tenant = Tenant.objects.create(name='T1', slug='t1', owner=self.user)
+        Membership.objects.create(user=self.user, tenant=self.tenant, role='member', is_default=True)
+        self.payload = bytes(range(256)) * 4
+        with self.captureOnCommitCallbacks(execute=True):
+            self.res = Resource.objects.create(
+                title='lecture', author=self.user, tenant=self.tenant,
+                file=ContentFile(self.payload, name='lecture.mp4')
+            )
+        self.url = f'/api/media/resources/{self.res.id}/'
+        self.jwt = str(RefreshToken.for_user(self.user).access_token)
+        self.token = self.media_token(self.res, self.jwt)
+
+    def media_token(self, resource, jwt):
+        res = self.client.post(f'/api/media/resources/{resource.id}/token/', HTTP_AUTHORIZATION=f'Bearer {jwt}')
+        self.assertEqual(res.status_code, 200)
+        url = urllib.parse.urlsplit(res.data['url'])
+        self.assertEqual(url.path, f'/api/media/resources/{resource.id}/')
+        return urllib.parse.parse_qs(url.query)['token'][0]
+
+    def get(self, token=None, **headers):
+        return self.client.get(self.url, {'token': token or self.token}, **headers)
+
+    def test_requires_token_and_access(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.get(token='bad').status_code, 401)
+        # 登录 JWT 不能放在地址里
+        self.assertEqual(self.get(token=self.jwt).status_code, 401)
+        other = User.objects.create_user(username='u2', password='pass123')
+        Membership.objects.create(user=other, tenant=self.tenant, role='member')
+        other_jwt = str(RefreshToken.for_user(other).access_token)
+        res = self.client.post(f'{self.url}token/', HTTP_AUTHORIZATION=f'Bearer {other_jwt}')
+        self.assertEqual(res.status_code, 404)
+
+        res = self.client.get(self.url, HTTP_AUTHORIZATION=f'Bearer {self.jwt}')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], 'video/mp4')
+        self.assertEqual(b''.join(res.streaming_content), self.payload)
+
+    def test_media_token_is_scoped_and_short_lived(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            other_res = Resource.objects.create(
+                title='other', author=self.user, tenant=self.tenant,
+                file=ContentFile(b'other', name='other.mp4')
+            )
+        self.assertEqual(self.client.get(f'/api/media/resources/{other_res.id}/', {'token': self.token}).status_code, 401)
+        with self.settings(MEDIA_TOKEN_MAX_AGE=-1):
+            self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.get().status_code, 200)
+
+    def test_range_and_conditional_requests(self):
+        res = self.get(HTTP_RANGE='bytes=1000-1099')
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(res['Content-Range'], f'bytes 1000-1023/{len(self.payload)}')
+        self.assertEqual(res['Content-Length'], '24')
+        self.assertEqual(b''.join(res.streaming_content), self.payload[1000:])
+
+        res = self.get(HTTP_RANGE='bytes=-16')
+        self.assertEqual(b''.join(res.streaming_content), self.payload[-16:])
+        self.assertEqual(self.get(HTTP_RANGE='bytes=5000-').status_code, 416)
+
+        etag = self.get()['ETag']
+        self.assertEqual(etag, f'"{self.res.blob.sha256}"')
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # If-Range 不匹配时忽略 Range，返回完整文件
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"').status_code, 200)
+
+    @mock.patch('core.media_utils.STREAM_BLOCK_SIZE', 256)
+    def test_asgi_streams_without_buffering(self):
+        request = AsyncRequestFactory().get(self.url, headers={'Range': 'bytes=100-'})
+        res = serve_file(request, self.res.file.path, self.res.file.name, '"etag"')
+        self.assertTrue(res.is_async)
+
+        async def collect():
+            return [part async for part in res]
+        parts = async_to_sync(collect)()
+        self.assertEqual(len(parts), 4)
+        self.assertEqual(b''.join(parts), self.payload[100:])
+
+    def test_front_proxy_offload(self):
+        with self.settings(MEDIA_ACCEL='nginx'):
+            res = self.get(HTTP_RANGE='bytes=0-9')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['X-Accel-Redirect'], f'/protected-media/{self.res.file.name}')
+        self.assertEqual(res.content, b'')
+
+class ThumbnailTests(MediaRootMixin, TestCase):
+    media_settings = {'THUMBNAIL_WORKERS': 0}
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='u1', password='pass123')
+        self.tenant = Tenant.objects.create(name='T1', slug='t1', owner=self.user)
+        Membership.objects.create(user=self.user, tenant=self.tenant, role='owner', is_default=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def png(self, size=(1600, 900)):
+        from PIL import Image
+        buf = BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(buf, 'PNG')
+        return buf.getvalue()
+
+    def test_upload_generates_webp_thumbnails(self):
+        from PIL import Image
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post('/api/desktop/upload_file/', {'file': SimpleUploadedFile('photo.png', self.png())}, format='multipart')
+        self.assertEqual(res.status_code, 200)
+        resource = Resource.objects.get(title='photo.png')
+        self.assertEqual(resource.thumbnails['source'], resource.file.name)
+
+        for size, edge in settings.THUMBNAIL_SIZES.items():
+            path = os.path.join(self.media_root, resource.thumbnails[size])
+            self.assertEqual(os.path.dirname(path), os.path.dirname(resource.file.path))
+            with Image.open(path) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertEqual(max(image.size), edge)
+
+        data = self.client.get('/api/desktop/', {'parent_id': 'root'}).data['results'][0]['data']
+        self.assertTrue(data['thumb_small'].endswith('.small.webp'))
+        self.assertEqual(data['cover'], data['thumb_large'])
+        detail = self.client.get(f'/api/resources/{resource.id}/').data
+        self.assertNotIn('embedding', detail)
+        self.assertEqual(detail['thumb_small'], data['thumb_small'])
+
+        # 文件夹预览用小缩略图
+        folder = Category.objects.create(name='Album', tenant=self.tenant)
+        DesktopIcon.objects.create(user=self.user, tenant=self.tenant, title=folder.name, content_object=folder)
+        DesktopIcon.objects.filter(
+            content_type=ContentType.objects.get_for_model(Resource), object_id=resource.id
+        ).update(parent_folder=folder)
+        listing = self.client.get('/api/desktop/', {'parent_id': 'root'}).data['results']
+        self.assertEqual(listing[0]['preview'][0]['cover'], data['thumb_small'])
+
+        paths = [os.path.join(self.media_root, resource.thumbnails[size]) for size in settings.THUMBNAIL_SIZES]
+        with self.captureOnCommitCallbacks(execute=True):
+            resource.delete()
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+
+    def test_unrenderable_files_are_marked_and_rebuilt(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            broken = Resource.objects.create(
+                title='broken', author=self.user, tenant=self.tenant,
+                file=ContentFile(b'not an image', name='broken.jpg')
+            )
+        broken.refresh_from_db()
+        self.assertEqual(broken.thumbnails, {'source': broken.file.name})
+
+        Resource.objects.filter(pk=broken.pk).update(thumbnails={})
+        out = StringIO()
+        call_command('build_thumbnails', stdout=out)
+        self.assertIn('Resources: 1', out.getvalue())
+        broken.refresh_from_db()
+        self.assertEqual(broken.thumbnails, {'source': broken.file.name})
+
+@override_settings(COUNTER_FLUSH_INTERVAL=60, COUNTER_FLUSH_MAX_PENDING=1000, APP_VIEW_DEDUP_WINDOW=0)
+class AppCounterTests(TestCase):
+    def setUp(self):
+        invalidate_membership_cache()
+        cache.clear()
+        patcher = mock.patch('core.counters._start_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(flush_counters)
+
+        self.user = User.objects.create_user(username='u1', password='pass123')
+        self.tenant = Tenant.objects.create(name='T1', slug='t1', owner=self.user)
+        Membership.objects.create(user=self.user, tenant=self.tenant, role='owner', is_default=True)
+        self.app = AppEntry.objects.create(
+            title='Physics Lab', link='https://example.com', author=self.user, tenant=self.tenant, status='approved'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_views_are_buffered_and_flushed_in_bulk(self):
+        url = f'/api/apps/{self.app.id}/view/'
+        counts = [self.client.post(url).data['view_count'] for _ in range(30)]
+        self.assertEqual(counts, list(range(1, 31)))
+        self.app.refresh_from_db()
+        self.assertEqual((self.app.view_count, AppView.objects.count()), (0, 0))
+
+        # 写回的查询数与浏览次数无关
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(flush_counters(), 1)
+        self.assertLessEqual(len(ctx.captured_queries), 15)
+        self.app.refresh_from_db()
+        self.assertEqual((self.app.view_count, AppView.objects.filter(app=self.app).count()), (30, 30))
+        self.assertEqual(self.client.post(url).data['view_count'], 31)
+
+    def test_likes_and_reconcile(self):
+        url = f'/api/apps/{self.app.id}/'
+        self.assertEqual(self.client.post(url + 'like/').data['like_count'], 1)
+        # 重复点赞不重复计数
+        self.assertEqual(self.client.post(url + 'like/').data['like_count'], 1)
+        flush_counters()
+        self.app.refresh_from_db()
+        self.assertEqual(self.app.like_count, 1)
+        self.assertEqual(self.client.delete(url + 'unlike/').data['like_count'], 0)
+        flush_counters()
+        self.app.refresh_from_db()
+        self.assertEqual(self.app.like_count, 0)
+
+        AppLike.objects.create(user=self.user, app=self.app)
+        AppEntry.objects.filter(pk=self.app.pk).update(view_count=42)
+        out = StringIO()
+        call_command('reconcile_app_counters', stdout=out)
+        self.assertIn('Fixed: 1', out.getvalue())
+        self.app.refresh_from_db()
+        self.assertEqual((self.app.view_count, self.app.like_count), (0, 1))
+
+    def test_flush_after_reconcile_does_not_double_count_likes(self):
+        self.client.post(f'/api/apps/{self.app.id}/like/')
+        # 另一个进程的 reconcile 已按 AppLike 修正，本进程的缓冲随后写回
+        AppEntry.objects.filter(pk=self.app.pk).update(like_count=1)
+        flush_counters()
+        self.app.refresh_from_db()
+        self.assertEqual(self.app.like_count, 1)
+
+    def test_flush_errors_do_not_fail_requests(self):
+        url = f'/api/apps/{self.app.id}/view/'
+        with self.settings(COUNTER_FLUSH_MAX_PENDING=1), mock.patch('core.counters._wake') as wake:
+            self.assertEqual(self.client.post(url).status_code, 200)
+        wake.set.assert_called_once()
+        with self.settings(COUNTER_FLUSH_INTERVAL=0), \
+                mock.patch('core.counters._write_views', side_effect=DatabaseError('locked')):
+            self.assertEqual(self.client.post(url).data['view_count'], 2)
+        self.assertEqual(flush_counters(), 1)
+        self.app.refresh_from_db()
+        self.assertEqual(self.app.view_count, 2)
+
+    def test_comment_count_is_maintained_without_aggregation(self):
+        url = f'/api/apps/{self.app.id}/comment/'
+        for text in ('nice', 'great'):
+            self.assertEqual(self.client.post(url, {'content': text}).status_code, 200)
+        self.app.refresh_from_db()
+        self.assertEqual(self.app.comment_count, 2)
+        self.app.comments.first().delete()
+        self.app.refresh_from_db()
+        self.assertEqual(self.app.comment_count, 1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get('/api/apps/', {'tags': 'physics'})
+            mine = self.client.get('/api/apps/mine/')
+        self.assertEqual(mine.data[0]['comment_count'], 1)
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(any('core_appcomment' in q['sql'] for q in ctx.captured_queries))
+
+        AppEntry.objects.filter(pk=self.app.pk).update(comment_count=9)
+        call_command('reconcile_app_counters', stdout=StringIO())
+        self.app.refresh_from_db()
+        self.assertEqual(self.app.comment_count, 1)
+
+    @override_settings(APP_VIEW_DEDUP_WINDOW=1800, APP_VIEW_RAW_RETENTION_DAYS=90, APP_VIEW_HOURLY_RETENTION_DAYS=30)
+    def test_views_are_deduplicated_rolled_up_and_pruned(self):
+        url = f'/api/apps/{self.app.id}/view/'
+        other = User.objects.create_user(username='u2', password='pass123')
+        Membership.objects.create(user=other, tenant=self.tenant, role='member')
+        self.assertEqual([self.client.post(url).data['view_count'] for _ in range(3)], [1, 1, 1])
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.post(url).data['view_count'], 2)
+        flush_counters()
+
+        self.app.refresh_from_db()
+        self.assertEqual(self.app.view_count, 2)
+        self.assertEqual(AppViewHourly.objects.get(app=self.app).views, 2)
+        self.assertEqual(AppViewDaily.objects.get(app=self.app, day=timezone.localdate()).views, 2)
+
+        # 明细过期删除后，计数仍可按天汇总对账
+        old = timezone.now() - timezone.timedelta(days=120)
+        AppView.objects.update(created_at=old)
+        AppViewHourly.objects.update(hour=old)
+        call_command('prune_app_views', stdout=StringIO())
+        self.assertEqual((AppView.objects.count(), AppViewHourly.objects.count()), (0, 0))
+        call_command('reconcile_app_counters', stdout=StringIO())
+        self.app.refresh_from_db()
+        self.assertEqual(self.app.view_count, 2)
+
+        self.client.force_authenticate(user=self.user)
+        res = self.client.get(f'/api/apps/{self.app.id}/stats/', {'days': 7})
+        self.assertEqual(len(res.data['daily']), 7)
+        self.assertEqual(res.data['daily'][-1], {'date': timezone.localdate().isoformat(), 'views': 2})
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(f'/api/apps/{self.app.id}/stats/').status_code, 403)
+
+    def test_review_and_edit_keep_concurrent_counter_updates(self):
+        from .views import AppEntryViewSet
+        get_object = AppEntryViewSet.get_object
+
+        def load_then_concurrent_update(viewset):
+            app = get_object(viewset)
+            # 对象读入内存后，评论信号/计数刷新/排行计算写入了增量
+            AppEntry.objects.filter(pk=app.pk).update(
+                comment_count=F('comment_count') + 1, like_count=F('like_count') + 2, hot_score=F('hot_score') + 5
+            )
+            return app
+
+        with mock.patch.object(AppEntryViewSet, 'get_object', load_then_concurrent_update):
+            self.assertEqual(self.client.post(f'/api/apps/{self.app.id}/reject/', {'reason': '重复'}).status_code, 200)
+            res = self.client.patch(f'/api/apps/{self.app.id}/', {'title': 'Optics Lab', 'like_count': 100}, format='json')
+            self.assertEqual(res.status_code, 200)
+        self.app.refresh_from_db()
+        self.assertEqual((self.app.status, self.app.title), ('rejected', 'Optics Lab'))
+        self.assertEqual((self.app.comment_count, self.app.like_count, self.app.hot_score), (2, 4, 10))
+
+
+class AppRankingTests(TestCase):
+    def setUp(self):
+        invalidate_membership_cache()
+        self.user = User.objects.create_user(username='u1', password='pass123')
+        self.tenant = Tenant.objects.create(name='T1', slug='t1', owner=self.user)
+        Membership.objects.create(user=self.user, tenant=self.tenant, role='owner', is_default=True)
+        self.apps = [
+            AppEntry.objects.create(
+                title=f'App {i}', link='https://example.com', author=self.user, tenant=self.tenant, status='approved'
+            )
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def listing(self, ordering):
+        res = self.client.get('/api/apps/', {'ordering': ordering} if ordering else {})
+        items = res.data['results'] if isinstance(res.data, dict) else res.data
+        return [item['title'] for item in items]
+
+    def test_hot_and_trending_orderings(self):
+        now = timezone.now()
+        old_app, recent_app, _ = self.apps
+        # 很久以前大量浏览 vs 最近少量浏览
+        AppViewDaily.objects.create(app=old_app, day=timezone.localdate(now - timezone.timedelta(days=20)), views=1000)
+        AppViewDaily.objects.create(app=recent_app, day=timezone.localdate(now), views=60)
+        call_command('recompute_app_rankings', stdout=StringIO())
+
+        self.assertEqual(self.listing('hot')[:2], ['App 0', 'App 1'])
+        self.assertEqual(self.listing('trending')[:2], ['App 1', 'App 0'])
+        # 没有排序参数时仍按时间倒序
+        self.assertEqual(self.listing(None), ['App 2', 'App 1', 'App 0'])
+
+    @override_settings(APP_RANK_HOLDBACK_SECONDS=0)
+    def test_incremental_run_only_reads_new_events(self):
+        from .ranking import recompute
+        self.assertEqual(recompute()['mode'], 'full')
+        self.assertEqual(recompute(), {'mode': 'incremental', 'apps': 0, 'events': 0})
+
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        AppViewHourly.objects.create(app=self.apps[2], hour=hour, views=10)
+        AppLike.objects.create(user=self.user, app=self.apps[1])
+        self.assertEqual(recompute(), {'mode': 'incremental', 'apps': 2, 'events': 2})
+        self.assertEqual(self.listing('trending')[:2], ['App 2', 'App 1'])
+
+        # 已计入的浏览不再重复计算，只累加新写回的部分
+        first = AppEntry.objects.get(pk=self.apps[2].pk).trending_score
+        AppViewHourly.objects.filter(app=self.apps[2]).update(views=F('views') + 10)
+        self.assertEqual(recompute()['events'], 1)
+        self.assertAlmostEqual(AppEntry.objects.get(pk=self.apps[2].pk).trending_score, first * 2, places=6)
+        self.assertEqual(recompute()['events'], 0)
+
+    def test_late_committed_events_are_counted_once(self):
+        from .ranking import recompute
+        now = timezone.now()
+        self.assertEqual(recompute(now)['mode'], 'full')
+
+        # 事务晚提交：created_at 早于上次运行
+        like = AppLike.objects.create(user=self.user, app=self.apps[1])
+        AppLike.objects.filter(pk=like.pk).update(created_at=now - timezone.timedelta(minutes=5))
+        # 暂缓期内刚写入的评论留到下次
+        AppComment.objects.create(user=self.user, app=self.apps[0], content='好用')
+        later = timezone.now() + timezone.timedelta(seconds=1)
+        self.assertEqual(recompute(later), {'mode': 'incremental', 'apps': 1, 'events': 1})
+
+        later += timezone.timedelta(seconds=settings.APP_RANK_HOLDBACK_SECONDS)
+        self.assertEqual(recompute(later), {'mode': 'incremental', 'apps': 1, 'events': 1})
+        self.assertEqual(recompute(later)['events'], 0)
+
+
+class GithubProxyTests(TestCase):
+    """异步代理视图：上游用本地 HTTP 服务模拟"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        test = cls
+
+        class Upstream(BaseHTTPRequestHandler):
+            def do_GET(self):
+                test.requests.append((self.path, self.headers.get('If-None-Match')))
+                time.sleep(test.delay)
+                status, payload = test.reply
+                if status == 200 and self.headers.get('If-None-Match') == test.etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('ETag', test.etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        clear_proxy_cache()
+        type(self).requests = []
+        type(self).delay = 0
+        type(self).etag = '"v1"'
+        type(self).reply = (200, {'total_count': 1, 'items': [{
+            'id': 7, 'name': 'webos', 'full_name': 'zmg/webos', 'stargazers_count': 42,
+            'owner': {'login': 'zmg', 'avatar_url': 'https://example.com/a.png'},
+        }]})
+        overrides = override_settings(GITHUB_API_URL=f'http://127.0.0.1:{self.server.server_port}')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = User.objects.create_user(username='u1', password='pass123')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    def test_requires_token(self):
+        self.assertEqual(self.client.get('/api/github/repos/').status_code, 401)
+        self.assertEqual(self.client.post('/api/github/repos/', **self.auth).status_code, 405)
+        self.assertEqual(self.requests, [])
+
+    def test_returns_simplified_items(self):
+        res = self.client.get('/api/github/repos/', {'q': 'webos', 'language': 'python'}, **self.auth)
+        self.assertEqual(res.status_code, 200)
+        data = res.json()
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['items'][0]['full_name'], 'zmg/webos')
+        self.assertEqual(data['items'][0]['owner'], 'zmg')
+        self.assertIn('q=webos+language%3Apython', self.requests[0][0])
+
+    def test_upstream_error_is_502(self):
+        type(self).reply = (403, {'message': 'rate limited'})
+        res = self.client.get('/api/github/repos/', **self.auth)
+        self.assertEqual(res.status_code, 502)
+        self.assertFalse(res.json()['success'])
+
+        with override_settings(GITHUB_API_URL='http://127.0.0.1:1'):
+            self.assertEqual(self.client.get('/api/github/repos/', **self.auth).status_code, 502)
+
+    def test_identical_queries_are_served_from_cache(self):
+        first = self.client.get('/api/github/repos/', {'q': 'webos ', 'language': 'Python'}, **self.auth)
+        second = self.client.get('/api/github/repos/', {'q': ' webos', 'language': 'python'}, **self.auth)
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(proxy_cache_stats()['hit'], 1)
+
+    def test_expired_entry_is_revalidated_with_etag(self):
+        with override_settings(PROXY_CACHE_TTL=0):
+            self.client.get('/api/github/repos/', **self.auth)
+            res = self.client.get('/api/github/repos/', **self.auth)
+        self.assertEqual(res['X-Cache'], 'REVALIDATED')
+        self.assertEqual(res.json()['items'][0]['full_name'], 'zmg/webos')
+        self.assertEqual([etag for _, etag in self.requests], [None, '"v1"'])
+
+        # 上游内容变化（ETag 不同）时取回新结果
+        type(self).etag = '"v2"'
+        type(self).reply = (200, {'total_count': 0, 'items': []})
+        with override_settings(PROXY_CACHE_TTL=0):
+            res = self.client.get('/api/github/repos/', **self.auth)
+        self.assertEqual((res['X-Cache'], res.json()['total']), ('MISS', 0))
+
+    def test_stale_result_is_served_when_upstream_fails(self):
+        self.client.get('/api/github/repos/', **self.auth)
+        type(self).reply = (500, {'message': 'down'})
+        with override_settings(PROXY_CACHE_TTL=0):
+            res = self.client.get('/api/github/repos/', **self.auth)
+        self.assertEqual((res.status_code, res['X-Cache']), (200, 'STALE'))
+        self.assertEqual(res.json()['total'], 1)
+        self.assertEqual(proxy_cache_stats()['stale'], 1)
+
+    def test_concurrent_misses_share_one_upstream_call(self):
+        import asyncio
+        type(self).delay = 0.3
+        url = f'{settings.GITHUB_API_URL}/search/repositories?q=x'
+
+        async def burst():
+            return await asyncio.gather(*[cached_fetch_json(url, {}) for _ in range(5)])
+
+        results = asyncio.run(burst())
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual([cache_status for _, cache_status in results], ['MISS'] * 5)
+        self.assertEqual(proxy_cache_stats()['coalesced'], 4)
+
+
+@override_settings(RESPONSE_CACHE_TTL=300)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        invalidate_membership_cache()
+        cache.clear()
+        self.user = User.objects.create_user(username='u1', password='pass123')
+        self.tenant = Tenant.objects.create(name='T1', slug='t1', owner=self.user)
+        Membership.objects.create(user=self.user, tenant=self.tenant, role='member', is_default=True)
+        Category.objects.create(name='C1', tenant=self.tenant)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def get(self, path, **extra):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(path, **extra)
+        return res, len(ctx.captured_queries)
+
+    def test_list_is_cached_until_tenant_generation_changes(self):
+        other = Tenant.objects.create(name='T2', slug='t2', owner=self.user)
+        first, _ = self.get('/api/categories/')
+        cached, queries = self.get('/api/categories/')
+        self.assertEqual(cached.data, first.data)
+        self.assertEqual(queries, 0)
+
+        Category.objects.create(name='C2', tenant=self.tenant)
+        res, _ = self.get('/api/categories/')
+        self.assertEqual(res.data['count'], 2)
+        self.assertNotEqual(res['ETag'], first['ETag'])
+
+        # 其他租户的变化不影响本租户的缓存
+        Category.objects.create(name='X', tenant=other)
+        self.assertEqual(self.get('/api/categories/')[1], 0)
+
+    def test_matching_etag_returns_304_without_queries(self):
+        etag = self.client.get('/api/app-tags/')['ETag']
+        res, queries = self.get('/api/app-tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(queries, 0)
+
+        AppTag.objects.create(name='工具')
+        res = self.client.get('/api/app-tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([tag['name'] for tag in res.data['results']], ['工具'])
+
+    def test_collections_vary_by_role_and_follow_item_changes(self):
+        featured = AppCollection.objects.create(title='精选', tenant=self.tenant, owner=self.user, is_featured=True)
+        AppCollection.objects.create(title='草稿', tenant=self.tenant, owner=self.user)
+        self.assertEqual(self.client.get('/api/app-collections/').data['count'], 1)
+
+        Membership.objects.filter(user=self.user).update(role='admin')
+        invalidate_membership_cache()
+        self.assertEqual(self.client.get('/api/app-collections/').data['count'], 2)
+
+        app = AppEntry.objects.create(
+            title='App', link='https://example.com', author=self.user, tenant=self.tenant, status='approved'
+        )
+        item = AppCollectionItem.objects.create(collection=featured, app=app, order=1)
+        res = self.client.post(f'/api/app-collections/{featured.id}/reorder/', {'items': [{'id': item.id, 'order': 5}]}, format='json')
+        self.assertEqual(res.status_code, 200)
+        listing = self.client.get('/api/app-collections/').data['results']
+        items = next(c['items'] for c in listing if c['id'] == featured.id)
+        self.assertEqual([(i['app']['title'], i['order']) for i in items], [('App', 5)])
+
+    def test_collection_etag_rolls_over_for_embedded_counts(self):
+        AppCollection.objects.create(title='精选', tenant=self.tenant, owner=self.user, is_featured=True)
+        with mock.patch('core.response_cache.time.time', return_value=1_000_000.0):
+            etag = self.client.get('/api/app-collections/')['ETag']
+            self.assertEqual(self.client.get('/api/app-collections/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with mock.patch('core.response_cache.time.time', return_value=1_000_060.0):
+            self.assertEqual(self.client.get('/api/app-collections/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @override_settings(DATABASE_REPLICAS=['replica0'])
+    def test_committed_change_marks_scope_as_settling(self):
+        scope = [('categories', self.tenant.id)]
+        self.assertFalse(settling(scope))
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='C2', tenant=self.tenant)
+        self.assertTrue(settling(scope))
+        self.assertFalse(settling([('categories', self.tenant.id + 1)]))
+
+    def test_membership_list_follows_tenant_rename(self):
+        self.assertEqual(self.client.get('/api/memberships/').data['results'][0]['tenant']['name'], 'T1')
+        self.tenant.name = 'T1 新名'
+        self.tenant.save()
+        self.assertEqual(self.client.get('/api/memberships/').data['results'][0]['tenant']['name'], 'T1 新名')
+
+
+@override_settings(DATABASE_REPLICAS=['replica0'])
+class ReplicaRoutingTests(TestCase):
+    """只测路由决策，不需要真实副本"""
+    def handle(self, method='get', action='list', **cookies):
+        from django.db import router
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from .db_routers import ReplicaRoutingMiddleware
+
+        seen = {}
+
+        def view(request):
+            seen.update(resource=router.db_for_read(Resource), user=router.db_for_read(User))
+            return HttpResponse()
+        view.actions = {method: action}
+
+        middleware = ReplicaRoutingMiddleware(lambda request: middleware.process_view(request, view, (), {}) or view(request))
+        request = RequestFactory().generic(method.upper(), '/api/resources/')
+        request.COOKIES.update(cookies)
+        response = middleware(request)
+        return seen, response
+
+    def test_list_and_retrieve_read_replica_models_from_replica(self):
+        from django.db import router
+        for action in ('list', 'retrieve'):
+            seen, response = self.handle(action=action)
+            self.assertEqual(seen, {'resource': 'replica0', 'user': 'default'})
+            self.assertNotIn('zmg_db_pin', response.cookies)
+        # 其他 action 和请求之外一律走主库
+        self.assertEqual(self.handle(action='mine')[0]['resource'], 'default')
+        self.assertEqual(router.db_for_read(Resource), 'default')
+        self.assertEqual(router.db_for_write(Resource), 'default')
+
+    def test_writes_pin_the_client_to_primary(self):
+        seen, response = self.handle(method='post', action='create')
+        self.assertEqual(seen['resource'], 'default')
+        self.assertEqual(response.cookies['zmg_db_pin']['max-age'], settings.DATABASE_REPLICA_PIN_SECONDS)
+
+        seen, _ = self.handle(zmg_db_pin='1')
+        self.assertEqual(seen['resource'], 'default')
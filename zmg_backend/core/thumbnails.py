@@ -0,0 +1,167 @@
+"""
+资源缩略图：图片（以及本机有 ffmpeg 时的视频首帧）上传后在进程池中生成多尺寸 WebP，
+与原文件放在一起（<原文件名去扩展名>.<尺寸>.webp），Resource.thumbnails 记录生成结果。
+blob 文件的缩略图随 blob 共享，最后一个引用释放时一并删除
+"""
+
+import logging
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from . import imaging
+from .models import Resource
+from .sync_utils import record_changes
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_KINDS = ('image', 'video')
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _storage():
+    return Resource._meta.get_field('file').storage
+
+
+def thumbnail_name(file_name, size):
+    return f"{os.path.splitext(file_name)[0]}.{size}.webp"
+
+
+def thumbnail_urls(resource):
+    """{'thumb_small': url, 'thumb_large': url, ...}；尚未生成的尺寸为 None"""
+    thumbs = resource.thumbnails or {}
+    storage = _storage()
+    return {
+        f"thumb_{size}": storage.url(thumbs[size]) if thumbs.get(size) else None
+        for size in settings.THUMBNAIL_SIZES
+    }
+
+
+def needs_thumbnails(resource):
+    return (
+        resource.kind in THUMBNAIL_KINDS and bool(resource.file)
+        and (resource.thumbnails or {}).get('source') != resource.file.name
+    )
+
+
+def remove_thumbnails(file_name):
+    storage = _storage()
+    for size in settings.THUMBNAIL_SIZES:
+        storage.delete(thumbnail_name(file_name, size))
+
+
+def _get_pool():
+    """每个进程一个池（gunicorn 预加载后 fork 的 worker 各自重建）；用 spawn 启动，子进程只加载 imaging"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def _task(resource):
+    storage = _storage()
+    targets = {
+        size: (edge, storage.path(thumbnail_name(resource.file.name, size)))
+        for size, edge in settings.THUMBNAIL_SIZES.items()
+    }
+    os.makedirs(os.path.dirname(storage.path(resource.file.name)), exist_ok=True)
+    return resource.kind, storage.path(resource.file.name), targets
+
+
+def _apply(resource_id, source, rendered):
+    """回写结果；只在文件仍是生成时的那个时才写，期间被替换则丢弃"""
+    thumbs = {'source': source}
+    thumbs.update({size: thumbnail_name(source, size) for size in rendered})
+    updated = Resource.objects.filter(pk=resource_id, file=source).update(
+        thumbnails=thumbs, updated_at=timezone.now()
+    )
+    if updated:
+        record_changes(Resource, Resource.objects.filter(pk=resource_id))
+    return bool(updated)
+
+
+def _result(resource_id, future):
+    try:
+        return future.result()
+    except BrokenProcessPool as e:
+        _reset_pool()
+        logger.warning("thumbnail pool broken while rendering resource %s: %s", resource_id, e)
+    except Exception as e:
+        logger.warning("thumbnail for resource %s failed: %s", resource_id, e)
+    return {}
+
+
+def _on_done(resource_id, source, future):
+    # 在池的回调线程里执行：用完即关闭该线程的数据库连接
+    try:
+        _apply(resource_id, source, _result(resource_id, future))
+    except Exception:
+        logger.exception("saving thumbnails for resource %s failed", resource_id)
+    finally:
+        connection.close()
+
+
+def _render_inline(resource):
+    try:
+        rendered = imaging.render(*_task(resource))
+    except Exception as e:
+        logger.warning("thumbnail for resource %s failed: %s", resource.pk, e)
+        rendered = {}
+    return _apply(resource.pk, resource.file.name, rendered)
+
+
+def submit(resource):
+    """提交一个资源的缩略图任务，完成后由回调回写；THUMBNAIL_WORKERS 为 0 时在当前线程同步生成"""
+    if not settings.THUMBNAIL_WORKERS:
+        _render_inline(resource)
+        return
+    future = _get_pool().submit(imaging.render, *_task(resource))
+    future.add_done_callback(lambda f, pk=resource.pk, source=resource.file.name: _on_done(pk, source, f))
+
+
+def schedule_thumbnails(resource_id):
+    """事务提交后调用：重新读取资源，需要时提交任务"""
+    resource = Resource.objects.filter(pk=resource_id).only('id', 'kind', 'file', 'thumbnails').first()
+    if resource and needs_thumbnails(resource):
+        submit(resource)
+
+
+def generate(resources, force=False):
+    """批量生成（build_thumbnails 用），在当前线程等待并回写，返回处理的资源数"""
+    pending = {}
+    count = 0
+    for resource in resources:
+        if resource.kind not in THUMBNAIL_KINDS or not resource.file:
+            continue
+        if not force and not needs_thumbnails(resource):
+            continue
+        if force:
+            remove_thumbnails(resource.file.name)
+        count += 1
+        if not settings.THUMBNAIL_WORKERS:
+            _render_inline(resource)
+            continue
+        future = _get_pool().submit(imaging.render, *_task(resource))
+        pending[future] = (resource.pk, resource.file.name)
+    for future in as_completed(pending):
+        resource_id, source = pending[future]
+        _apply(resource_id, source, _result(resource_id, future))
+    return count
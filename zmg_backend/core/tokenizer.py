@@ -0,0 +1,98 @@
+"""
+中文检索分词：字二元组 + 可选词典切分
+英文/数字按单词切分；中文连续片段切成二元组，配置了词典时再追加词典词（正向最大匹配）。
+建索引时另外加入单字（unigrams=True），单字查询也能命中；多字查询只用二元组，避免单字带来大量噪声
+"""
+
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from django.conf import settings
+
+MAX_TERM_LENGTH = 64
+
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_TOKEN_RE = re.compile(r'[a-z0-9]+|[' + _CJK + r']+')
+_CJK_RE = re.compile(r'[' + _CJK + r']')
+
+
+def normalize(text):
+    """全角转半角、统一小写"""
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def is_cjk(text):
+    return bool(_CJK_RE.match(text))
+
+
+@lru_cache(maxsize=1)
+def load_dictionary():
+    """
+    读取 SEARCH_DICT_PATH 指定的词典（每行一个词，# 开头为注释），未配置时返回空集合
+    """
+    path = getattr(settings, 'SEARCH_DICT_PATH', None)
+    words = set()
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                word = normalize(line.split('#', 1)[0].strip())
+                if len(word) >= 2:
+                    words.add(word[:MAX_TERM_LENGTH])
+    return frozenset(words)
+
+
+def segment(text, dictionary):
+    """正向最大匹配，只返回命中词典的词"""
+    if not dictionary:
+        return []
+    max_len = max(len(w) for w in dictionary)
+    words = []
+    i = 0
+    while i < len(text):
+        for size in range(min(max_len, len(text) - i), 1, -1):
+            if text[i:i + size] in dictionary:
+                words.append(text[i:i + size])
+                i += size
+                break
+        else:
+            i += 1
+    return words
+
+
+def bigrams(text):
+    if len(text) == 1:
+        return [text]
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+def tokenize(text, unigrams=False):
+    dictionary = load_dictionary()
+    tokens = []
+    for match in _TOKEN_RE.finditer(normalize(text)):
+        word = match.group()
+        if not is_cjk(word):
+            tokens.append(word[:MAX_TERM_LENGTH])
+            continue
+        tokens.extend(bigrams(word))
+        if unigrams and len(word) > 1:
+            tokens.extend(word)
+        # 二元组已覆盖两字词，词典只补充更长的词
+        tokens.extend(w for w in segment(word, dictionary) if len(w) > 2)
+    return tokens
+
+
+def split_prefix(query):
+    """
+    自动补全：拆出已输入的前缀部分和待补全的最后一段
+    中文取最后一个字作为前缀，英文取最后一个单词
+    """
+    text = normalize(query).rstrip()
+    matches = list(_TOKEN_RE.finditer(text))
+    if not matches:
+        return text, ''
+    last = matches[-1]
+    word = last.group()
+    if is_cjk(word):
+        return text[:last.end() - 1], word[-1]
+    return text[:last.start()], word
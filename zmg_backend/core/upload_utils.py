@@ -0,0 +1,165 @@
+"""
+分片上传：init -> chunk（偏移 + sha256 校验）-> status -> complete
+临时文件放在 MEDIA_ROOT 下，与资源文件在同一文件系统，完成时直接改名为内容寻址的 blob 文件，不再复制数据
+"""
+
+import hashlib
+import os
+from django.conf import settings
+from django.utils import timezone
+from .blob_utils import store_path
+from .cache_utils import TTLCache
+from .models import UploadSession
+
+# 各上传会话已累积的整文件摘要：upload_id -> (已计入的字节数, sha256 对象)
+_hashers = TTLCache(maxsize=256, ttl=settings.UPLOAD_SESSION_TTL)
+
+
+class UploadError(Exception):
+    def __init__(self, msg, status=400, **extra):
+        super().__init__(msg)
+        self.msg = msg
+        self.status = status
+        self.extra = extra
+
+
+def temp_path(session):
+    return os.path.join(settings.UPLOAD_TEMP_DIR, f"{session.id.hex}.part")
+
+
+def session_state(session):
+    return {
+        'upload_id': str(session.id),
+        'filename': session.filename,
+        'size': session.size,
+        'received': session.received,
+        'status': session.status,
+        'chunk_size': settings.UPLOAD_CHUNK_SIZE,
+    }
+
+
+def create_session(user, tenant, filename, size, purpose='file', params=None):
+    filename = os.path.basename((filename or '').replace('\\', '/')).strip()
+    if not filename:
+        raise UploadError('文件名不能为空')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('文件大小无效')
+    if size <= 0 or size > settings.UPLOAD_MAX_SIZE:
+        raise UploadError('文件大小超出限制')
+    if purpose not in dict(UploadSession.PURPOSE_CHOICES):
+        raise UploadError('上传类型无效')
+
+    session = UploadSession.objects.create(
+        user=user, tenant=tenant, purpose=purpose,
+        filename=filename[:255], size=size, params=params or {}
+    )
+    os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+    open(temp_path(session), 'wb').close()
+    return session
+
+
+def write_chunk(session, offset, chunk, checksum):
+    """
+    写入一个分片，返回写入后的已接收字节数
+    分片必须与已接收部分衔接（offset <= received）；重发已确认的分片直接返回，便于客户端重试。
+    先算 sha256 校验，通过后才写入临时文件（损坏的分片不会改动文件），再用条件更新推进 received，并发的重复请求只有一个生效
+    """
+    if session.status != 'uploading':
+        raise UploadError('上传已完成', status=409, received=session.received)
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        raise UploadError('偏移无效')
+    end = offset + chunk.size
+    if offset < 0 or offset > session.received:
+        raise UploadError('分片不连续', status=409, received=session.received)
+    if end > session.size:
+        raise UploadError('分片超出文件大小')
+    if end <= session.received:
+        return session.received
+
+    digest = hashlib.sha256()
+    for piece in chunk.chunks():
+        digest.update(piece)
+    if digest.hexdigest() != (checksum or '').lower():
+        raise UploadError('分片校验失败', received=session.received)
+
+    # 整个文件的 SHA-256 随分片顺序累积（进程内），完成时免去再读一遍
+    file_hasher = _resume_hasher(session)
+    # 与已确认部分重叠的字节只参与校验，不覆盖
+    skip = session.received - offset
+    with open(temp_path(session), 'r+b') as fh:
+        fh.seek(session.received)
+        for piece in chunk.chunks():
+            if skip >= len(piece):
+                skip -= len(piece)
+                continue
+            fh.write(piece[skip:])
+            if file_hasher:
+                file_hasher.update(piece[skip:])
+            skip = 0
+
+    updated = UploadSession.objects.filter(
+        pk=session.pk, status='uploading', received__gte=offset, received__lt=end
+    ).update(received=end, updated_at=timezone.now())
+    if updated and file_hasher:
+        _hashers.set(session.id, (end, file_hasher))
+    session.refresh_from_db(fields=['received', 'status', 'updated_at'])
+    if not updated and session.received < end:
+        raise UploadError('分片冲突，请按 received 重新上传', status=409, received=session.received)
+    return session.received
+
+
+def _resume_hasher(session):
+    if session.received == 0:
+        return hashlib.sha256()
+    state = _hashers.get(session.id)
+    if state and state[0] == session.received:
+        return state[1].copy()
+    return None
+
+
+def claim_complete(session):
+    """条件更新标记完成，防止重复 complete；返回是否成功"""
+    return bool(UploadSession.objects.filter(
+        pk=session.pk, status='uploading', received=session.size
+    ).update(status='complete', updated_at=timezone.now()))
+
+
+def reopen_session(session):
+    """complete 之后保存失败：会话退回上传中，客户端可以重试 complete（临时文件仍在）"""
+    UploadSession.objects.filter(pk=session.pk, status='complete').update(status='uploading', updated_at=timezone.now())
+
+
+def finish_upload(session):
+    """
+    临时文件纳入内容寻址存储，返回 Blob（已加一次引用）
+    分片按顺序到达同一进程时摘要已在上传过程中算好；否则（分片落在不同 worker）回退为读一遍临时文件
+    """
+    state = _hashers.pop(session.id)
+    digest = state[1].hexdigest() if state and state[0] == session.size else None
+    return store_path(temp_path(session), session.filename, digest)
+
+
+def purge_stale_sessions(before):
+    """删除长时间未活动的未完成会话及其临时文件、已完成的旧会话记录和遗留的暂存文件，返回删除数"""
+    stale = UploadSession.objects.filter(updated_at__lt=before)
+    count = 0
+    for session in stale.iterator():
+        _hashers.pop(session.id)
+        try:
+            os.remove(temp_path(session))
+        except FileNotFoundError:
+            pass
+        count += 1
+    stale.delete()
+    # 资源保存回滚后遗留的暂存文件（blob_utils.stage_uploaded_file）
+    if os.path.isdir(settings.UPLOAD_TEMP_DIR):
+        cutoff = before.timestamp()
+        for entry in os.scandir(settings.UPLOAD_TEMP_DIR):
+            if entry.name.endswith('.blob') and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                count += 1
+    return count
@@ -5,15 +5,18 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from django.contrib.contenttypes.models import ContentType
 from django.core.files.base import ContentFile
 from django.conf import settings
-from django.db.models import Q
-from django.db import models
+from django.db.models import Q, Case, When, Value
+from django.db import models, transaction
+from django.core.exceptions import ValidationError
 from django.utils import timezone
+import hashlib
 import os
 import shutil
 import random
 from .models import (
     Resource, Category, User, Comment, DesktopIcon, Tenant, Membership,
-    AppEntry, AppTag, AppCollection, AppCollectionItem, AppComment, AppLike, AppReport, AppView
+    AppEntry, AppTag, AppCollection, AppCollectionItem, AppComment, AppLike, AppReport,
+    UploadSession
 )
 from .serializers import (
     ResourceSerializer, CategorySerializer, UserSerializer, RegisterSerializer,
@@ -21,6 +24,17 @@ from .serializers import (
     AppEntrySerializer, AppTagSerializer, AppCollectionSerializer, AppCommentSerializer
 )
 from .tenant_utils import get_current_tenant, get_current_membership
+from .search_utils import search as search_index, suggest as suggest_terms
+from .embeddings import related_resources
+from .blob_utils import store_file, blob_path, release as release_blob
+from .h5_utils import H5PackageError, install_package, app_url
+from .ranking import order_by_score
+from .counters import record_like, record_view, daily_views, pending as counter_pending
+from .response_cache import CachedListMixin, bump as bump_cache, etag_matches
+from .desktop_utils import desktop_version
+from .upload_utils import (
+    UploadError, create_session, write_chunk, claim_complete, finish_upload, reopen_session, session_state
+)
 
 # --- 辅助函数：安全获取整数坐标 ---
 def get_safe_coord(data, key, default_min=50, default_max=400):
@@ -38,11 +52,15 @@ class RegisterView(generics.CreateAPIView):
     permission_classes = (permissions.AllowAny,)
     serializer_class = RegisterSerializer
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def cache_scopes(self, request):
+        tenant = get_current_tenant(request)
+        return [('categories', tenant.id)] if tenant else None
+
     def get_queryset(self):
         tenant = get_current_tenant(self.request)
         if not tenant:
@@ -92,6 +110,27 @@ class ResourceViewSet(viewsets.ModelViewSet):
     def comments(self, request, pk=None):
         return Response(CommentSerializer(self.get_object().comments.all(), many=True).data)
 
+    @action(detail=True, methods=['GET'])
+    def related(self, request, pk=None):
+        """相关资源：按向量相似度取同租户内最相近的 k 个（?k=，默认 10，最多 50）"""
+        resource = self.get_object()
+        try:
+            k = min(max(int(request.query_params.get('k', 10)), 1), 50)
+        except (TypeError, ValueError):
+            k = 10
+        membership = get_current_membership(request)
+        candidates = None
+        if not (membership and membership.role in ['owner', 'admin']):
+            # 普通成员只能看到自己的资源，在可见集合内精确检索
+            candidates = self.get_queryset().values_list('id', flat=True)
+        scores = dict(related_resources(resource, k=k, candidates=candidates))
+        items = Resource.objects.in_bulk(scores.keys())
+        ranked = [items[object_id] for object_id in scores if object_id in items]
+        data = self.get_serializer(ranked, many=True).data
+        for item in data:
+            item['similarity'] = round(scores[item['id']], 4)
+        return Response(data)
+
 # --- 核心：桌面图标视图 ---
 
 class DesktopIconViewSet(viewsets.ModelViewSet):
@@ -111,18 +150,37 @@ class DesktopIconViewSet(viewsets.ModelViewSet):
             return qs
 
         if parent_id == 'root' or not parent_id:
-            return qs.filter(parent_folder__isnull=True)
+            qs = qs.filter(parent_folder__isnull=True)
         elif parent_id == 'recent':
-            return qs.order_by('-created_at')[:20]
+            qs = qs.order_by('-created_at')[:20]
         elif parent_id in ['image', 'doc', 'video', 'audio']:
             resource_ct = ContentType.objects.get_for_model(Resource)
             target_resources = Resource.objects.filter(kind=parent_id).values('id')
-            return qs.filter(
+            qs = qs.filter(
                 content_type=resource_ct,
                 object_id__in=target_resources
             )
         else:
-            return qs.filter(parent_folder_id=parent_id)
+            qs = qs.filter(parent_folder_id=parent_id)
+
+        if self.action == 'list':
+            qs = qs.prefetch_previews()
+        return qs
+
+    def list(self, request, *args, **kwargs):
+        # 窗口每次打开/聚焦都会重新拉取；内容没变时只做聚合查询，返回 304
+        tenant = get_current_tenant(request)
+        if not tenant:
+            return super().list(request, *args, **kwargs)
+        version = desktop_version(self.filter_queryset(self.get_queryset()))
+        digest = hashlib.sha1(f"{request.user.id}|{tenant.id}|{request.get_full_path()}|{version}".encode()).hexdigest()
+        headers = {'ETag': f'W/"{digest}"', 'Cache-Control': 'private, no-cache'}
+        if etag_matches(request, headers['ETag']):
+            return Response(status=304, headers=headers)
+        response = super().list(request, *args, **kwargs)
+        for name, value in headers.items():
+            response[name] = value
+        return response
             
     @action(detail=True, methods=['PATCH'])
     def move(self, request, pk=None):
@@ -179,9 +237,17 @@ class DesktopIconViewSet(viewsets.ModelViewSet):
         if not tenant:
             return Response({'status': 'error', 'msg': '未绑定租户'}, status=403)
 
-        x = get_safe_coord(request.data, 'x')
-        y = get_safe_coord(request.data, 'y')
-        parent_id = request.data.get('parent_id')
+        try:
+            icon = self._create_file_icon(user, tenant, request.data, file_obj, file_obj.name)
+            return Response(DesktopIconSerializer(icon).data)
+        except Exception as e:
+            return Response({'status': 'error', 'msg': str(e)}, status=500)
+
+    def _create_file_icon(self, user, tenant, data, file, title, blob=None):
+        """upload_file 与分片上传共用：file 是上传的文件对象，或分片上传已入库的 blob 存储名"""
+        x = get_safe_coord(data, 'x')
+        y = get_safe_coord(data, 'y')
+        parent_id = data.get('parent_id')
         
         current_parent_cat = None
         if parent_id and parent_id != 'root':
@@ -190,27 +256,25 @@ class DesktopIconViewSet(viewsets.ModelViewSet):
             except Category.DoesNotExist:
                 pass
 
-        try:
-            res = Resource.objects.create(
-                title=file_obj.name, 
-                author=user, 
-                tenant=tenant,
-                file=file_obj, 
-                category=current_parent_cat, 
-                status='approved'
-            )
-            
-            icon = DesktopIcon.objects.create(
-                user=user, 
-                title=res.title, 
-                content_object=res, 
-                x=x, y=y,
-                parent_folder=current_parent_cat,
-                tenant=tenant
-            )
-            return Response(DesktopIconSerializer(icon).data)
-        except Exception as e:
-            return Response({'status': 'error', 'msg': str(e)}, status=500)
+        res = Resource.objects.create(
+            title=title, 
+            author=user, 
+            tenant=tenant,
+            file=file, 
+            blob=blob,
+            category=current_parent_cat, 
+            status='approved'
+        )
+        
+        icon = DesktopIcon.objects.create(
+            user=user, 
+            title=res.title, 
+            content_object=res, 
+            x=x, y=y,
+            parent_folder=current_parent_cat,
+            tenant=tenant
+        )
+        return icon
 
     @action(detail=True, methods=['POST'])
     def rename(self, request, pk=None):
@@ -282,14 +346,12 @@ class DesktopIconViewSet(viewsets.ModelViewSet):
         if not tenant:
             return Response({'status': 'error', 'msg': '未绑定租户'}, status=403)
 
-        file_content = ContentFile(content.encode('utf-8'))
-        file_name = f"{title}.html"
+        file_content = ContentFile(content.encode('utf-8'), name=f"{title}.html")
         
         res = Resource.objects.create(
-            title=title, author=user, kind='doc',
+            title=title, author=user, kind='doc', file=file_content,
             icon_class='fa-brands fa-html5', status='approved', tenant=tenant
         )
-        res.file.save(file_name, file_content)
         
         icon = DesktopIcon.objects.create(
             user=user, title=title, content_object=res,
@@ -301,10 +363,6 @@ class DesktopIconViewSet(viewsets.ModelViewSet):
     def install_h5_app(self, request):
         user = request.user
         file_obj = request.FILES.get('file')
-        title = request.data.get('title', '未命名应用')
-        icon_class = request.data.get('icon_class', 'fa-brands fa-html5')
-        x = get_safe_coord(request.data, 'x')
-        y = get_safe_coord(request.data, 'y')
         tenant = get_current_tenant(request)
         
         if not file_obj: return Response({'status': 'error', 'msg': '未上传文件'}, status=400)
@@ -315,21 +373,125 @@ class DesktopIconViewSet(viewsets.ModelViewSet):
         if not filename.endswith('.zip'):
             return Response({'status': 'error', 'msg': '仅支持上传ZIP包'}, status=400)
 
+        blob = store_file(file_obj, file_obj.name)
+        try:
+            with transaction.atomic():
+                icon = self._create_h5_app_icon(user, tenant, request.data, blob)
+        except H5PackageError as e:
+            release_blob(blob.id)
+            return Response({'status': 'error', 'msg': str(e)}, status=400)
+        except Exception as e:
+            release_blob(blob.id)
+            return Response({'status': 'error', 'msg': str(e)}, status=500)
+        return Response({'status': 'success', 'data': DesktopIconSerializer(icon).data})
+
+    def _create_h5_app_icon(self, user, tenant, data, blob):
+        """
+        解压 H5 包（同一个包只解压一次）并创建指向入口页的链接资源；
+        资源同时引用 ZIP 的 blob，最后一个引用释放时连同解压目录一起删除
+        """
+        manifest = install_package(blob_path(blob), blob.sha256)
+        title = data.get('title', '未命名应用')
+        icon_class = data.get('icon_class', 'fa-brands fa-html5')
+        x = get_safe_coord(data, 'x')
+        y = get_safe_coord(data, 'y')
+
         res = Resource.objects.create(
-            title=title, author=user, kind='archive',
+            title=title, author=user, kind='link', link=app_url(manifest),
+            file=blob.name, blob=blob,
             icon_class=icon_class, status='approved', tenant=tenant
         )
-        res.file.save(file_obj.name, file_obj)
         
-        parent_id = request.data.get('parent_id')
+        parent_id = data.get('parent_id')
         if parent_id == 'root': parent_id = None
 
-        icon = DesktopIcon.objects.create(
+        return DesktopIcon.objects.create(
             user=user, title=title, content_object=res,
             x=x, y=y, parent_folder_id=parent_id, tenant=tenant
         )
 
-        return Response({'status': 'success', 'data': DesktopIconSerializer(icon).data})
+    # --- 分片上传：大文件分多次请求上传，单个请求很快结束，失败后可从断点续传 ---
+
+    UPLOAD_PARAM_KEYS = ('x', 'y', 'parent_id', 'title', 'icon_class')
+
+    def _get_upload_session(self, request):
+        upload_id = request.data.get('upload_id') or request.query_params.get('upload_id')
+        try:
+            return UploadSession.objects.get(pk=upload_id, user=request.user)
+        except (UploadSession.DoesNotExist, ValueError, ValidationError):
+            return None
+
+    @action(detail=False, methods=['POST'])
+    def upload_init(self, request):
+        """开始分片上传：filename, size, purpose(file|h5app) 以及完成时建图标用的 x/y/parent_id/title/icon_class"""
+        tenant = get_current_tenant(request)
+        if not tenant:
+            return Response({'status': 'error', 'msg': '未绑定租户'}, status=403)
+        purpose = request.data.get('purpose', 'file')
+        filename = request.data.get('filename', '')
+        if purpose == 'h5app' and not filename.lower().endswith('.zip'):
+            return Response({'status': 'error', 'msg': '仅支持上传ZIP包'}, status=400)
+        params = {key: request.data[key] for key in self.UPLOAD_PARAM_KEYS if request.data.get(key) is not None}
+        try:
+            session = create_session(request.user, tenant, filename, request.data.get('size'), purpose, params)
+        except UploadError as e:
+            return Response({'status': 'error', 'msg': e.msg, **e.extra}, status=e.status)
+        return Response(session_state(session), status=201)
+
+    @action(detail=False, methods=['POST'], parser_classes=[MultiPartParser, FormParser])
+    def upload_chunk(self, request):
+        """上传一个分片：upload_id, offset, checksum(分片 sha256), chunk(文件字段)"""
+        session = self._get_upload_session(request)
+        if not session:
+            return Response({'status': 'error', 'msg': '上传会话不存在'}, status=404)
+        chunk = request.FILES.get('chunk')
+        if not chunk:
+            return Response({'status': 'error', 'msg': '未接收到分片数据'}, status=400)
+        try:
+            write_chunk(session, request.data.get('offset'), chunk, request.data.get('checksum'))
+        except UploadError as e:
+            return Response({'status': 'error', 'msg': e.msg, **e.extra}, status=e.status)
+        return Response(session_state(session))
+
+    @action(detail=False, methods=['GET'])
+    def upload_status(self, request):
+        """查询断点：客户端从 received 处继续上传"""
+        session = self._get_upload_session(request)
+        if not session:
+            return Response({'status': 'error', 'msg': '上传会话不存在'}, status=404)
+        return Response(session_state(session))
+
+    @action(detail=False, methods=['POST'])
+    def upload_complete(self, request):
+        """所有分片到齐后，临时文件直接改名为资源文件并创建桌面图标"""
+        session = self._get_upload_session(request)
+        if not session:
+            return Response({'status': 'error', 'msg': '上传会话不存在'}, status=404)
+        if session.received != session.size:
+            return Response({'status': 'error', 'msg': '文件尚未上传完整', 'received': session.received}, status=409)
+        if not claim_complete(session):
+            return Response({'status': 'error', 'msg': '上传已完成'}, status=409)
+
+        try:
+            blob = finish_upload(session)
+        except Exception as e:
+            reopen_session(session)
+            return Response({'status': 'error', 'msg': f'文件保存失败，请重试：{e}'}, status=500)
+        try:
+            with transaction.atomic():
+                if session.purpose == 'h5app':
+                    icon = self._create_h5_app_icon(request.user, session.tenant, session.params, blob)
+                else:
+                    title = session.params.get('title') or session.filename
+                    icon = self._create_file_icon(request.user, session.tenant, session.params, blob.name, title, blob)
+                UploadSession.objects.filter(pk=session.pk).update(resource=icon.object_id)
+        except H5PackageError as e:
+            release_blob(blob.id)
+            return Response({'status': 'error', 'msg': str(e)}, status=400)
+        except Exception as e:
+            release_blob(blob.id)
+            return Response({'status': 'error', 'msg': str(e)}, status=500)
+        return Response(DesktopIconSerializer(icon).data)
 
     @action(detail=True, methods=['DELETE'])
     def uninstall(self, request, pk=None):
@@ -344,12 +506,14 @@ class DesktopIconViewSet(viewsets.ModelViewSet):
                     DesktopIcon.objects.filter(parent_folder=obj).delete()
                     obj.delete()
                 elif isinstance(obj, Resource):
-                    if obj.file:
+                    # blob 文件由删除信号释放引用，只有旧的独立文件在这里直接删除
+                    if obj.file and not obj.blob_id:
                         try:
                             obj.file.delete(save=False)
                         except:
                             pass
-                    if obj.kind == 'link' and obj.link and '/h5apps/' in obj.link:
+                    # 旧方式安装的 H5 应用；新安装的解压目录随 blob 释放
+                    if obj.kind == 'link' and obj.link and '/h5apps/' in obj.link and not obj.blob_id:
                         try:
                             media_path = obj.link.replace(settings.MEDIA_URL, '')
                             if media_path.startswith('/'): media_path = media_path[1:]
@@ -381,10 +545,14 @@ class TenantViewSet(viewsets.ModelViewSet):
         tenant = serializer.save(owner=self.request.user)
         Membership.objects.create(user=self.request.user, tenant=tenant, role='owner', is_default=True)
 
-class MembershipViewSet(viewsets.ReadOnlyModelViewSet):
+class MembershipViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = MembershipSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def cache_scopes(self, request):
+        # 列表只与当前用户有关，按用户计代次
+        return [('memberships', request.user.id)]
+
     def get_queryset(self):
         return Membership.objects.filter(user=self.request.user).select_related('tenant')
 
@@ -394,11 +562,17 @@ def is_tenant_admin(request):
     membership = get_current_membership(request)
     return membership and membership.role in ['owner', 'admin']
 
-class AppTagViewSet(viewsets.ReadOnlyModelViewSet):
+class AppTagViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = AppTagSerializer
     permission_classes = [permissions.IsAuthenticated]
     queryset = AppTag.objects.all().order_by('name')
 
+    def cache_scopes(self, request):
+        return [('app_tags', None)]
+
+# 审核操作写回的字段
+REVIEW_FIELDS = ['status', 'reviewed_by', 'review_reason', 'reviewed_at', 'updated_at']
+
 class AppEntryViewSet(viewsets.ModelViewSet):
     serializer_class = AppEntrySerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -421,33 +595,51 @@ class AppEntryViewSet(viewsets.ModelViewSet):
         search = self.request.query_params.get('search')
         link_type = self.request.query_params.get('link_type')
         tag_names = self.request.query_params.get('tags')
-        if search:
-            qs = qs.filter(
-                Q(search_text__icontains=search) |
-                Q(title__icontains=search) |
-                Q(summary__icontains=search)
-            )
+        ranked = None
         if link_type:
             qs = qs.filter(link_type=link_type)
         if tag_names:
             names = [n.strip() for n in tag_names.split(',') if n.strip()]
             if names:
                 qs = qs.filter(tags__name__in=names).distinct()
-        return qs.annotate(comment_count=models.Count('comments')).order_by('-created_at')
+        if search:
+            # 先按可见性/筛选条件限定范围再截取前 N 个，不可见的命中不会挤掉可见的
+            ranked = search_index(tenant, 'app', search, limit=settings.SEARCH_MAX_RESULTS, object_ids=qs.values('id'))
+            qs = qs.filter(id__in=[object_id for object_id, _ in ranked])
+        if ranked:
+            # 按相关度排序
+            return qs.annotate(search_rank=Case(
+                *[When(id=object_id, then=Value(pos)) for pos, (object_id, _) in enumerate(ranked)],
+                output_field=models.IntegerField()
+            )).order_by('search_rank')
+        # 热门/趋势：按预先计算的排行分数（见 ranking.py）
+        by_score = order_by_score(qs, self.request.query_params.get('ordering'))
+        if by_score is not None:
+            return by_score
+        return qs.order_by('-created_at')
 
     def perform_create(self, serializer):
         tenant = get_current_tenant(self.request)
         status = 'approved' if is_tenant_admin(self.request) else 'pending'
         serializer.save(author=self.request.user, tenant=tenant, status=status)
 
+    @action(detail=False, methods=['GET'])
+    def suggest(self, request):
+        """搜索框自动补全"""
+        tenant = get_current_tenant(request)
+        query = request.query_params.get('q', '')
+        visible = None
+        if not is_tenant_admin(request):
+            visible = AppEntry.objects.filter(tenant=tenant, status='approved').values('id')
+        items = suggest_terms(tenant, 'app', query, limit=10, object_ids=visible)
+        return Response([{'text': text, 'count': count} for text, count in items])
+
     @action(detail=False, methods=['GET'])
     def mine(self, request):
         tenant = get_current_tenant(request)
         if not tenant:
             return Response([])
-        qs = AppEntry.objects.filter(tenant=tenant, author=request.user).annotate(
-            comment_count=models.Count('comments')
-        ).order_by('-created_at')
+        qs = AppEntry.objects.filter(tenant=tenant, author=request.user).order_by('-created_at')
         return Response(AppEntrySerializer(qs, many=True).data)
 
     @action(detail=True, methods=['POST'])
@@ -459,7 +651,8 @@ class AppEntryViewSet(viewsets.ModelViewSet):
         app.reviewed_by = request.user
         app.review_reason = request.data.get('reason', '')
         app.reviewed_at = timezone.now()
-        app.save()
+        # 只写审核字段：计数和排行分数由 F() 增量维护，整行保存会用内存里的旧值覆盖
+        app.save(update_fields=REVIEW_FIELDS)
         return Response({'status': 'success'})
 
     @action(detail=True, methods=['POST'])
@@ -471,33 +664,45 @@ class AppEntryViewSet(viewsets.ModelViewSet):
         app.reviewed_by = request.user
         app.review_reason = request.data.get('reason', '')
         app.reviewed_at = timezone.now()
-        app.save()
+        # 只写审核字段：计数和排行分数由 F() 增量维护，整行保存会用内存里的旧值覆盖
+        app.save(update_fields=REVIEW_FIELDS)
         return Response({'status': 'success'})
 
     @action(detail=True, methods=['POST'])
     def like(self, request, pk=None):
         app = self.get_object()
         obj, created = AppLike.objects.get_or_create(user=request.user, app=app)
-        if created:
-            app.like_count = AppLike.objects.filter(app=app).count()
-            app.save()
-        return Response({'status': 'success', 'like_count': app.like_count})
+        like_count = record_like(app, 1) if created else app.like_count + counter_pending(app.pk, 'like_count')
+        return Response({'status': 'success', 'like_count': like_count})
 
     @action(detail=True, methods=['DELETE'])
     def unlike(self, request, pk=None):
         app = self.get_object()
-        AppLike.objects.filter(user=request.user, app=app).delete()
-        app.like_count = AppLike.objects.filter(app=app).count()
-        app.save()
-        return Response({'status': 'success', 'like_count': app.like_count})
+        deleted, _ = AppLike.objects.filter(user=request.user, app=app).delete()
+        like_count = record_like(app, -deleted) if deleted else app.like_count + counter_pending(app.pk, 'like_count')
+        return Response({'status': 'success', 'like_count': like_count})
 
     @action(detail=True, methods=['POST'])
     def view(self, request, pk=None):
         app = self.get_object()
-        AppView.objects.create(user=request.user, app=app)
-        app.view_count = AppView.objects.filter(app=app).count()
-        app.save()
-        return Response({'status': 'success', 'view_count': app.view_count})
+        # 浏览数进程内累加，定期批量写回（见 counters.py）
+        return Response({'status': 'success', 'view_count': record_view(app, request.user)})
+
+    @action(detail=True, methods=['GET'])
+    def stats(self, request, pk=None):
+        """创作者中心：最近 N 天每天的浏览数（读天汇总表）"""
+        app = self.get_object()
+        if app.author_id != request.user.id and not is_tenant_admin(request):
+            return Response({'status': 'error', 'msg': '无权限'}, status=403)
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 365)
+        except ValueError:
+            days = 30
+        return Response({
+            'view_count': app.view_count + counter_pending(app.pk, 'view_count'),
+            'like_count': app.like_count + counter_pending(app.pk, 'like_count'),
+            'daily': daily_views(app, days),
+        })
 
     @action(detail=True, methods=['POST'])
     def comment(self, request, pk=None):
@@ -505,7 +710,9 @@ class AppEntryViewSet(viewsets.ModelViewSet):
         content = request.data.get('content')
         if not content:
             return Response({'status': 'error', 'msg': '评论不能为空'}, status=400)
-        AppComment.objects.create(user=request.user, app=app, content=content)
+        # 评论与 comment_count 加一在同一事务内提交
+        with transaction.atomic():
+            AppComment.objects.create(user=request.user, app=app, content=content)
         return Response({'status': 'success'})
 
     @action(detail=True, methods=['GET'])
@@ -554,9 +761,18 @@ class AppEntryViewSet(viewsets.ModelViewSet):
         )
         return Response({'status': 'success', 'count': qs.count()})
 
-class AppCollectionViewSet(viewsets.ModelViewSet):
+class AppCollectionViewSet(CachedListMixin, viewsets.ModelViewSet):
     serializer_class = AppCollectionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # 条目内嵌应用的浏览/点赞数由计数缓冲直接 update，不触发失效，缓存和 ETag 每分钟更新一次
+    cache_timeout = 60
+
+    def cache_scopes(self, request):
+        tenant = get_current_tenant(request)
+        return [('app_collections', tenant.id), ('app_tags', None)] if tenant else None
+
+    def cache_variant(self, request):
+        return 'admin' if is_tenant_admin(request) else 'member'
 
     def get_queryset(self):
         tenant = get_current_tenant(self.request)
@@ -601,4 +817,6 @@ class AppCollectionViewSet(viewsets.ModelViewSet):
                 id=item_id,
                 collection=collection
             ).update(order=order)
+        # 批量 update 不触发信号
+        bump_cache('app_collections', collection.tenant_id)
         return Response({'status': 'success'})
\ No newline at end of file
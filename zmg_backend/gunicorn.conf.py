@@ -1,4 +1,5 @@
 # Gunicorn 生产环境配置
+import os
 
 # 绑定地址
 bind = '127.0.0.1:8000'
@@ -6,8 +7,21 @@ bind = '127.0.0.1:8000'
 # 工作进程数（建议：CPU核心数 * 2 + 1）
 workers = 2
 
-# 工作模式
-worker_class = 'sync'
+# 工作模式（GUNICORN_MODE 环境变量）：
+#   sync -> WSGI 同步 worker（默认）
+#   asgi -> uvicorn worker（pip install "uvicorn[standard]" httpx），对外代理等 I/O 密集接口为异步视图，
+#           等待上游时不占用 worker；其余同步视图由 Django 放到线程中执行（每个请求独立线程），
+#           此模式下数据库连接按线程创建，settings 会把 CONN_MAX_AGE 设为 0。
+#           注意：ASGI 没有 wsgi.file_wrapper / sendfile，媒体文件（/api/media/resources/<id>/）和 NDJSON 同步快照
+#           改为逐块从线程读取后异步发送（core/asgi_utils.py），内存不随文件大小增长，但每块要经过一次线程切换；
+#           视频较多时建议配置 MEDIA_ACCEL 交给 nginx 发送文件
+mode = os.getenv('GUNICORN_MODE', 'sync')
+if mode == 'asgi':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    wsgi_app = 'zmg_backend.asgi:application'
+else:
+    worker_class = 'sync'
+    wsgi_app = 'zmg_backend.wsgi:application'
 
 # 超时设置
 timeout = 120
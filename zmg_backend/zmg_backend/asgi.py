@@ -3,3 +3,7 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'zmg_backend.settings')
 application = get_asgi_application()
+
+# ASGI 模式下事件循环长期存在，对外代理复用连接池
+from core.proxy_utils import enable_pooling  # noqa: E402
+enable_pooling()
@@ -46,6 +46,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.db_routers.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'zmg_backend.urls'
@@ -68,10 +69,62 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'zmg_backend.wsgi.application'
 
-DATABASES = {
+# 数据库（DB_ENGINE 环境变量）：
+#   sqlite   -> 本地 db.sqlite3（默认）；所有写入共用一把库锁，并发写多时各 worker 排队
+#   postgres -> PostgreSQL（pip install "psycopg[binary]"），连接参数见 POSTGRES_*；
+#               POSTGRES_REPLICAS=host1:5432,host2 配置只读副本（路由见 core/db_routers.py）
+# 从 SQLite 迁移：DB_ENGINE=postgres python manage.py migrate && python manage.py copy_sqlite_to_postgres
+def _postgres(host, port):
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('POSTGRES_DB', 'zmg'),
+        'USER': os.getenv('POSTGRES_USER', 'zmg'),
+        'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+        'HOST': host,
+        'PORT': port,
+        # 持久连接，复用前先检查是否还可用（数据库重启后不会拿到断开的连接）；
+        # ASGI 模式下同步视图每个请求换一个线程，持久连接会越积越多，所以为 0
+        'CONN_MAX_AGE': 0 if os.getenv('GUNICORN_MODE') == 'asgi' else int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+    }
+
+if os.getenv('DB_ENGINE', 'sqlite') == 'postgres':
+    DATABASES = {'default': _postgres(os.getenv('POSTGRES_HOST', '127.0.0.1'), os.getenv('POSTGRES_PORT', '5432'))}
+    for _i, _replica in enumerate(filter(None, os.getenv('POSTGRES_REPLICAS', '').split(','))):
+        _host, _, _port = _replica.strip().partition(':')
+        # 测试时副本指向测试主库，不单独建库
+        DATABASES[f'replica{_i}'] = {**_postgres(_host, _port or '5432'), 'TEST': {'MIRROR': 'default'}}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
+# 只读副本：应用/分类/资源的 list、retrieve 请求读副本，其余读写都走主库；
+# 写请求后 DATABASE_REPLICA_PIN_SECONDS 秒内该客户端（按 cookie）只读主库，覆盖复制延迟
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv('DATABASE_REPLICA_PIN_SECONDS', '5'))
+
+# 共享缓存（CACHE_BACKEND 环境变量）：
+#   locmem -> 进程内（默认，多 worker 时各自一份）
+#   file   -> 本机文件目录，同机多 worker 共享
+#   redis  -> Redis 及兼容服务（需 pip install redis），多机共享
+_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'zmg-default', {'MAX_ENTRIES': 5000}),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / '.cache' / 'django'), {'MAX_ENTRIES': 5000}),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1', {}),
+}
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+_cache_backend, _cache_location, _cache_options = _CACHE_BACKENDS[CACHE_BACKEND]
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': _cache_backend,
+        'LOCATION': os.getenv('CACHE_LOCATION', _cache_location),
+        'KEY_PREFIX': 'zmg',
+        'OPTIONS': _cache_options,
     }
 }
 
@@ -128,6 +181,96 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# 租户/成员关系解析的进程内缓存（秒），Membership 变更时会主动失效
+TENANT_CACHE_TTL = 30
+TENANT_CACHE_SIZE = 2048
+
+# 同步拉取每页条数
+SYNC_PULL_PAGE_SIZE = 500
+SYNC_PULL_MAX_PAGE_SIZE = 2000
+# 增量拉取暂不返回最近几秒写入的变更（秒），避免游标越过乱序提交的事务；应大于最长的写事务耗时
+SYNC_PULL_HOLDBACK_SECONDS = int(os.getenv('SYNC_PULL_HOLDBACK_SECONDS', '5'))
+# NDJSON 流式快照每次从数据库读取的行数
+SYNC_STREAM_CHUNK_SIZE = 2000
+
+# 全文检索最多返回的结果数
+SEARCH_MAX_RESULTS = 200
+# 检索词典（每行一个词），用于在字二元组之外补充长词；为空则只用二元组
+SEARCH_DICT_PATH = os.getenv('SEARCH_DICT_PATH', '')
+# 一次提交标记的对象数不超过该值时提交后立即重建索引，更多的只入队，由 build_search_index --pending --watch 处理（0 表示全部交给它）
+SEARCH_INLINE_INDEX_LIMIT = int(os.getenv('SEARCH_INLINE_INDEX_LIMIT', '20'))
+
+# AI 打标签任务队列（python manage.py run_ai_worker）
+AI_SIMULATED_LATENCY = 1          # 模拟模型调用耗时（秒）
+AI_JOB_BATCH_SIZE = 16            # 每次模型调用处理的文本数
+AI_JOB_MAX_ATTEMPTS = 5
+AI_JOB_RETRY_DELAY = 30           # 首次重试等待（秒），之后指数退避
+AI_JOB_LOCK_TIMEOUT = 600         # running 超过该时长视为 worker 已退出
+
+# 资源向量与相关推荐（python manage.py build_embeddings）
+EMBEDDING_BACKEND = 'core.embeddings.HashingEmbedder'   # 嵌入模型类的点分路径
+EMBEDDING_DIM = 128
+EMBEDDING_IVF_THRESHOLD = 20000   # 租户向量数超过该值时改用 IVF 近似索引
+EMBEDDING_IVF_NPROBE = 8          # IVF 每次查询扫描的簇数
+EMBEDDING_INDEX_TTL = 600         # 租户索引在进程内的缓存时间（秒）
+EMBEDDING_INDEX_CHECK_INTERVAL = 30   # 多久检查一次租户向量是否变化（秒），变化后在后台重建索引
+
+# 分片上传：临时文件须与 MEDIA_ROOT 在同一文件系统，完成时直接改名
+UPLOAD_TEMP_DIR = os.path.join(MEDIA_ROOT, 'uploads_tmp')
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024         # 建议的分片大小
+UPLOAD_MAX_SIZE = 4 * 1024 * 1024 * 1024    # 单文件上限
+UPLOAD_SESSION_TTL = 24 * 3600              # 未完成的上传会话保留时长（秒），由 cleanup_weekly 清理
+
+# H5 应用包解压限制（防 zip 炸弹）
+H5_MAX_FILES = 5000
+H5_MAX_FILE_SIZE = 64 * 1024 * 1024         # 单个文件解压后上限
+H5_MAX_TOTAL_SIZE = 256 * 1024 * 1024       # 整包解压后上限
+H5_MAX_RATIO = 200                          # 单个文件最大压缩比
+
+# 应用浏览/点赞计数缓冲（见 core/counters.py），对账：python manage.py reconcile_app_counters
+COUNTER_FLUSH_INTERVAL = 5          # 写回周期（秒），0 表示不缓冲、每次直接写回
+COUNTER_FLUSH_MAX_PENDING = 1000    # 缓冲的浏览记录/应用数达到该值时立即写回
+APP_VIEW_DEDUP_WINDOW = 1800        # 同一用户在该时长（秒）内重复浏览同一应用只计一次，0 表示不去重
+# 去重标记存放在 CACHES['default']：locmem 下每个 worker 各记一份，同一用户的请求落到不同 worker 时会各计一次，
+# 多 worker 部署需要 CACHE_BACKEND=file/redis 才能严格去重
+APP_VIEW_RAW_SAMPLE_RATE = 1.0      # 浏览明细的抽样比例（汇总表始终精确计数）
+APP_VIEW_RAW_RETENTION_DAYS = 90    # 浏览明细保留天数（python manage.py prune_app_views）
+APP_VIEW_HOURLY_RETENTION_DAYS = 30 # 小时汇总保留天数，天汇总永久保留
+
+# 应用商店排行（?ordering=hot / trending），python manage.py recompute_app_rankings 定时增量更新
+APP_RANK_WEIGHTS = {'view': 1, 'like': 5, 'comment': 3}
+APP_HOT_HALF_LIFE_HOURS = 7 * 24     # hot：一周半衰，长期热门
+APP_TRENDING_HALF_LIFE_HOURS = 24    # trending：一天半衰，近期上升
+APP_RANK_HOLDBACK_SECONDS = 60       # 最近写入的点赞/评论留到下次排行计算，等并发事务提交
+
+# 图片/视频缩略图（WebP，按长边缩放）；视频首帧需要本机安装 ffmpeg
+THUMBNAIL_SIZES = {'small': 128, 'large': 512}
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', '2'))   # 每个 web 进程的渲染进程数，0 表示在请求线程里同步生成
+
+# 读多写少列表接口的响应缓存（见 core/response_cache.py），按租户代次失效，另带 ETag/304
+# 代次必须在所有 worker 间共享：locmem 下一个 worker 的失效传不到其他 worker，它们会一直返回旧内容或 304，
+# 因此默认只在 file/redis 后端开启（单进程部署可显式设置 RESPONSE_CACHE_TTL）
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '0' if CACHE_BACKEND == 'locmem' else '300'))   # 秒，0 表示关闭
+
+# 对外 HTTP 代理（GitHub 仓库搜索等，见 core/proxy_utils.py）
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+PROXY_TIMEOUT = 10                  # 上游超时（秒）
+PROXY_MAX_CONNECTIONS = 20          # ASGI 模式下每个 worker 到上游的连接池大小
+PROXY_CACHE_TTL = int(os.getenv('PROXY_CACHE_TTL', '300'))   # 缓存新鲜期（秒），过期后用 ETag 重新验证
+PROXY_CACHE_STALE_TTL = 24 * 3600   # 上游失败时最多返回多旧的结果（秒）
+PROXY_CACHE_MAX_ENTRIES = 256       # 每个进程缓存的查询数（LRU）
+
+# 资源文件下发（/api/media/resources/<id>/）交给前置代理：
+#   'nginx'    -> X-Accel-Redirect: MEDIA_ACCEL_PREFIX + 存储路径，需配置
+#                 location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+#   'sendfile' -> X-Sendfile: 绝对路径（Apache mod_xsendfile / lighttpd）
+#   ''         -> 由 Django 返回 FileResponse（gunicorn 下走 os.sendfile）
+MEDIA_ACCEL = os.getenv('MEDIA_ACCEL', '')
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+# <video>/<audio> 无法带请求头，播放地址里的 ?token= 是只对单个用户+资源有效的签名令牌（不是登录 JWT），
+# 有效期（秒）要覆盖一次播放过程中的拖动请求
+MEDIA_TOKEN_MAX_AGE = int(os.getenv('MEDIA_TOKEN_MAX_AGE', '3600'))
+
 # =================================================
 # 👇 核心修复：局域网 HTTP 开发安全策略松绑 👇
 # =================================================
@@ -22,8 +22,10 @@ from core.views import (
 from core.api_views import (
     api_login, api_logout, api_user_info, 
     api_files_list, api_search, api_upload_file,
-    health_check, api_sync_settings, api_sync_pull, api_sync_push, api_github_repos
+    health_check, api_sync_settings, api_sync_pull, api_sync_push, api_github_repos,
+    media_resource, api_media_token, h5_app_file
 )
+from core.h5_utils import H5_DIR
 
 # 注册 API 路由
 router = DefaultRouter()
@@ -53,6 +55,10 @@ urlpatterns = [
     path('api/sync/settings/', api_sync_settings, name='api_sync_settings'),
     path('api/sync/pull/', api_sync_pull, name='api_sync_pull'),
     path('api/sync/push/', api_sync_push, name='api_sync_push'),
+    path('api/media/resources/<int:pk>/', media_resource, name='media_resource'),
+    path('api/media/resources/<int:pk>/token/', api_media_token, name='api_media_token'),
+    # H5 应用包内文件：路径与安装时写入资源的链接相同，优先于开发模式的 MEDIA 静态服务
+    path(f"{settings.MEDIA_URL.lstrip('/')}{H5_DIR}/<str:key>/<path:path>", h5_app_file, name='h5_app_file'),
     
     # 3. 业务 API - 必须在根路由之前
     path('api/', include(router.urls)),
@@ -18,6 +18,45 @@ export const authApi = {
   login: (username, password) => api.post('/token/', { username, password })
 }
 
+// 超过该大小的文件走分片上传
+const CHUNKED_UPLOAD_THRESHOLD = 8 * 1024 * 1024
+
+const sha256Hex = async (blob) => {
+  const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer())
+  return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('')
+}
+
+// 分片上传：每个分片单独请求，失败后按服务端记录的 received 断点续传
+export const chunkedUpload = async (file, fields = {}, { purpose = 'file', onProgress, retries = 3 } = {}) => {
+  const { data: session } = await api.post('/desktop/upload_init/', {
+    filename: file.name, size: file.size, purpose, ...fields
+  })
+  let received = session.received
+  let failures = 0
+  while (received < file.size) {
+    const chunk = file.slice(received, received + session.chunk_size)
+    const formData = new FormData()
+    formData.append('upload_id', session.upload_id)
+    formData.append('offset', received)
+    formData.append('checksum', await sha256Hex(chunk))
+    formData.append('chunk', chunk, file.name)
+    try {
+      const { data } = await api.post('/desktop/upload_chunk/', formData, {
+        headers: { 'Content-Type': 'multipart/form-data' },
+        timeout: 120000
+      })
+      received = data.received
+      failures = 0
+    } catch (error) {
+      if (++failures > retries) throw error
+      const { data } = await api.get('/desktop/upload_status/', { params: { upload_id: session.upload_id } })
+      received = data.received
+    }
+    if (onProgress) onProgress(received / file.size)
+  }
+  return api.post('/desktop/upload_complete/', { upload_id: session.upload_id }, { timeout: 120000 })
+}
+
 export const desktopApi = {
   getList: (parentId) => api.get('/desktop/', { params: { parent_id: parentId } }),
   updatePos: (id, x, y) => api.patch(`/desktop/${id}/move/`, { x, y }),
@@ -46,6 +85,9 @@ export const desktopApi = {
     if (/\.(mp4|mov|avi|mkv)$/.test(fileName)) targetFolder = 2      
     if (/\.(pdf|doc|docx|ppt|txt)$/.test(fileName)) targetFolder = 3 
     
+    if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+      return chunkedUpload(file, { parent_id: targetFolder, x, y })
+    }
     formData.append('parent_id', targetFolder)
     formData.append('x', x); formData.append('y', y)
     return api.post('/desktop/upload_file/', formData, { 
@@ -88,6 +130,7 @@ export const appStoreApi = {
   like: (id) => api.post(`/apps/${id}/like/`),
   unlike: (id) => api.delete(`/apps/${id}/unlike/`),
   view: (id) => api.post(`/apps/${id}/view/`),
+  stats: (id, days = 30) => api.get(`/apps/${id}/stats/`, { params: { days } }),
   comment: (id, content) => api.post(`/apps/${id}/comment/`, { content }),
   comments: (id) => api.get(`/apps/${id}/comments/`),
   report: (id, payload) => api.post(`/apps/${id}/report/`, payload),
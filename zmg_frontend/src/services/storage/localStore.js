@@ -43,6 +43,16 @@ export const localStore = {
     })
   },
 
+  async applyIconChanges(tenantId, userId, icons, deletedIds = []) {
+    const prefix = buildKey(tenantId, userId)
+    return withStore('icons', 'readwrite', store => {
+      icons.forEach(icon => {
+        store.put({ key: `${prefix}:${icon.id}`, prefix, icon })
+      })
+      deletedIds.forEach(id => store.delete(`${prefix}:${id}`))
+    })
+  },
+
   async getIcons(tenantId, userId) {
     const prefix = buildKey(tenantId, userId)
     const items = []
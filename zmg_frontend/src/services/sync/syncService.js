@@ -19,7 +19,9 @@ export const syncService = {
   async saveSettings(settings) {
     const userId = getUserId()
     const tenantId = getTenantId()
-    await localStore.saveSettings(tenantId, userId, settings)
+    // 合并保存，保留同步游标等内部字段
+    const current = await this.loadSettings()
+    await localStore.saveSettings(tenantId, userId, { ...current, ...settings })
   },
 
   async syncNow() {
@@ -39,16 +41,25 @@ export const syncService = {
       }
     }
 
-    const pullPayload = { since: settings.lastSyncAt }
-    const res = await syncApi.pull(pullPayload)
-    const data = res.data?.data || {}
-    if (data.icons) {
-      await localStore.saveIcons(tenantId, userId, data.icons)
+    // 按游标分页拉取，直到 has_more 为 false
+    let cursor = settings.syncCursor || 0
+    let serverTime = null
+    let hasMore = true
+    while (hasMore) {
+      const res = await syncApi.pull({ cursor })
+      const data = res.data?.data || {}
+      const deletedIcons = (data.tombstones || [])
+        .filter(item => item.kind === 'icon')
+        .map(item => item.id)
+      await localStore.applyIconChanges(tenantId, userId, data.icons || [], deletedIcons)
+      cursor = data.cursor ?? cursor
+      serverTime = data.server_time || serverTime
+      hasMore = Boolean(data.has_more)
     }
 
-    const serverTime = data.server_time
     const updated = {
       ...settings,
+      syncCursor: cursor,
       lastSyncAt: serverTime || new Date().toISOString()
     }
     await localStore.saveSettings(tenantId, userId, updated)